@@ -22,30 +22,100 @@
 #   02110-1301, USA.
 """Modelo de la aplicación Condensaciones"""
 
-from . import comprobaciones, clima, cerramiento
+from . import comprobaciones, clima, cerramiento, ordenacion, perfil
 from .util import config
 
-cdb = cerramiento.CerramientosDB(config.paths['cerramientosdb'])
-climasdb, climasnombres, climasdbconfig = clima.loadclimadb(config.paths['climasdb'])
-
-climae = climasdb['Climaext'][0] if 'Climaext' in climasdb else clima.Clima(5, 96)
-climai = climasdb['Climaint'][0] if 'Climaint' in climasdb else clima.Clima(20, 55)
+# BBDD predeterminadas, que se cargan en su primer uso
+_cerramientosdb = None
+_climasdb = None
+
+def getcerramientosdb():
+    """BBDD de cerramientos predeterminada
+
+    :rtype: cerramiento.CerramientosDB
+    """
+    global _cerramientosdb
+    if _cerramientosdb is None:
+        _cerramientosdb = cerramiento.CerramientosDB(
+                                            config.paths['cerramientosdb'])
+    return _cerramientosdb
+
+def getclimasdb():
+    """BBDD de climas predeterminada
+
+    :returns: diccionario de climas, lista de nombres y configuración
+    :rtype: tuple
+    """
+    global _climasdb
+    if _climasdb is None:
+        _climasdb = clima.loadclimadb(config.paths['climasdb'])
+    return _climasdb
+
+def climasdefecto(climasdb):
+    """Climas exterior e interior por defecto de una BBDD de climas
+
+    :param dict climasdb: diccionario de climas
+    :returns: clima exterior e interior
+    :rtype: tuple
+    """
+    climae = climasdb['Climaext'][0] if 'Climaext' in climasdb else clima.Clima(5, 96)
+    climai = climasdb['Climaint'][0] if 'Climaint' in climasdb else clima.Clima(20, 55)
+    return climae, climai
+
+def _memoizada(func):
+    """Propiedad cuyo valor se guarda en la caché del modelo
+
+    El valor se calcula en el primer acceso y se reutiliza hasta que se
+    invalida la caché con Model.invalida().
+    """
+    nombre = func.__name__
+    def getter(self):
+        cache = self._cache
+        if nombre not in cache:
+            cache[nombre] = func(self)
+        return cache[nombre]
+    return property(getter, doc=func.__doc__)
 
 class Model(object):
-    def __init__(self):
-        """Constructor de modelo"""
+    def __init__(self, cerramientosDB=None, climasDB=None, climas=None):
+        """Constructor de modelo
+
+        :param CerramientosDB cerramientosDB: BBDD de cerramientos. Si no se
+            indica se usa la predeterminada (ver getcerramientosdb).
+        :param dict climasDB: diccionario de climas. Si no se indica se usa
+            la BBDD predeterminada (ver getclimasdb).
+        :param list climas: nombres de las localidades de climasDB. Si no se
+            indica se usan sus claves ordenadas.
+        """
+        if cerramientosDB is None:
+            cerramientosDB = getcerramientosdb()
+        if climasDB is None:
+            climasDB, climas = getclimasdb()[:2]
+        elif climas is None:
+            climas = sorted(climasDB)
+        climae, climai = climasdefecto(climasDB)
+        self._cache = {} # resultados derivados (ver invalida)
         self.climaslist = [climae] # climas exteriores
         self._localidad = None # Sin localidad seleccionada
         self._imes = 0 # índice del mes activo en climaslist
         self._climai = climai # clima interior
         # Carga datos de materiales y cerramientos
-        self.cerramientosDB = cdb
+        self.cerramientosDB = cerramientosDB
         # cerramiento actual
         self.c = self.cerramientosDB[self.cerramientosDB.nombres[0]]
-        self.climasDB = climasdb
-        self.climas = climasnombres
+        self.climasDB = climasDB
+        self.climas = climas
         self.modificado = False # ¿Existen cambios sin guardar?
 
+    def invalida(self):
+        """Invalida los resultados calculados (glist, gmeses, fRsi...)
+
+        Los métodos que modifican el cerramiento activo o los climas lo
+        llaman automáticamente. Solo es necesario llamarlo si se modifica
+        directamente el cerramiento activo (self.c) o la lista de climas.
+        """
+        self._cache.clear()
+
     @property
     def localidad(self):
         """Localidad actual"""
@@ -54,9 +124,13 @@ class Model(object):
     @localidad.setter
     def localidad(self, lname):
         """Actualiza localidad y lista de climas exteriores para la misma"""
-        if lname in self.climasDB.keys():
-            self.climaslist = self.climasDB[lname]
+        if lname in self.climasDB:
             self._localidad = lname
+            # Volver a seleccionar la misma localidad (p.e. al cambiar de mes)
+            # no modifica los resultados
+            if self.climaslist is not self.climasDB[lname]:
+                self.climaslist = self.climasDB[lname]
+                self.invalida()
         elif lname is None:
             self._localidad = None
 
@@ -93,6 +167,7 @@ class Model(object):
         clm = value if isinstance(value, clima.Clima) else clima.Clima(*value)
         self.climaslist = [clm]
         self.imes = 0
+        self.invalida()
 
     @property
     def climai(self):
@@ -107,13 +182,14 @@ class Model(object):
         """
         clm = value if isinstance(value, clima.Clima) else clima.Clima(*value)
         self._climai = clm
+        self.invalida()
 
-    @property
+    @_memoizada
     def fRsi(self):
         """Factor de temperatura de la superficie interior"""
         return comprobaciones.fRsi(self.c.U)
 
-    @property
+    @_memoizada
     def fRsimin(self):
         """Factor de temperatura de la superficie interior mínimo
 
@@ -126,7 +202,7 @@ class Model(object):
         te = self.climaslist[0].temp
         return comprobaciones.fRsimin(te, self.climai.temp, self.climai.HR)
 
-    @property
+    @_memoizada
     def glist(self):
         """Calcula lista de condensaciones intersticiales"""
         return comprobaciones.calculaintersticiales(self.c,
@@ -134,17 +210,17 @@ class Model(object):
                                                     self.climai.HR,
                                                     self.climaslist)
 
-    @property
+    @_memoizada
     def gmeses(self):
         """Lista de condensaciones acumuladas en cada mes"""
         return comprobaciones.gmeses(self.glist)
 
-    @property
+    @_memoizada
     def cs(self):
         """Comprueba la existencia de condensaciones superficiales s/CTE"""
         return self.fRsi < self.fRsimin
 
-    @property
+    @_memoizada
     def ci(self):
         """Comprueba la existencia de condensaciones intersticiales"""
         return sum(self.gmeses)
@@ -152,15 +228,18 @@ class Model(object):
     def set_cerramiento(self, cname):
         """Selecciona cerramiento activo a partir de su nombre"""
         self.c = self.cerramientosDB[cname]
+        self.invalida()
 
     def set_Rse(self, newRse):
         """Cambia Rse"""
         self.c.Rse = newRse
+        self.invalida()
         self.modificado = True
 
     def set_Rsi(self, newRsi):
         """Cambia Rsi"""
         self.c.Rsi = newRsi
+        self.invalida()
         self.modificado = True
 
     def set_capa(self, index, name, e):
@@ -169,6 +248,7 @@ class Model(object):
         #newmaterial = self.materiales[newname]
         #capae = None if newmaterial.type == 'RESISTANCE' else float(capae)
         self.c.capas[index] = (name, e)
+        self.invalida()
         self.modificado = True
 
     def capasdata(self):
@@ -186,29 +266,51 @@ class Model(object):
         """Añade capa tras posición index"""
         ncapatuple = self.c.capas[index]
         self.c.capas.insert(index + 1, ncapatuple)
+        self.invalida()
         self.modificado = True
 
     def caparemove(self, index):
         """Elimina capa en posición index"""
         self.c.capas.pop(index)
+        self.invalida()
         self.modificado = True
 
     def capaswap(self, index1, index2):
         """Intercambia la posición de dos capas del cerramiento activo"""
         cp = self.c.capas
         cp[index1], cp[index2] = cp[index2], cp[index1]
+        self.invalida()
         self.modificado = True
 
+    def capasordenoptimo(self, fijas=()):
+        """Orden de las capas del cerramiento activo con menos condensaciones
+
+        Busca el orden que minimiza las condensaciones intersticiales (ci)
+        con los climas actuales, sin modificar el cerramiento (ver
+        ordenacion.ordenoptima y capasordena).
+
+        :param list fijas: posiciones de las capas que no se mueven
+        :rtype: ordenacion.Ordenacion
+        """
+        return ordenacion.ordenoptima(self.c, self.climaslist,
+                                      self.climai.temp, self.climai.HR, fijas)
+
+    def capasordena(self, orden):
+        """Reordena las capas del cerramiento activo
+
+        Realiza los intercambios de capas (ver capaswap) que llevan las capas
+        actuales al orden indicado.
+
+        :param list orden: índices de las capas actuales en el nuevo orden
+        """
+        for index1, index2 in ordenacion.intercambios(orden):
+            self.capaswap(index1, index2)
+
     # Acciones sobre cerramientos --------------------------------------------
 
     def cerramientoadd(self, index):
         """Añade y devuelve nuevo cerramiento tras posición index"""
-        i = 1
-        while True:
-            newname = u"Cerramiento %i" % i
-            if newname not in self.cerramientosDB.nombres:
-                break
-            i += 1
+        newname = self.cerramientosDB.nuevonombre(u"Cerramiento %i")
         newc = cerramiento.Cerramiento(newname, 'Nuevo cerramiento')
         self.cerramientosDB.insert(newc, index + 1)
         return newc
@@ -233,5 +335,15 @@ class Model(object):
         self.cerramientosDB[cerr].descripcion = newdesc
 
     def cerramientossave(self):
-        """Guarda base de datos de cerramientos"""
-        self.cerramientosDB.savecerramientosdb()
+        """Guarda base de datos de cerramientos
+
+        Solamente se escriben los cerramientos modificados y el archivo se
+        sustituye de forma atómica (ver CerramientosDB.savecerramientosdb).
+        """
+        self.cerramientosDB.savecerramientosdb(journal=True)
+        self.modificado = False
+
+for _nombre in ('fRsi', 'fRsimin', 'glist', 'gmeses', 'cs', 'ci'):
+    perfil.registracache(__name__, 'Model.' + _nombre, 'appmodel.Model',
+                         lambda model, nombre=_nombre: nombre in model._cache,
+                         antes=True)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Barridos paramétricos de cerramientos
+
+Evalúa las variantes de un cerramiento base que resultan de combinar
+valores de espesor o material de sus capas y de resistencias superficiales
+(ver Eje). Todas las variantes de la rejilla se calculan en bloque con
+arrays de NumPy, sin crear un cerramiento por variante, siguiendo las
+mismas operaciones que Cerramiento y comprobaciones.cicloanual.
+"""
+
+import numpy
+from . import comprobaciones, psicrom, perfil
+from .clima import climas2arrays
+
+#: Segundos por mes (ver Cerramiento.cantidadperfil)
+SEGUNDOSMES = 2592000.0
+
+class Eje(object):
+    """Eje de un barrido paramétrico
+
+    - propiedad: propiedad que varía ('espesor', 'material', 'Rse' o 'Rsi')
+    - valores: espesores [m], nombres de material o resistencias
+      superficiales [m²K/W]
+    - capa: índice de la capa para las propiedades 'espesor' y 'material'
+    """
+    PROPIEDADES = ('espesor', 'material', 'Rse', 'Rsi')
+
+    def __init__(self, propiedad, valores, capa=None):
+        """Inicialización del eje
+
+        :param str propiedad: propiedad que varía (ver PROPIEDADES)
+        :param list valores: valores de la propiedad
+        :param int capa: índice de la capa (espesor o material)
+        :raise ValueError: si la propiedad no existe, falta la capa o no hay
+            valores
+        """
+        if propiedad not in self.PROPIEDADES:
+            raise ValueError('Propiedad desconocida: %s' % propiedad)
+        if (propiedad in ('espesor', 'material')) != (capa is not None):
+            raise ValueError('La capa solo se indica para espesor y material')
+        if not len(valores):
+            raise ValueError('Eje sin valores')
+        self.propiedad = propiedad
+        self.valores = list(valores)
+        self.capa = capa
+
+    def __len__(self):
+        return len(self.valores)
+
+    def __repr__(self):
+        capa = '' if self.capa is None else '[%i]' % self.capa
+        return 'Eje(%s%s, %i valores)' % (self.propiedad, capa, len(self))
+
+class ResultadoBarrido(object):
+    """Resultados de un barrido paramétrico
+
+    Los arrays tienen la forma de la rejilla, con una dimensión por cada eje
+    del barrido en el mismo orden (gmeses tiene una dimensión final más, la
+    de los periodos):
+
+    - U: transmitancia térmica [W/m²K]
+    - fRsi: factor de temperatura de la superficie interior
+    - cs: ¿existen condensaciones superficiales? (fRsi < fRsimin)
+    - gmeses: condensaciones totales de cada periodo [g/m²mes]
+    - ganual: suma de las condensaciones de todos los periodos [g/m²]
+    - mesescondensan: número de periodos con condensaciones
+    """
+    def __init__(self, ejes, fRsimin, nperiodos):
+        #: ejes del barrido (list)
+        self.ejes = ejes
+        #: forma de la rejilla (tuple)
+        self.forma = tuple(len(eje) for eje in ejes)
+        #: factor de temperatura de la superficie interior mínimo (NaN si
+        #: la temperatura exterior del primer periodo es igual a la interior)
+        self.fRsimin = fRsimin
+        self.U = numpy.empty(self.forma)
+        self.fRsi = numpy.empty(self.forma)
+        self.gmeses = numpy.empty(self.forma + (nperiodos,))
+
+    @property
+    def cs(self):
+        """¿Existen condensaciones superficiales? (array de bool)"""
+        return self.fRsi < self.fRsimin
+
+    @property
+    def ganual(self):
+        """Suma de las condensaciones de todos los periodos [g/m²]"""
+        return self.gmeses.sum(axis=-1)
+
+    @property
+    def mesescondensan(self):
+        """Número de periodos con condensaciones"""
+        return (self.gmeses > 0.0).sum(axis=-1)
+
+    @property
+    def ci(self):
+        """¿Existen condensaciones intersticiales? (array de bool)"""
+        return (self.gmeses > 0.0).any(axis=-1)
+
+    def valores(self, indice):
+        """Valores de los ejes en un punto de la rejilla
+
+        :param tuple indice: índice del punto en la rejilla
+        :returns: lista de valores, uno por eje
+        :rtype: list
+        """
+        return [eje.valores[i] for eje, i in zip(self.ejes, indice)]
+
+def _tasavapor(pe, pi, Se, Si):
+    """Versión vectorizada de psicrom.g en [g/m²mes]"""
+    delta0 = 2.0 * 10.0**(-7.0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        tasa = SEGUNDOSMES * delta0 * (pi - pe) / (Si - Se)
+    return numpy.where(Si == Se, 0.0, tasa)
+
+def _envolventelote(x, y, gprevia):
+    """Envolventes de condensación de un lote de perfiles
+
+    Aplica a cada fila la cadena monótona de Cerramiento.envolventeperfil,
+    avanzando a la vez en todas las filas.
+
+    :param array x: espesores de aire equivalente de las interfases (filas x
+        interfases)
+    :param array y: presiones de los puntos de la envolvente (ídem)
+    :param array gprevia: condensaciones previas en cada interfase (ídem)
+    :returns: índices de interfase de la envolvente de cada fila (rellenos a
+        la derecha) y número de puntos de cada envolvente
+    :rtype: tuple
+    """
+    nfilas, ninterfases = x.shape
+    filas = numpy.arange(nfilas)
+    fija = gprevia > 0.0
+    pila = numpy.zeros((nfilas, ninterfases), dtype=int)
+    tope = numpy.zeros(nfilas, dtype=int)
+    for k in range(ninterfases):
+        activas = filas[tope > 1]
+        while len(activas):
+            t = tope[activas]
+            ia = pila[activas, t - 2]
+            ib = pila[activas, t - 1]
+            p0, p1 = x[activas, ia], y[activas, ia]
+            q0, q1 = x[activas, ib], y[activas, ib]
+            r0, r1 = x[activas, k], y[activas, k]
+            det = ((q0*r1 + p0*q1 + r0*p1) - (q0*p1 + r0*q1 + p0*r1))
+            quita = ~fija[activas, ib] & ~(det > 0)
+            activas = activas[quita]
+            tope[activas] -= 1
+            activas = activas[tope[activas] > 1]
+        pila[filas, tope] = k
+        tope += 1
+    return pila, tope
+
+def _condensacionlote(x, y, gprevia):
+    """Condensación acumulada por interfases de un lote de perfiles
+
+    Versión vectorizada de Cerramiento.condensacionperfil.
+
+    :param array x: espesores de aire equivalente de las interfases (filas x
+        interfases)
+    :param array y: presiones de los puntos de la envolvente (ídem)
+    :param array gprevia: condensaciones previas en cada interfase (ídem)
+    :returns: condensaciones acumuladas en cada interfase [g/m²] (ídem)
+    :rtype: numpy.ndarray
+    """
+    pila, tope = _envolventelote(x, y, gprevia)
+    gtotal = numpy.array(gprevia, dtype=float)
+    filas = numpy.arange(len(x))
+    for i in range(1, x.shape[1] - 1):
+        sel = filas[tope - 1 > i]
+        if not len(sel):
+            break
+        ia, ib, ic = pila[sel, i - 1], pila[sel, i], pila[sel, i + 1]
+        gtotal[sel, ib] += (_tasavapor(y[sel, ib], y[sel, ic],
+                                       x[sel, ib], x[sel, ic]) -
+                            _tasavapor(y[sel, ia], y[sel, ib],
+                                       x[sel, ia], x[sel, ib]))
+    numpy.maximum(gtotal, 0.0, gtotal)
+    return gtotal
+
+def _cicloanuallote(x, p, p_sat):
+    """Versión vectorizada de comprobaciones.cicloanual
+
+    :param array x: espesores de aire equivalente de las interfases
+        (variantes x interfases)
+    :param array p: presiones de vapor (variantes x periodos x puntos)
+    :param array p_sat: presiones de saturación (ídem)
+    :returns: condensaciones acumuladas (variantes x periodos x interfases)
+    :rtype: numpy.ndarray
+    """
+    nvariantes, nperiodos = p.shape[:2]
+    ninterfases = x.shape[1]
+    filas = numpy.arange(nvariantes)
+    y = numpy.concatenate((p[..., 1:2], p_sat[..., 2:-2], p[..., -1:]),
+                          axis=-1)
+    xs = numpy.repeat(x[:, numpy.newaxis, :], nperiodos, axis=1)
+    # Condensaciones sin condensación previa, solo donde son posibles
+    posible = (p_sat[..., 2:-2] < p[..., 2:-2]).any(axis=-1)
+    sinprevia = numpy.zeros((nvariantes, nperiodos, ninterfases))
+    if posible.any():
+        sinprevia[posible] = _condensacionlote(
+            xs[posible], y[posible], numpy.zeros((posible.sum(), ninterfases)))
+    # Primer periodo con condensaciones que sigue a otro sin ellas
+    cond = sinprevia.any(axis=-1)
+    sincondprevio = numpy.zeros_like(cond)
+    sincondprevio[:, 1:] = numpy.logical_or.accumulate(~cond, axis=1)[:, :-1]
+    candidatos = cond & sincondprevio
+    inicio = numpy.where(candidatos.any(axis=1), candidatos.argmax(axis=1),
+                         numpy.where(cond[:, -1], nperiodos - 1, 0))
+    # Ciclo de periodos a partir del inicial de cada variante
+    g = numpy.zeros((nvariantes, nperiodos, ninterfases))
+    gprevia = numpy.zeros((nvariantes, ninterfases))
+    for paso in range(nperiodos):
+        j = (inicio + paso) % nperiodos
+        gj = sinprevia[filas, j]
+        conprevia = gprevia.any(axis=1)
+        if conprevia.any():
+            sel = filas[conprevia]
+            gj[conprevia] = _condensacionlote(xs[sel, j[sel]], y[sel, j[sel]],
+                                              gprevia[conprevia])
+        g[filas, j] = gj
+        gprevia = gj
+    return g
+
+def ciclovariantes(R, S, te, hre, ti, hri):
+    """Condensaciones del ciclo de periodos de un lote de variantes
+
+    Calcula para cada variante, definida por sus resistencias térmicas y
+    espesores de aire equivalente, los perfiles de temperaturas y presiones de
+    todos los periodos y las condensaciones acumuladas del ciclo de periodos,
+    como comprobaciones.cicloanual.
+
+    Los climas exteriores pueden ser comunes a todas las variantes (arrays de
+    periodos) o propios de cada una (arrays variantes x periodos).
+
+    :param array R: resistencias térmicas, incluidas Rse y Rsi, con forma
+        variantes x (capas + 2) [m²K/W]
+    :param array S: espesores de aire equivalente de las capas, con forma
+        variantes x capas [m]
+    :param array te: temperaturas exteriores de cada periodo [ºC]
+    :param array hre: humedades relativas exteriores de cada periodo [%]
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :returns: transmitancias térmicas de las variantes [W/m²K] y array de
+        condensaciones acumuladas con forma variantes x periodos x interfases
+        [g/m²mes]
+    :rtype: tuple
+    """
+    n = len(R)
+    te = numpy.asarray(te, dtype=float)
+    nperiodos = te.shape[-1]
+    forma = (n, nperiodos, 1)
+    te = numpy.broadcast_to(te, (n, nperiodos))
+    R_total = numpy.cumsum(R, axis=1)[:, -1]
+    Sacum = numpy.cumsum(numpy.concatenate((numpy.zeros((n, 1)), S),
+                                           axis=1), axis=1)
+    S_total = Sacum[:, -1]
+    # Perfiles de temperaturas y presiones (variantes x periodos x puntos)
+    _k = ((ti - te) / R_total[:, numpy.newaxis])[..., numpy.newaxis]
+    temperaturas = numpy.cumsum(numpy.concatenate(
+        (te[..., numpy.newaxis], R[:, numpy.newaxis, :] * _k), axis=-1),
+                                axis=-1)
+    p_sat = psicrom.psat(temperaturas)
+    _p_ext = numpy.broadcast_to(psicrom.pvapor(te, hre)[..., numpy.newaxis],
+                                forma)
+    _p_int = psicrom.pvapor(ti, hri)
+    _k = (_p_int - _p_ext) / S_total[:, numpy.newaxis, numpy.newaxis]
+    p_vapor = numpy.cumsum(numpy.concatenate(
+        (_p_ext, S[:, numpy.newaxis, :] * _k), axis=-1), axis=-1)
+    p = numpy.concatenate((_p_ext, p_vapor, numpy.broadcast_to(_p_int, forma)),
+                          axis=-1)
+    return 1.0 / R_total, _cicloanuallote(Sacum, p, p_sat)
+
+def barrido(cerr, ejes, climasext, ti=20.0, hri=55.0, bloque=None):
+    """Evalúa la rejilla de variantes de un cerramiento
+
+    La rejilla es el producto cartesiano de los valores de los ejes. Las
+    variantes se evalúan en bloques de variantes consecutivas, de modo que la
+    memoria necesaria no depende del tamaño de la rejilla.
+
+    Los resultados coinciden con los de comprobaciones.cicloanual para cada
+    variante. fRsimin se calcula con el primer clima exterior (el mes de
+    enero en las BBDD de climas mensuales), como en appmodel.Model.
+
+    :param Cerramiento cerr: cerramiento base
+    :param list ejes: lista de ejes del barrido (ver Eje)
+    :param list climasext: Lista de climas exteriores (uno por periodo)
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param int bloque: número de variantes de cada bloque (None: automático)
+    :returns: resultados del barrido
+    :rtype: ResultadoBarrido
+    :raise ValueError: si algún material es desconocido o un eje se refiere
+        a una capa inexistente
+    """
+    matDB = cerr.matDB
+    tabla = cerr.tabla
+    ncapas = len(cerr.capas)
+    for eje in ejes:
+        if eje.capa is not None and not 0 <= eje.capa < ncapas:
+            raise ValueError('Capa inexistente: %i' % eje.capa)
+        if eje.propiedad == 'material':
+            for nombre in eje.valores:
+                if nombre not in matDB:
+                    raise ValueError('Material desconocido: %s' % nombre)
+    te, hre = climas2arrays(climasext)
+    nperiodos = len(te)
+    if te[0] != ti:
+        fRsimin = comprobaciones.fRsimin(te[0], ti, hri)
+    else:
+        fRsimin = float('nan')
+    resultado = ResultadoBarrido(ejes, fRsimin, nperiodos)
+    forma = resultado.forma
+    nvariantes = int(numpy.prod(forma))
+    if bloque is None:
+        bloque = max(1, 200000 // (nperiodos * (ncapas + 3)))
+    # Valores de cada eje como arrays (materiales por identificador)
+    valoresejes = [matDB.getids(eje.valores) if eje.propiedad == 'material'
+                   else numpy.array(eje.valores, dtype=float) for eje in ejes]
+    conductividad = matDB.columna('conductivity')
+    resistencia = matDB.columna('resistance')
+    mu = matDB.columna('mu')
+    U = resultado.U.reshape(-1)
+    fRsi = resultado.fRsi.reshape(-1)
+    gmeses = resultado.gmeses.reshape(-1, nperiodos)
+    for inicio in range(0, nvariantes, bloque):
+        indices = numpy.arange(inicio, min(inicio + bloque, nvariantes))
+        n = len(indices)
+        posiciones = numpy.unravel_index(indices, forma)
+        ids = numpy.repeat(tabla.ids[numpy.newaxis, :], n, axis=0)
+        e = numpy.repeat(tabla.e[numpy.newaxis, :], n, axis=0)
+        Rse = numpy.repeat(cerr.Rse, n)
+        Rsi = numpy.repeat(cerr.Rsi, n)
+        for eje, valores, posicion in zip(ejes, valoresejes, posiciones):
+            if eje.propiedad == 'material':
+                ids[:, eje.capa] = valores[posicion]
+            elif eje.propiedad == 'espesor':
+                e[:, eje.capa] = valores[posicion]
+            elif eje.propiedad == 'Rse':
+                Rse = valores[posicion]
+            else:
+                Rsi = valores[posicion]
+        # Tabla de capas de las variantes (ver TablaCapas)
+        K = conductividad[ids]
+        Rcapa = numpy.where(~numpy.isnan(K), e / K, resistencia[ids])
+        if numpy.isnan(Rcapa).any():
+            raise ValueError('Material de tipo desconocido')
+        R = numpy.concatenate((Rse[:, numpy.newaxis], Rcapa,
+                               Rsi[:, numpy.newaxis]), axis=1)
+        S = e * mu[ids]
+        U[indices], g = ciclovariantes(R, S, te, hre, ti, hri)
+        fRsi[indices] = comprobaciones.fRsi(U[indices])
+        gmeses[indices] = g.sum(axis=-1)
+    return resultado
+
+perfil.registra(__name__, 'barrido')
@@ -22,13 +22,336 @@
 #   02110-1301, USA.
 """Cerramiento - Clase para la modelización de un cerramiento tipo."""
 
+import os
+import json
 import colorsys
 import numpy
 import configobj
-from . import psicrom, material
-from .util import config
+from . import psicrom, material, sqlitedb, perfil
+from .util import config, loadcache, savecache, atomicwrite
 
-mdb = material.MaterialesDB(config.paths['materialesdb'])
+#: Versión del formato de la caché de la BBDD de cerramientos
+CACHEVERSION = 2
+#: Extensión del diario de cambios de la BBDD de cerramientos
+JOURNALEXT = '.journal'
+
+_materialesdb = None
+
+def getmaterialesdb():
+    """BBDD de materiales predeterminada
+
+    Se carga desde el directorio de usuario la primera vez que se usa.
+
+    :rtype: MaterialesDB
+    """
+    global _materialesdb
+    if _materialesdb is None:
+        _materialesdb = material.MaterialesDB(config.paths['materialesdb'])
+    return _materialesdb
+
+def setmaterialesdb(matDB):
+    """Establece la BBDD de materiales predeterminada
+
+    :param MaterialesDB matDB: BBDD de materiales, o None para volver a
+        cargar la del directorio de usuario en su próximo uso.
+    """
+    global _materialesdb
+    _materialesdb = matDB
+
+class _MaterialesDBPredeterminada(object):
+    """Descriptor de acceso a la BBDD de materiales predeterminada"""
+    def __get__(self, obj, objtype=None):
+        return getmaterialesdb()
+
+class CapasList(list):
+    """Lista de capas de un cerramiento que notifica sus cambios
+
+    Se comporta como una lista de tuplas (nombre, espesor) pero invalida la
+    tabla compilada de capas del cerramiento propietario cada vez que se
+    modifica su contenido (asignación, inserción, eliminación, reordenación...).
+    """
+    def __init__(self, capas=(), owner=None):
+        list.__init__(self, capas)
+        #: cerramiento al que pertenece la lista de capas
+        self._owner = owner
+
+    def _invalida(self):
+        owner = getattr(self, '_owner', None)
+        if owner is not None:
+            owner._invalida()
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self._invalida()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self._invalida()
+
+    def __setslice__(self, i, j, sequence):
+        list.__setslice__(self, i, j, sequence)
+        self._invalida()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self._invalida()
+
+    def __iadd__(self, other):
+        result = list.__iadd__(self, other)
+        self._invalida()
+        return result
+
+    def __imul__(self, n):
+        result = list.__imul__(self, n)
+        self._invalida()
+        return result
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def append(self, value):
+        list.append(self, value)
+        self._invalida()
+
+    def extend(self, values):
+        list.extend(self, values)
+        self._invalida()
+
+    def insert(self, index, value):
+        list.insert(self, index, value)
+        self._invalida()
+
+    def pop(self, *args):
+        value = list.pop(self, *args)
+        self._invalida()
+        return value
+
+    def remove(self, value):
+        list.remove(self, value)
+        self._invalida()
+
+    def reverse(self):
+        list.reverse(self)
+        self._invalida()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._invalida()
+
+class NombresList(list):
+    """Lista ordenada de nombres únicos con índice de posiciones
+
+    Mantiene un diccionario con la posición de cada nombre, de modo que
+    consultar la posición de un nombre o si está en la lista no requiere
+    recorrerla. Al insertar o eliminar un elemento el índice no se renumera:
+    se añade o se retira el nombre y se anota la primera posición desplazada,
+    a partir de la cual las posiciones se actualizan en la siguiente consulta
+    de la posición de un nombre de esa parte de la lista. Así, una serie de
+    inserciones o eliminaciones cuesta una sola renumeración y comprobar si
+    un nombre está en la lista nunca la necesita. Las operaciones sobre
+    porciones o sobre toda la lista (reordenación, inversión...) invalidan el
+    índice y se reconstruye en la siguiente consulta.
+    """
+    def __init__(self, nombres=()):
+        list.__init__(self, nombres)
+        # posición de cada nombre (None: por calcular)
+        self._posiciones = None
+        # número de posiciones iniciales al día en el índice
+        self._validas = 0
+
+    def _indice(self):
+        """Índice de posiciones, reconstruido si se ha invalidado"""
+        if self._posiciones is None:
+            self._posiciones = dict((n, i) for i, n in enumerate(self))
+            self._validas = len(self)
+        return self._posiciones
+
+    def _desplaza(self, inicio):
+        """Anota que las posiciones desde inicio pueden haber cambiado"""
+        self._validas = min(self._validas, inicio)
+
+    def _renumera(self):
+        """Actualiza las posiciones desplazadas del índice"""
+        posiciones = self._posiciones
+        for i in xrange(self._validas, len(self)):
+            posiciones[list.__getitem__(self, i)] = i
+        self._validas = len(self)
+
+    def _invalida(self):
+        self._posiciones = None
+
+    def posicion(self, nombre):
+        """Posición de un nombre en la lista
+
+        :param str nombre: nombre
+        :rtype: int
+        :raise ValueError: si el nombre no está en la lista
+        """
+        try:
+            posicion = self._indice()[nombre]
+        except KeyError:
+            raise ValueError('Nombre desconocido: %s' % nombre)
+        if posicion >= self._validas:
+            self._renumera()
+            posicion = self._posiciones[nombre]
+        return posicion
+
+    def index(self, value, *args):
+        if args:
+            return list.index(self, value, *args)
+        return self.posicion(value)
+
+    def __contains__(self, value):
+        return value in self._indice()
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, (int, long)):
+            list.__setitem__(self, index, value)
+            self._invalida()
+            return
+        if index < 0:
+            index += len(self)
+        old = list.__getitem__(self, index)
+        list.__setitem__(self, index, value)
+        posiciones = self._posiciones
+        if posiciones is None:
+            return
+        if index >= self._validas:
+            # La posición anotada de old puede estar desplazada, y no se
+            # puede saber si old sigue en la lista (intercambios)
+            self._invalida()
+            return
+        if posiciones.get(old) == index:
+            del posiciones[old]
+        posiciones[value] = index
+
+    def __delitem__(self, index):
+        if not isinstance(index, (int, long)):
+            list.__delitem__(self, index)
+            self._invalida()
+            return
+        if index < 0:
+            index += len(self)
+        old = list.__getitem__(self, index)
+        list.__delitem__(self, index)
+        if self._posiciones is not None:
+            del self._posiciones[old]
+            self._desplaza(index)
+
+    def __setslice__(self, i, j, sequence):
+        list.__setslice__(self, i, j, sequence)
+        self._invalida()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self._invalida()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        result = list.__imul__(self, n)
+        self._invalida()
+        return result
+
+    def __reduce__(self):
+        return (NombresList, (list(self),))
+
+    def append(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        inicio = len(self)
+        list.extend(self, values)
+        posiciones = self._posiciones
+        if posiciones is not None:
+            for i in xrange(inicio, len(self)):
+                posiciones[list.__getitem__(self, i)] = i
+            if self._validas == inicio:
+                self._validas = len(self)
+
+    def insert(self, index, value):
+        n = len(self)
+        if index < 0:
+            index = max(0, index + n)
+        index = min(index, n)
+        list.insert(self, index, value)
+        if self._posiciones is not None:
+            self._posiciones[value] = index
+            self._desplaza(index)
+
+    def pop(self, index=-1):
+        value = list.__getitem__(self, index)
+        self.__delitem__(index)
+        return value
+
+    def remove(self, value):
+        self.__delitem__(self.posicion(value))
+
+    def reverse(self):
+        list.reverse(self)
+        self._invalida()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._invalida()
+
+class TablaCapas(object):
+    """Tabla compilada de propiedades de las capas de un cerramiento
+
+    Reúne en arrays de NumPy las propiedades de cada capa, de modo que se
+    consulte la base de datos de materiales una única vez por capa y las
+    propiedades derivadas y los cálculos de Glaser no tengan que
+    reconstruirlas en cada acceso.
+
+    - ids: identificadores de los materiales de las capas en la BBDD
+    - e: espesores de las capas [m]
+    - K: conductividades térmicas de las capas [W/mK] (NaN si es resistiva)
+    - Rcapa: resistencias térmicas de las capas [m²K/W]
+    - mu: difusividades al vapor de las capas [-]
+    - R: resistencias térmicas, incluidas Rse y Rsi [m²K/W]
+    - S: espesores de aire equivalente de las capas [m]
+    - Racum: resistencias térmicas acumuladas desde el exterior [m²K/W]
+    - Sacum: espesores de aire equivalente acumulados en cada interfase [m]
+    - R_total: resistencia térmica total [m²K/W]
+    - S_total: espesor de aire equivalente total [m]
+    - matDB, version: BBDD de materiales con la que se compila la tabla y
+      versión de sus columnas en ese momento (ver MaterialesDB.version)
+    """
+    def __init__(self, capas, Rse, Rsi, matDB):
+        """Compila la tabla de capas
+
+        :param list capas: lista de tuplas (nombre, espesor) de las capas
+        :param float Rse: Resistencia superficial exterior [m²K/W]
+        :param float Rsi: Resistencia superficial interior [m²K/W]
+        :param MaterialesDB matDB: base de datos de materiales
+        :raise ValueError: si el tipo de algún material es desconocido
+        """
+        nombres = [nombre for nombre, e in capas]
+        self.ids = matDB.getids(nombres)
+        self.e = numpy.array([e for nombre, e in capas], dtype=float)
+        # Los materiales de tipo PROPERTIES tienen conductividad y los de tipo
+        # RESISTANCE, resistencia. Las propiedades no definidas son NaN.
+        self.K = matDB.columna('conductivity')[self.ids]
+        resistencia = matDB.columna('resistance')[self.ids]
+        conpropiedades = ~numpy.isnan(self.K)
+        desconocidos = ~conpropiedades & numpy.isnan(resistencia)
+        if desconocidos.any():
+            tipo = matDB[nombres[desconocidos.argmax()]].type
+            raise ValueError('Tipo de elemento desconocido %s' % tipo)
+        self.Rcapa = numpy.where(conpropiedades, self.e / self.K, resistencia)
+        self.mu = matDB.columna('mu')[self.ids]
+        self.R = numpy.concatenate(([Rse], self.Rcapa, [Rsi]))
+        self.S = self.e * self.mu
+        # Las sumas acumuladas son secuenciales y reproducen exactamente las
+        # sumas en coma flotante de las listas originales
+        self.Racum = numpy.cumsum(self.R)
+        self.Sacum = numpy.cumsum(numpy.concatenate(([0.0], self.S)))
+        self.R_total = float(self.Racum[-1])
+        self.S_total = float(self.Sacum[-1])
+        self.matDB = matDB
+        self.version = matDB.version
 
 class Cerramiento(object):
     """Clase para modelizar un cerramiento multicapa
@@ -46,11 +369,16 @@ class Cerramiento(object):
     - Rsi: resistencia superficial interior [m²K/W] (0,13 m²K/W)
     - tipo: disposición del cerramiento (horizontal, vertical, cubierta, etc), que
             define de forma implícita sus resistencias superficiales.
+
+    Las propiedades de las capas se compilan en una tabla (:py:attr:`tabla`)
+    que se reconstruye únicamente al modificar capas, Rse o Rsi, o los
+    materiales de su BBDD de materiales (ver MaterialesDB.version).
     """
-    #: BBDD de materiales (tipo: MaterialesDB)
-    matDB = mdb
+    #: BBDD de materiales (tipo: MaterialesDB). Por defecto es la BBDD
+    #: predeterminada (ver getmaterialesdb), que se carga en su primer uso.
+    matDB = _MaterialesDBPredeterminada()
     def __init__(self, nombre, descripcion, capas=None,
-                 Rse=None, Rsi=None, tipo=None):
+                 Rse=None, Rsi=None, tipo=None, matDB=None):
         """Inicialización de cerramiento.
 
         :param str nombre: Nombre del cerramiento
@@ -67,18 +395,117 @@ class Cerramiento(object):
         :param str tipo: Tipo de cerramiento en relación a su disposición (horizontal,
         vertical, cubierta, etc) y que sirve para definir de forma
         implícita sus valores de resistencia superficial.
+        :param MaterialesDB matDB: BBDD de materiales del cerramiento. Si no
+        se indica, se usa la BBDD de materiales predeterminada.
         """
+        self._tabla = None
+        if matDB is not None:
+            self.matDB = matDB
         self.nombre = nombre
         self.descripcion = descripcion
         #: Si no se define, se usa una capa de espesor 0,3m y material
         #: el primero de la base de datos.
         self.capas = capas if capas else [(self.matDB.nombres[0], 0.3)]
         for nombre, e in self.capas:
-            if nombre not in self.matDB.nombres:
+            if nombre not in self.matDB:
                 raise ValueError('Material desconocido: %s' % nombre)
         self.Rse = Rse if Rse else 0.04
         self.Rsi = Rsi if Rsi else 0.13
         self.tipo = tipo
+        #: Cambios sin guardar en la BBDD de cerramientos (ver CerramientosDB)
+        self.modificado = True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_capas'] = list(self._capas)
+        state['_tabla'] = None
+        return state
+
+    def __setstate__(self, state):
+        capas = state.pop('_capas')
+        self.__dict__.update(state)
+        self.capas = capas
+
+    def _invalida(self):
+        """Invalida la tabla compilada de capas y marca el cerramiento como
+        modificado"""
+        self._tabla = None
+        self.modificado = True
+
+    @property
+    def nombre(self):
+        """Nombre del cerramiento"""
+        return self._nombre
+
+    @nombre.setter
+    def nombre(self, value):
+        self._nombre = value
+        self.modificado = True
+
+    @property
+    def descripcion(self):
+        """Descripción somera de la composición del cerramiento"""
+        return self._descripcion
+
+    @descripcion.setter
+    def descripcion(self, value):
+        self._descripcion = value
+        self.modificado = True
+
+    @property
+    def tipo(self):
+        """Tipo de cerramiento en relación a su disposición"""
+        return self._tipo
+
+    @tipo.setter
+    def tipo(self, value):
+        self._tipo = value
+        self.modificado = True
+
+    @property
+    def capas(self):
+        """Lista de tuplas (nombre, espesor) de las capas, de exterior a interior"""
+        return self._capas
+
+    @capas.setter
+    def capas(self, value):
+        self._capas = CapasList(value, self)
+        self._invalida()
+
+    @property
+    def Rse(self):
+        """Resistencia superficial exterior [m²K/W]"""
+        return self._Rse
+
+    @Rse.setter
+    def Rse(self, value):
+        self._Rse = value
+        self._invalida()
+
+    @property
+    def Rsi(self):
+        """Resistencia superficial interior [m²K/W]"""
+        return self._Rsi
+
+    @Rsi.setter
+    def Rsi(self, value):
+        self._Rsi = value
+        self._invalida()
+
+    def _tablaaldia(self):
+        """¿Está compilada la tabla de capas con los materiales actuales?"""
+        tabla = self._tabla
+        matDB = self.matDB
+        return (tabla is not None and tabla.matDB is matDB
+                and tabla.version == matDB.version)
+
+    @property
+    def tabla(self):
+        """Tabla compilada de propiedades de las capas (tipo: TablaCapas)"""
+        if not self._tablaaldia():
+            self._tabla = TablaCapas(self._capas, self._Rse, self._Rsi,
+                                     self.matDB)
+        return self._tabla
 
     @property
     def nombres(self):
@@ -112,47 +539,35 @@ class Cerramiento(object):
     @property
     def mu(self):
         """Lista de difusividades al vapor de las capas [-]"""
-        return [self.matDB[nombre].mu for nombre, e in self.capas]
+        return self.tabla.mu.tolist()
 
     @property
     def K(self):
-        """Lista de conductividades térmicas de las capas [W/mK]"""
-        def Ki(capa):
-            tipo = self.matDB[capa].type
-            if tipo == 'PROPERTIES':
-                return self.matDB[capa].conductivity
-            else:
-                return None
-        return [Ki(nombre) for nombre, e in self.capas]
+        """Lista de conductividades térmicas de las capas [W/mK]
+
+        Las capas de materiales resistivos tienen valor None.
+        """
+        return [None if numpy.isnan(k) else k for k in self.tabla.K.tolist()]
 
     @property
     def R(self):
         """Lista de resistencias térmicas de las capas [m²K/W]"""
-        def Ri(capa, e=None):
-            tipo = self.matDB[capa].type
-            if tipo == 'PROPERTIES':
-                return e / self.matDB[capa].conductivity
-            elif tipo == 'RESISTANCE':
-                return self.matDB[capa].resistance
-            else:
-                raise ValueError('Tipo de elemento desconocido %s' % tipo)
-        return [self.Rse] + [Ri(nombre, e)
-                             for nombre, e in self.capas] + [self.Rsi]
+        return self.tabla.R.tolist()
 
     @property
     def S(self):
         """Lista de espesores de aire equivalente de las capas [m]"""
-        return [e * self.matDB[nombre].mu for nombre, e in self.capas]
+        return self.tabla.S.tolist()
 
     @property
     def S_total(self):
         "Espesor de aire equivalente del cerramiento [m]"
-        return sum(self.S)
+        return self.tabla.S_total
 
     @property
     def R_total(self):
         """Resistencia térmica total del cerramiento [m²K/W]"""
-        return sum(self.R)
+        return self.tabla.R_total
 
     @property
     def U(self):
@@ -171,12 +586,10 @@ class Cerramiento(object):
         :returns: lista de temperaturas en el cerramiento
         :rtype: list
         """
-        _tlist = [temp_ext]
-        _k = (temp_int - temp_ext) / self.R_total
-        for capa_Ri in self.R:
-            tempj = _tlist[-1] + (capa_Ri * _k)
-            _tlist.append(tempj)
-        return _tlist
+        tabla = self.tabla
+        _k = (temp_int - temp_ext) / tabla.R_total
+        return numpy.cumsum(numpy.concatenate(([temp_ext],
+                                               tabla.R * _k))).tolist()
 
     def presiones(self, temp_ext, temp_int, HR_ext, HR_int):
         """Lista de presiones de vapor en el cerramiento [Pa]
@@ -191,17 +604,14 @@ class Cerramiento(object):
         :returns: lista de presiones de vapor en el cerramiento
         :rtype: list
         """
+        tabla = self.tabla
         _p_ext = psicrom.pvapor(temp_ext, HR_ext)
         _p_int = psicrom.pvapor(temp_int, HR_int)
+        _k = (_p_int - _p_ext) / tabla.S_total
         # La presión exterior es constante, en el aire y sup ext de cerr
-        p_vapor = [_p_ext, _p_ext]
-        _k = (_p_int - _p_ext) / self.S_total
-        for capa_Si in self.S:
-            pres_j = p_vapor[-1] + (capa_Si * _k)
-            p_vapor.append(pres_j)
+        p_vapor = numpy.cumsum(numpy.concatenate(([_p_ext], tabla.S * _k)))
         # La presión interior es constante, en sup int de cerr y el aire
-        p_vapor.append(_p_int)
-        return p_vapor
+        return [_p_ext] + p_vapor.tolist() + [_p_int]
 
     def presionessat(self, temp_ext, temp_int):
         """Lista de presiones de saturación en el cerramiento [Pa]
@@ -214,6 +624,66 @@ class Cerramiento(object):
         _temperaturas = self.temperaturas(temp_ext, temp_int)
         return [psicrom.psat(t) for t in _temperaturas]
 
+    def temperaturaslote(self, temp_ext, temp_int):
+        """Temperaturas en el cerramiento para un lote de climas [ºC]
+
+        Versión vectorizada de :py:meth:`temperaturas`. Los argumentos son
+        arrays (o escalares) que se combinan según las reglas de difusión de
+        NumPy, de modo que se pueden evaluar, por ejemplo, los 12 meses de
+        todas las localidades de la base de datos de climas en una sola
+        llamada.
+
+        :param array temp_ext: temperaturas exteriores [ºC]
+        :param array temp_int: temperaturas interiores [ºC]
+        :returns: array de temperaturas con forma climas x puntos, donde los
+            puntos son los mismos que devuelve :py:meth:`temperaturas`
+        :rtype: numpy.ndarray
+        """
+        tabla = self.tabla
+        temp_ext, temp_int = numpy.broadcast_arrays(
+            numpy.asarray(temp_ext, dtype=float),
+            numpy.asarray(temp_int, dtype=float))
+        _k = ((temp_int - temp_ext) / tabla.R_total)[..., numpy.newaxis]
+        incrementos = numpy.concatenate((temp_ext[..., numpy.newaxis],
+                                         tabla.R * _k), axis=-1)
+        return numpy.cumsum(incrementos, axis=-1)
+
+    def presioneslote(self, temp_ext, temp_int, HR_ext, HR_int):
+        """Presiones de vapor en el cerramiento para un lote de climas [Pa]
+
+        Versión vectorizada de :py:meth:`presiones`.
+
+        :param array temp_ext: Temperaturas exteriores del aire [ºC]
+        :param array temp_int: Temperaturas interiores del aire [ºC]
+        :param array HR_ext: Humedades relativas exteriores del aire [%]
+        :param array HR_int: Humedades relativas interiores del aire [%]
+        :returns: array de presiones de vapor con forma climas x puntos,
+            donde los puntos son los mismos que devuelve :py:meth:`presiones`
+        :rtype: numpy.ndarray
+        """
+        tabla = self.tabla
+        _p_ext, _p_int = numpy.broadcast_arrays(
+            psicrom.pvapor(numpy.asarray(temp_ext, dtype=float), HR_ext),
+            psicrom.pvapor(numpy.asarray(temp_int, dtype=float), HR_int))
+        _p_ext = _p_ext[..., numpy.newaxis]
+        _p_int = _p_int[..., numpy.newaxis]
+        _k = (_p_int - _p_ext) / tabla.S_total
+        p_vapor = numpy.cumsum(numpy.concatenate((_p_ext, tabla.S * _k),
+                                                 axis=-1), axis=-1)
+        return numpy.concatenate((_p_ext, p_vapor, _p_int), axis=-1)
+
+    def presionessatlote(self, temp_ext, temp_int):
+        """Presiones de saturación en el cerramiento para un lote de climas [Pa]
+
+        Versión vectorizada de :py:meth:`presionessat`.
+
+        :param array temp_ext: Temperaturas exteriores del aire [ºC]
+        :param array temp_int: Temperaturas interiores del aire [ºC]
+        :returns: array de presiones de saturación con forma climas x puntos
+        :rtype: numpy.ndarray
+        """
+        return psicrom.psat(self.temperaturaslote(temp_ext, temp_int))
+
     def envolventec(self, temp_ext, temp_int, HR_ext, HR_int, cond_previa=[]):
         """Puntos de las interfases que definen la envolvente de condensaciones
         
@@ -229,10 +699,29 @@ class Cerramiento(object):
             condensación previa (0 = superficie exterior) y cantidad de
             condensado en ese plano [g/m²] [(n0, g0), (n1, g1), ..., (ni, gi)].
         
-        :returns: Lista de tuplas [(S0, p0, g0), (S1, p1 g1), ..., (Si, pi, gi)]
+        :returns: Lista de tuplas [(S0, p0, n0), (S1, p1, n1), ..., (Si, pi, ni)]
             de distancia a la superficie exterior [m de aire equivalente],
-            presión de saturación [Pa] y cantidad de condensación [g/m²s] para
-            cada interfase.
+            presión [Pa] e índice de la interfase (0 = superficie exterior)
+            de cada punto de la envolvente.
+        :rtype: list(tuple)
+        """
+        p = self.presiones(temp_ext, temp_int, HR_ext, HR_int)
+        p_sat = self.presionessat(temp_ext, temp_int)
+        g = dict(cond_previa)
+        g0 = [g.get(i, 0.0) for i in range(len(self.capas) + 1)]
+        return self.envolventeperfil(p, p_sat, g0)
+
+    def envolventeperfil(self, p, p_sat, gprevia=None):
+        """Envolvente de condensaciones a partir de los perfiles de presiones
+
+        Es el núcleo de :py:meth:`envolventec`, que permite reutilizar perfiles
+        de presiones ya calculados (p.e. con :py:meth:`presioneslote`).
+
+        :param list p: presiones de vapor, tal como las da :py:meth:`presiones`
+        :param list p_sat: presiones de saturación, tal como las da
+            :py:meth:`presionessat`
+        :param list gprevia: condensación previa en cada interfase [g/m²]
+        :returns: Lista de tuplas (S, p, n) de la envolvente de condensaciones
         :rtype: list(tuple)
         """
         def _giraizq(p, q, r):
@@ -242,48 +731,66 @@ class Cerramiento(object):
             return (_det > 0) or False
         
         # Calcula las posiciones x, y, g correspondientes a espesor de aire
-        # equivalente, presiones de vapor y cantidades condensadas previas.
+        # equivalente, presiones de vapor y cantidades condensadas previas, junto
+        # al índice de la interfase a la que corresponde cada punto.
         # El punto inicial y final corresponden a las presiones de vapor en las
         # superficies exterior e interior, y los puntos intermedios se
         # inicializan a los valores de las presiónes de saturación, para
         # luego calcular la envolvente convexa inferior que nos dará los planos
         # de condensación en los puntos de tangencia.
         interfases = range(len(self.capas) + 1)
-        p = self.presiones(temp_ext, temp_int, HR_ext, HR_int)
-        p_sat = self.presionessat(temp_ext, temp_int)
-        g = dict(cond_previa)
-        
-        x0 = numpy.cumsum([0.0] + self.S)
-        y0 = ([p[1]] + [_p for _p in p_sat[2:-2]] + [p[-1]])       
-        g0 = [g.get(i, 0.0) for i in interfases]
+        x0 = self.tabla.Sacum.tolist()
+        y0 = [float(p[1])] + [float(_p) for _p in p_sat[2:-2]] + [float(p[-1])]
+        g0 = [0.0] * len(interfases) if gprevia is None else gprevia
         
-        puntos = [(xj, yj, gj) for xj, yj, gj in zip(x0, y0, g0)]
+        puntos = zip(x0, y0, g0, interfases)
         
         # Un punto intermedio B no pertenece a la envolvente convexa si, siendo
         # el punto anterior A y el posterior C, BC produce un giro a la derecha
-        # respecto a AB (AC queda por debajo) y si no tiene ya condensación 
-        # previa.
-        while 1: 
-            cont = False
-            envolv_inf = [puntos[0], puntos[1]]
-            for punto in puntos[2:]:
-                envolv_inf.append(punto)
-                if (not _giraizq(*envolv_inf[-3:]) and
-                    envolv_inf[-2][2] <= 0.0): # gj > 0 implica condensación previa
-                    del envolv_inf[-2]
-                    cont = True
-            if not cont:
-                break
-            else:
-                puntos = envolv_inf[:]
-        xj, yj, gj = zip(*envolv_inf)
-        return zip(xj,yj)
+        # respecto a AB (AC queda por debajo) y si no tiene ya condensación
+        # previa. La envolvente inferior se construye en una sola pasada
+        # (cadena monótona): al añadir cada punto se descartan los puntos
+        # finales que dejan de pertenecer a la envolvente, salvo que tengan
+        # condensación previa (gj > 0), que quedan fijos.
+        envolv_inf = []
+        for punto in puntos:
+            while (len(envolv_inf) > 1 and envolv_inf[-1][2] <= 0.0 and
+                   not _giraizq(envolv_inf[-2], envolv_inf[-1], punto)):
+                envolv_inf.pop()
+            envolv_inf.append(punto)
+        return [(xj, yj, nj) for xj, yj, gj, nj in envolv_inf]
 
     def cantidadc(self, envolv_inf, cond_previa=[]):
         """Cantidades condensadas en las interfases [g/m².mes]
         
         Calcula las cantidades de condensación a partir de la envolvente de
         condensaciones y las condensaciones previas en cada interfase.
+
+        :param list envolv_inf: Lista de tuplas (S, p, n) de la envolvente de
+            condensaciones, tal como la devuelve :py:meth:`envolventec`.
+        :param list cond_previa: Lista de tuplas con posición del plano con
+            condensación previa y cantidad de condensado en ese plano [g/m²].
+        :returns: Lista de tuplas con posición del plano de condensación y
+            cantidad de condensado en ese plano [(n0, g0), ..., (ni, gi)]
+        :rtype: list(tuple, ...)
+        """
+        gprevia = numpy.zeros(len(self.capas) + 1)
+        for n, gn in cond_previa:
+            gprevia[n] = gn
+        gtotal = self.cantidadperfil(envolv_inf, gprevia)
+        return [(i, gj) for i, gj in enumerate(gtotal.tolist()) if gj > 0.0]
+
+    def cantidadperfil(self, envolv_inf, gprevia=None):
+        """Cantidades condensadas acumuladas en cada interfase [g/m².mes]
+
+        Versión de :py:meth:`cantidadc` que trabaja con arrays de
+        condensaciones por interfase.
+
+        :param list envolv_inf: Lista de tuplas (S, p, n) de la envolvente de
+            condensaciones, tal como la devuelve :py:meth:`envolventec`.
+        :param array gprevia: condensación previa en cada interfase [g/m²]
+        :returns: array de condensación acumulada en cada interfase [g/m²]
+        :rtype: numpy.ndarray
         """
         _K = 2592000.0 # segundos por mes
         def _g_punto(plist):
@@ -294,15 +801,17 @@ class Cerramiento(object):
             return (psicrom.g(ypb, ypc, xpb, xpc, _K) -
                     psicrom.g(ypa, ypb, xpa, xpb, _K))
         
-        x_index = list(numpy.cumsum([0.0] + self.S))
-        
-        gold = dict(cond_previa)
-        gnew = dict((x_index.index(x[0]), _g_punto(envolv_inf[i:])) 
-                    for i, x in enumerate(envolv_inf[1:-1]))
-        gtotal = [max(0.0,gold.get(i, 0.0) + gnew.get(i, 0.0)) 
-                  for i in range(len(x_index))]
-        new_cond = [(i, gj) for i, gj in enumerate(gtotal) if gj > 0.0]
-        return new_cond
+        # Cada punto de la envolvente lleva el índice de su interfase, de modo
+        # que no hay que buscarlo por su posición (que se repite en capas sin
+        # espesor de aire equivalente).
+        if gprevia is None:
+            gtotal = numpy.zeros(len(self.capas) + 1)
+        else:
+            gtotal = numpy.array(gprevia, dtype=float)
+        for i, punto in enumerate(envolv_inf[1:-1]):
+            gtotal[punto[2]] += _g_punto(envolv_inf[i:])
+        numpy.maximum(gtotal, 0.0, gtotal)
+        return gtotal
 
     def condensacion(self, temp_ext, temp_int, HR_ext, HR_int, cond_previa=[]):
         """Cantidad de condensación por interfases
@@ -323,11 +832,30 @@ class Cerramiento(object):
         new_cond = self.cantidadc(envolv_inf, cond_previa)
         return new_cond
 
+    def condensacionperfil(self, p, p_sat, gprevia=None):
+        """Condensación acumulada por interfases a partir de los perfiles
+
+        Calcula la envolvente y las cantidades condensadas a partir de perfiles
+        de presión de vapor y de saturación ya calculados.
+
+        :param array p: presiones de vapor, como en :py:meth:`presiones`
+        :param array p_sat: presiones de saturación, como en
+            :py:meth:`presionessat`
+        :param array gprevia: condensación previa en cada interfase [g/m²]
+        :returns: array de condensación acumulada en cada interfase [g/m²]
+        :rtype: numpy.ndarray
+        """
+        if gprevia is not None:
+            gprevia = numpy.asarray(gprevia, dtype=float)
+        envolv_inf = self.envolventeperfil(
+            p, p_sat, None if gprevia is None else gprevia.tolist())
+        return self.cantidadperfil(envolv_inf, gprevia)
+
 #===============================================================================
 # BBDD de Cerramientos en formato ConfigObj
 #===============================================================================
 
-CERRAMIENTOSDBHEADER = """#   Biblioteca de Cerramientos para Condensa
+CERRAMIENTOSDBHEADER = u"""#   Biblioteca de Cerramientos para Condensa
 #
 #   Condensa - Programa de cálculo de condensaciones según CTE
 #
@@ -350,35 +878,99 @@ CERRAMIENTOSDBHEADER = """#   Biblioteca de Cerramientos para Condensa
 class CerramientosDB(object):
     """Base de datos de Cerramientos"""
 
-    def __init__(self, filename='CerramientosDB.ini'):
+    def __init__(self, filename='CerramientosDB.ini', matDB=None):
         """Inicialización de la BBDD de Cerramientos
 
         :param str filename: nombre del archivo desde el que cargar la base de
                              datos
+        :param MaterialesDB matDB: BBDD de materiales de los cerramientos. Si
+                             no se indica, se usa la predeterminada.
         """
         #: nombre del archivo desde el que cargar la base de datos
         self.filename = filename
+        #: BBDD de materiales de los cerramientos (None: predeterminada)
+        self.matDB = matDB
         #: diccionario de configuración (nombre, ...)
         self.config = None
         #: diccionario de cerramientos de la BBDD por nombre
         self.cerramientos = {}
+        self._minlibre = {} # menor número libre por patrón (ver nuevonombre)
+        # nombres eliminados o renombrados desde el último guardado, que son
+        # los únicos que se eliminan al guardar en una BBDD SQLite compartida
+        self._eliminados = set()
         #: lista de nombres de cerramientos de la BBDD
-        self.nombres= []
+        self.nombres = []
         #: lista de nombres de tipos de cerramiento de la BBDD
         self.nombrestipos = []
+        # archivo de la última lectura o guardado y líneas guardadas de cada
+        # cerramiento (ver savecerramientosdb)
+        self._guardado = (None, {})
         self.loadcerramientosdb(filename)
 
+    @property
+    def nombres(self):
+        """Lista ordenada de nombres de cerramientos de la BBDD"""
+        return self._nombres
+
+    @nombres.setter
+    def nombres(self, value):
+        self._nombres = NombresList(value)
+
+    def posicion(self, nombre):
+        """Posición de un cerramiento en la lista de nombres
+
+        :param str nombre: nombre del cerramiento
+        :rtype: int
+        :raise ValueError: si el nombre no está en la lista
+        """
+        try:
+            return self._nombres.posicion(nombre)
+        except ValueError:
+            raise ValueError('Cerramiento desconocido: %s' % nombre)
+
+    def nuevonombre(self, patron=u"Cerramiento %i"):
+        """Menor nombre libre de la forma patron % i, con i = 1, 2, ...
+
+        Se guarda para cada patrón el menor número que puede estar libre, de
+        modo que generar nombres sucesivos no requiere comprobar de nuevo los
+        ya ocupados.
+
+        :param str patron: patrón del nombre con un entero
+        :rtype: str
+        """
+        i = self._minlibre.get(patron, 1)
+        while patron % i in self.cerramientos:
+            i += 1
+        self._minlibre[patron] = i
+        return patron % i
+
+    def _liberanombre(self, nombre):
+        """Anota un nombre que deja de estar ocupado (ver nuevonombre)"""
+        for patron, i in self._minlibre.items():
+            partes = patron.split('%i')
+            if (len(partes) == 2 and nombre.startswith(partes[0]) and
+                nombre.endswith(partes[1])):
+                numero = nombre[len(partes[0]):len(nombre) - len(partes[1])]
+                if numero.isdigit() and patron % int(numero) == nombre:
+                    self._minlibre[patron] = min(i, int(numero))
+
     def __getitem__(self, key):
         return self.cerramientos[key]
 
     def __setitem__(self, key, value):
+        if key not in self.cerramientos:
+            self.nombres.append(key)
         self.cerramientos[key] = value
-        #FIXME: La ordenación puede ser distinta
-        self.nombres.append(key)
+        self._eliminados.discard(key)
 
     def __delitem__(self, key):
+        del self.nombres[self.posicion(key)]
         del self.cerramientos[key]
-        self.nombres.remove(key)
+        self._liberanombre(key)
+        self._eliminados.add(key)
+
+    def __contains__(self, key):
+        return key in self.cerramientos
 
     def insert(self, cerramiento, index):
         """Insertar cerramiento antes de la posición index
@@ -388,6 +980,7 @@ class CerramientosDB(object):
         """
         self.cerramientos[cerramiento.nombre] = cerramiento
         self.nombres.insert(index, cerramiento.nombre)
+        self._eliminados.discard(cerramiento.nombre)
 
     def rename(self, oldkey, newkey):
         """Cambia nombre de cerramiento
@@ -399,85 +992,341 @@ class CerramientosDB(object):
         cerr.nombre = newkey
         self.cerramientos[newkey] = cerr
         del self.cerramientos[oldkey]
-        i = self.nombres.index(oldkey)
-        self.nombres[i] = newkey
+        self.nombres[self.posicion(oldkey)] = newkey
+        self._liberanombre(oldkey)
+        self._eliminados.discard(newkey)
+        self._eliminados.add(oldkey)
 
-    def loadcerramientosdb(self, filename=None):
+    def loadcerramientosdb(self, filename=None, cache=True):
         """Lee base de datos de cerramientos en formato ConfigObj
 
+        Si existe una caché binaria del archivo al día se usa en lugar de
+        interpretar el archivo, y si no existe o no está al día se actualiza.
+        Si el archivo es una base de datos SQLite (ver sqlitedb.essqlite) se
+        lee de ella, sin caché.
+
+        Si existe un diario de cambios de un guardado interrumpido (ver
+        savecerramientosdb) se aplica tras la lectura.
+
         :param str filename: nombre del archivo que contiene la BBDD.
+        :param bool cache: usar y actualizar la caché binaria del archivo
         """
-        def unescape(data):
-            """Unescape &amp;, &lt;, and &gt; in a string of data."""
-            d = data.replace("&lb;", "[").replace("&rb;", "]")
-            return d.replace("&amp;", "&")
-
         if not filename:
             if self.filename:
                 filename = self.filename
             else:
                 raise ValueError, "No se ha especificado un archivo"
-        config = configobj.ConfigObj(filename,
-                                     encoding='utf-8', raise_errors=True)
-        if 'config' in config:
-            self.config = config['config'].copy()
-            del config['config']
-        for section in config:
-            cerramiento = config[section]
-            nombre = unescape(section)
-            descripcion = cerramiento['descripcion']
-            capas = cerramiento['capas']
-            lcapas = [(name, float(e)) for ncapa, (name, e) in capas.items()]
-            c = Cerramiento(nombre, descripcion, lcapas)
-            if 'tipo' in cerramiento:
-                c.tipo = cerramiento['tipo']
-            else:
-                c.tipo = 'predeterminado'
-            if 'Rse' in cerramiento:
-                c.Rse = cerramiento.as_float('Rse')
-            if 'Rsi' in cerramiento:
-                c.Rsi = cerramiento.as_float('Rsi')
+        if sqlitedb.essqlite(filename):
+            cache = False
+            db = sqlitedb.SQLiteDB(filename)
+            try:
+                dbconfig, cerramientos = (db.getconfig('cerramientos'),
+                                          db.cerramientos())
+            finally:
+                db.close()
+            secciones = dict((registro[0], None) for registro in cerramientos)
+        else:
+            data = loadcache(filename, CACHEVERSION) if cache else None
+            if data is None:
+                data = _parsecerramientosdb(filename)
+                if cache:
+                    savecache(filename, CACHEVERSION, data)
+            dbconfig, cerramientos, secciones = data
+        if dbconfig is not None:
+            self.config = dbconfig
+        for nombre, descripcion, lcapas, tipo, Rse, Rsi in cerramientos:
+            c = Cerramiento(nombre, descripcion, lcapas, matDB=self.matDB)
+            c.tipo = tipo
+            if Rse is not None:
+                c.Rse = Rse
+            if Rsi is not None:
+                c.Rsi = Rsi
+            c.modificado = False
             self.cerramientos[nombre] = c
             self.nombres.append(nombre)
             if c.tipo not in self.nombrestipos:
                 self.nombrestipos.append(c.tipo)
+        self._guardado = (os.path.abspath(filename), dict(secciones))
+        if os.path.exists(filename + JOURNALEXT):
+            self._aplicadiario(filename + JOURNALEXT)
 
-    def savecerramientosdb(self, filename=None):
-        """Guarda base de datos de cerramientos en formato ConfigObj
+    @property
+    def modificados(self):
+        """Nombres de los cerramientos con cambios sin guardar"""
+        return [nombre for nombre in self.nombres
+                if self.cerramientos[nombre].modificado]
 
-        :param str filename: nombre del archivo en el que guardar la BBDD.
+    def _pendientes(self, filename):
+        """Cerramientos que hay que escribir al guardar en un archivo
+
+        :returns: diccionario de secciones guardadas y sin cambios por nombre
+                  de cerramiento y lista de nombres de cerramientos que deben
+                  escribirse (modificados o no guardados en el archivo)
         """
-        def escape(data):
-            """Escape &, [ and ] a string of data."""
-            d = data.replace("&", "&amp;")
-            return d.replace("[", "&lb;").replace("]", "&rb;")
+        archivo, secciones = self._guardado
+        if archivo != os.path.abspath(filename):
+            secciones = {}
+        pendientes = [nombre for nombre in self.nombres
+                      if nombre not in secciones or
+                      self.cerramientos[nombre].modificado]
+        return secciones, pendientes
 
-        if not filename:
-            if self.filename:
-                filename = self.filename
-            else:
-                raise ValueError, "No se ha especificado un archivo"
+    def _seccion(self, nombre):
+        """Líneas en formato ConfigObj de la sección de un cerramiento"""
+        if nombre not in self.cerramientos:
+            raise ValueError, "Cerramiento desconocido: %s" % nombre
+        c = self.cerramientos[nombre]
+        config = configobj.ConfigObj(encoding='utf-8', raise_errors=True)
+        config[_escape(nombre)] = {}
+        config.comments[_escape(nombre)] = '#'
+        sect = config[_escape(nombre)]
+        sect['descripcion'] = c.descripcion
+        sect['capas'] = {}
+        for i, (name, e) in enumerate(c.capas):
+            sect['capas']['capa%i' % (i + 1)] = (name, e)
+        sect['tipo'] = c.tipo if hasattr(c, 'tipo') else 'predeterminado'
+        if hasattr(c, 'Rse'):
+            sect['Rse'] = c.Rse
+        if hasattr(c, 'Rsi'):
+            sect['Rsi'] = c.Rsi
+        return config.write()
+
+    def _cabecera(self):
+        """Líneas en formato ConfigObj de la cabecera y la configuración"""
         config = configobj.ConfigObj(encoding='utf-8', raise_errors=True)
         if self.config:
             config['config'] = {}
             for key in self.config:
                 config['config'][key] = self.config[key]
-        for cerramiento in self.nombres:
-            if cerramiento not in self.cerramientos:
-                raise ValueError, "Cerramiento desconocido: %s" % cerramiento
-            c = self.cerramientos[cerramiento]
-            config[escape(cerramiento)] = {}
-            config.comments[escape(cerramiento)] = '#'
-            sect = config[escape(cerramiento)]
-            sect['descripcion'] = c.descripcion
-            sect['capas'] = {}
-            for i, (name, e) in enumerate(c.capas):
-                sect['capas']['capa%i' % (i + 1)] = (name, e)
-            sect['tipo'] = c.tipo if hasattr(c, 'tipo') else 'predeterminado'
-            if hasattr(c, 'Rse'):
-                sect['Rse'] = c.Rse
-            if hasattr(c, 'Rsi'):
-                sect['Rsi'] = c.Rsi
         config.initial_comment = CERRAMIENTOSDBHEADER
-        config.filename = filename
-        config.write()
+        return config.write()
+
+    def savecerramientosdb(self, filename=None, journal=False):
+        """Guarda base de datos de cerramientos en formato ConfigObj
+
+        El guardado es incremental: solamente se generan las secciones de los
+        cerramientos modificados o que no estaban guardados en el archivo, y
+        el resto se copian de la versión guardada. El archivo se sustituye de
+        forma atómica (ver util.atomicwrite), de modo que un guardado
+        interrumpido no lo corrompe.
+
+        Si el archivo es una base de datos SQLite (ver sqlitedb.essqlite) se
+        guardan en ella, en una única transacción, los cerramientos
+        modificados, las eliminaciones y el orden. Como la BBDD puede
+        compartirse, solo se eliminan los cerramientos eliminados o
+        renombrados en esta copia, y los que otras copias hayan guardado se
+        conservan en el orden combinado (ver sqlitedb.mezclaorden).
+
+        :param str filename: nombre del archivo en el que guardar la BBDD.
+        :param bool journal: añadir antes los cambios a un diario
+            (filename + JOURNALEXT) que se aplica al leer la BBDD si el
+            guardado no llega a completarse. El diario se elimina al terminar.
+        """
+        if not filename:
+            if self.filename:
+                filename = self.filename
+            else:
+                raise ValueError, "No se ha especificado un archivo"
+        secciones, pendientes = self._pendientes(filename)
+        if journal:
+            self._anotadiario(filename + JOURNALEXT, pendientes)
+        if sqlitedb.essqlite(filename):
+            self._savesqlite(filename, pendientes)
+            nuevas = dict((nombre, None) for nombre in self.nombres)
+        else:
+            nuevas = {}
+            for nombre in self.nombres:
+                if nombre in pendientes:
+                    nuevas[nombre] = self._seccion(nombre)
+                else:
+                    nuevas[nombre] = secciones[nombre]
+            lines = self._cabecera()
+            for nombre in self.nombres:
+                lines.extend(nuevas[nombre])
+            atomicwrite(filename, os.linesep.join(lines) + os.linesep)
+        for nombre in self.nombres:
+            self.cerramientos[nombre].modificado = False
+        self._eliminados.clear()
+        self._guardado = (os.path.abspath(filename), nuevas)
+        if journal:
+            os.remove(filename + JOURNALEXT)
+
+    def _savesqlite(self, filename, pendientes):
+        """Guarda la base de datos de cerramientos en una BBDD SQLite
+
+        :param str filename: nombre del archivo de la base de datos
+        :param list pendientes: nombres de los cerramientos a escribir
+        """
+        db = sqlitedb.SQLiteDB(filename)
+        try:
+            with db.transaccion():
+                db.setconfig('cerramientos', self.config)
+                guardados = db.nombres('cerramientos')
+                for nombre in self._eliminados:
+                    if nombre not in self.cerramientos:
+                        db.delcerramiento(nombre)
+                for nombre in pendientes:
+                    if nombre not in self.cerramientos:
+                        raise ValueError, "Cerramiento desconocido: %s" % nombre
+                    c = self.cerramientos[nombre]
+                    db.setcerramiento(nombre, c.descripcion, list(c.capas),
+                                      getattr(c, 'tipo', 'predeterminado'),
+                                      c.Rse, c.Rsi)
+                db.setorden('cerramientos',
+                            sqlitedb.mezclaorden(self.nombres, guardados,
+                                                 self._eliminados))
+        finally:
+            db.close()
+
+    def _anotadiario(self, journalfile, pendientes):
+        """Añade al diario una entrada con los cambios a guardar
+
+        Cada entrada es una línea JSON con el orden de los cerramientos, los
+        nombres de los eliminados y los datos de los cerramientos
+        modificados. Aplicar una entrada más de una vez no altera el
+        resultado.
+        """
+        entrada = {'orden': self.nombres,
+                   'eliminados': sorted(self._eliminados), 'cerramientos': {}}
+        for nombre in pendientes:
+            c = self.cerramientos[nombre]
+            entrada['cerramientos'][nombre] = (c.descripcion, list(c.capas),
+                                               c.tipo, c.Rse, c.Rsi)
+        with open(journalfile, 'ab') as jfile:
+            jfile.write(json.dumps(entrada) + '\n')
+            jfile.flush()
+            os.fsync(jfile.fileno())
+
+    def _aplicadiario(self, journalfile):
+        """Aplica las entradas completas del diario de cambios
+
+        Solamente los cerramientos escritos en el diario (modificados, nuevos
+        o renombrados) quedan marcados como modificados, y los eliminados se
+        anotan como tales, de modo que el siguiente guardado incremental
+        escribe únicamente esos cambios. Se ignora una última entrada
+        incompleta (escritura interrumpida).
+        """
+        with open(journalfile, 'rb') as jfile:
+            lineas = jfile.read().split('\n')
+        modificados = set()
+        for linea in lineas:
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                continue
+            for nombre, datos in entrada['cerramientos'].items():
+                descripcion, capas, tipo, Rse, Rsi = datos
+                c = Cerramiento(nombre, descripcion,
+                                [tuple(capa) for capa in capas],
+                                Rse, Rsi, tipo, matDB=self.matDB)
+                self.cerramientos[nombre] = c
+                modificados.add(nombre)
+                if tipo not in self.nombrestipos:
+                    self.nombrestipos.append(tipo)
+            # Las entradas antiguas no tienen eliminados: son los que faltan
+            eliminados = entrada.get('eliminados')
+            if eliminados is None:
+                eliminados = [nombre for nombre in self.nombres
+                              if nombre not in entrada['orden']]
+            for nombre in eliminados:
+                if nombre in self.cerramientos:
+                    del self.cerramientos[nombre]
+                self._eliminados.add(nombre)
+                modificados.discard(nombre)
+            orden = [nombre for nombre in entrada['orden']
+                     if nombre in self.cerramientos]
+            self.nombres[:] = sqlitedb.mezclaorden(orden, self.nombres,
+                                                   eliminados)
+        for nombre in self.nombres:
+            self.cerramientos[nombre].modificado = nombre in modificados
+
+def _escape(data):
+    """Escape &, [ and ] a string of data."""
+    d = data.replace("&", "&amp;")
+    return d.replace("[", "&lb;").replace("]", "&rb;")
+
+def _unescape(data):
+    """Unescape &amp;, &lt;, and &gt; in a string of data."""
+    d = data.replace("&lb;", "[").replace("&rb;", "]")
+    return d.replace("&amp;", "&")
+
+def _splitsecciones(filename):
+    """Divide un archivo ConfigObj en las líneas de cada sección principal
+
+    Las líneas de comentario y en blanco que preceden a una sección forman
+    parte de ella.
+
+    :param str filename: nombre del archivo
+    :returns: diccionario de listas de líneas (sin fin de línea, con la
+              codificación del archivo) por nombre de sección (sin codificar)
+    :rtype: dict
+    """
+    with open(filename, 'rb') as f:
+        lines = f.read().splitlines()
+    secciones = {}
+    inicio = 0 # primera línea aún no asignada a una sección
+    nombre = None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not (stripped.startswith('[') and not stripped.startswith('[[')):
+            continue
+        # Los comentarios previos a la cabecera pertenecen a esta sección,
+        # salvo en la primera, donde forman la cabecera del archivo
+        j = i
+        if nombre is None:
+            if j > 0 and lines[j - 1].strip() == '#':
+                j -= 1
+        else:
+            while j > inicio and (lines[j - 1].strip() == '' or
+                                  lines[j - 1].strip().startswith('#')):
+                j -= 1
+        if nombre is not None:
+            secciones[nombre] = lines[inicio:j]
+        inicio = j
+        nombre = _unescape(stripped[1:stripped.rindex(']')].strip()
+                           .decode('utf-8'))
+    if nombre is not None:
+        secciones[nombre] = lines[inicio:]
+    return secciones
+
+def _parsecerramientosdb(filename):
+    """Interpreta un archivo de BBDD de cerramientos en formato ConfigObj
+
+    :param str filename: nombre del archivo que contiene la BBDD.
+    :returns: sección de configuración (o None), lista ordenada de tuplas
+              (nombre, descripcion, capas, tipo, Rse, Rsi) de los
+              cerramientos, con Rse y Rsi None si no se definen, y
+              diccionario de líneas del archivo de cada cerramiento
+    :rtype: tuple
+    """
+    config = configobj.ConfigObj(filename,
+                                 encoding='utf-8', raise_errors=True)
+    dbconfig = None
+    if 'config' in config:
+        dbconfig = config['config'].copy()
+        del config['config']
+    cerramientos = []
+    for section in config:
+        cerramiento = config[section]
+        nombre = _unescape(section)
+        descripcion = cerramiento['descripcion']
+        capas = cerramiento['capas']
+        lcapas = [(name, float(e)) for ncapa, (name, e) in capas.items()]
+        tipo = cerramiento.get('tipo', 'predeterminado')
+        Rse = cerramiento.as_float('Rse') if 'Rse' in cerramiento else None
+        Rsi = cerramiento.as_float('Rsi') if 'Rsi' in cerramiento else None
+        cerramientos.append((nombre, descripcion, lcapas, tipo, Rse, Rsi))
+    secciones = _splitsecciones(filename)
+    secciones = dict((nombre, secciones[nombre])
+                     for nombre, descripcion, lcapas, tipo, Rse, Rsi
+                     in cerramientos if nombre in secciones)
+    return dbconfig, cerramientos, secciones
+
+perfil.registra(__name__, 'Cerramiento.condensacion', 'Cerramiento.envolventec',
+                'Cerramiento.cantidadc', 'Cerramiento.condensacionperfil',
+                'Cerramiento.envolventeperfil', 'Cerramiento.cantidadperfil',
+                'CerramientosDB.loadcerramientosdb')
+perfil.registracache(__name__, 'Cerramiento.tabla', 'cerramiento.tabla',
+                     lambda c: c._tablaaldia(), antes=True)
+perfil.registracache(__name__, 'loadcache', 'bbdd.cerramientos',
+                     lambda data: data is not None)
@@ -25,7 +25,13 @@
 higrotérmicos.
 """
 
+import numpy
 import configobj
+from .util import loadcache, savecache
+from . import sqlitedb, perfil
+
+#: Versión del formato de la caché de la BBDD de climas
+CACHEVERSION = 1
 
 MESES = [u'Enero', u'Febrero', u'Marzo', u'Abril', u'Mayo', u'Junio', u'Julio',
          u'Agosto', u'Septiembre', u'Octubre', u'Noviembre', u'Diciembre']
@@ -46,6 +52,20 @@ class Clima(object):
         #: Humedad relativa [%]
         self.HR = float(HR)
 
+def climas2arrays(climas):
+    """Convierte una lista de climas en arrays de temperaturas y humedades
+
+    Útil para evaluar en bloque los perfiles de un cerramiento con los
+    métodos vectorizados (p.e. :py:meth:`Cerramiento.temperaturaslote`).
+
+    :param list climas: lista de instancias de Clima
+    :returns: arrays de temperaturas [ºC] y humedades relativas [%]
+    :rtype: tuple
+    """
+    temps = numpy.array([clima.temp for clima in climas], dtype=float)
+    hrs = numpy.array([clima.HR for clima in climas], dtype=float)
+    return temps, hrs
+
 #===============================================================================
 # Funciones de E/S de datos de clima
 #===============================================================================
@@ -89,22 +109,39 @@ def unescape(data):
     """
     return data.replace("&lb;", "[").replace("&rb;", "]").replace("&amp;", "&")
 
-def loadclimadb(filename='ClimasDB.ini'):
+def loadclimadb(filename='ClimasDB.ini', cache=True):
     """Lee una base de datos de climas
 
-    La base de datos proviene de un archivo en formato ConfigObj
+    La base de datos proviene de un archivo en formato ConfigObj. Si existe
+    una caché binaria del archivo al día se usa en lugar de interpretar el
+    archivo, y si no existe o no está al día se actualiza. Si el archivo es
+    una base de datos SQLite (ver sqlitedb.essqlite) se lee de ella, sin
+    caché.
 
     :param str filename: nombre del archivo de la base de datos
+    :param bool cache: usar y actualizar la caché binaria del archivo
     :returns: - diccionario de nombres de localidades con lista de instancias
                 de Clima ordenadas por número de mes (enero = 1, diciembre = 12)
               - lista ordenada de nombres de localidades
               - sección de configuración de la base de datos
     :rtype: tuple
     """
+    if sqlitedb.essqlite(filename):
+        db = sqlitedb.SQLiteDB(filename)
+        try:
+            dbconf, datos = db.getconfig('climas'), db.climas()
+        finally:
+            db.close()
+        climas = dict((nombre, [Clima(t, hr) for t, hr in datosmes])
+                      for nombre, datosmes in datos)
+        return climas, [nombre for nombre, datosmes in datos], dbconf
+    data = loadcache(filename, CACHEVERSION) if cache else None
+    if data is not None:
+        return data
     config = configobj.ConfigObj(filename, encoding='utf-8', raise_errors=True)
     climas, cnames = {}, []
     if 'config' in config:
-        dbconf = config['config']
+        dbconf = config['config'].copy()
         del config['config']
     else:
         dbconf = None
@@ -125,25 +162,41 @@ def loadclimadb(filename='ClimasDB.ini'):
         else:
             climas[nombre] = [Clima(tempdata, hrdata)]
         cnames.append(nombre)
+    if cache:
+        savecache(filename, CACHEVERSION, (climas, cnames, dbconf))
     return climas, cnames, dbconf
 
 def saveclimasdb(climas, nameorder=None, configdata=None,
-                 filename='ClimasDB.ini'):
+                 filename='ClimasDB.ini', eliminados=()):
     """Guarda una base de datos de climas
 
-    La base de datos se almacena en formato ConfigObj
+    La base de datos se almacena en formato ConfigObj, o en una base de datos
+    SQLite (en una única transacción) si el nombre del archivo tiene una
+    extensión de SQLite (ver sqlitedb.essqlite).
+
+    En formato ConfigObj se eliminan las localidades que no están en
+    nameorder. La BBDD SQLite puede compartirse, por lo que en ella solo se
+    eliminan las localidades indicadas en eliminados y se conservan, en el
+    orden combinado, las guardadas desde otras copias (ver
+    sqlitedb.mezclaorden).
 
     :param dict climas: contiene lista de instancias de clima para cada
                         localidad
-    :param list cnames: lista ordenada de nombres tal como aparecen en la base
-                        de datos
-    :param dict config: valores de configuración de la base de datos
+    :param list nameorder: lista ordenada de nombres tal como aparecen en la
+                        base de datos
+    :param dict configdata: valores de configuración de la base de datos
+    :param list eliminados: nombres de las localidades eliminadas o
+                        renombradas desde la lectura de la BBDD
     """
-    config = configobj.ConfigObj(filename, encoding='utf-8', raise_errors=True)
     if not nameorder:
         nameorder = climas.keys()
         nameorder.sort()
-    removed = [k for k in config.keys() if not (k in nameorder or
+    if sqlitedb.essqlite(filename):
+        _saveclimassqlite(climas, nameorder, configdata, filename, eliminados)
+        return
+    config = configobj.ConfigObj(filename, encoding='utf-8', raise_errors=True)
+    enames = [escape(name) for name in nameorder]
+    removed = [k for k in config.keys() if not (k in enames or
                                                 k == u'config')]
     if removed:
         for k in removed:
@@ -158,9 +211,39 @@ def saveclimasdb(climas, nameorder=None, configdata=None,
             raise ValueError, "Nombre desconocido: %s" % name
         c = climas[name]
         ename = escape(name)
-        sect = config[ename]
-        sect = {}
+        config[ename] = {}
         config.comments[ename] = '#'
-        sect['T'] = [_item.T for _item in c]
-        sect['HR'] = [_item.HR for _item in c]
+        sect = config[ename]
+        if len(c) == 1:
+            sect['T'], sect['HR'] = c[0].temp, c[0].HR
+        else:
+            sect['T'] = [_item.temp for _item in c]
+            sect['HR'] = [_item.HR for _item in c]
     config.write()
+
+def _saveclimassqlite(climas, nameorder, configdata, filename, eliminados):
+    """Guarda una base de datos de climas en una BBDD SQLite
+
+    Ver :py:func:`saveclimasdb`.
+    """
+    db = sqlitedb.SQLiteDB(filename)
+    try:
+        with db.transaccion():
+            if configdata is not None:
+                db.setconfig('climas', configdata)
+            guardados = db.nombres('localidades')
+            for name in eliminados:
+                if name not in nameorder:
+                    db.delclima(name)
+            for name in nameorder:
+                if name not in climas:
+                    raise ValueError, "Nombre desconocido: %s" % name
+                db.setclima(name, [(c.temp, c.HR) for c in climas[name]])
+            db.setorden('localidades',
+                        sqlitedb.mezclaorden(nameorder, guardados, eliminados))
+    finally:
+        db.close()
+
+perfil.registra(__name__, 'loadclimadb')
+perfil.registracache(__name__, 'loadcache', 'bbdd.climas',
+                     lambda data: data is not None)
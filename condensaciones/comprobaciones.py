@@ -23,7 +23,11 @@
 """Módulo de comprobaciones higrométricas según CTE DB-HE Apéndice G
 e ISO 13788:2002"""
 
+import copy
 import math
+import numpy
+from .clima import climas2arrays
+from . import perfil
 
 def fRsi(U):
     """Factor de temperatura de la superficie interior
@@ -95,8 +99,156 @@ def testcondensas(cerr, temp_ext, temp_int, HR_int):
     # correspondientes al mes de enero y temperatura interior igual a 20ºC.
     return fRsi(cerr.U) < fRsimin(temp_ext, temp_int, HR_int)
 
+def cicloanual(cerr, ti, hri, climasext):
+    """Condensaciones intersticiales acumuladas en el ciclo de periodos
+
+    Calcula las condensaciones de cada interfase para cada clima exterior en
+    climasext y condiciones interiores ti, hri, acumulando las condensaciones
+    de periodos sucesivos a partir del primer periodo con condensaciones que
+    sigue a otro sin ellas.
+
+    Los perfiles de presiones de vapor y de saturación de todos los periodos
+    se calculan una sola vez, en bloque, y las condensaciones de cada periodo
+    sin condensación previa se calculan una sola vez y se reutilizan al
+    recorrer el ciclo.
+
+    :param Cerramiento cerr: Cerramiento para comprobar
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param list climasext: Lista de climas exteriores (uno por periodo)
+    :returns: array de cantidades condensadas acumuladas [g/m²mes] con forma
+        periodos x interfases
+    :rtype: numpy.ndarray
+    """
+    nperiodos = len(climasext)
+    ninterfases = len(cerr.capas) + 1
+    g = numpy.zeros((nperiodos, ninterfases))
+    if not nperiodos:
+        return g
+    te, hre = climas2arrays(climasext)
+    p = cerr.presioneslote(te, ti, hre, hri)
+    p_sat = cerr.presionessatlote(te, ti)
+    # Sin condensación previa solo puede haber condensación si la presión de
+    # vapor supera a la de saturación en alguna interfase intermedia
+    posible = (p_sat[:, 2:-2] < p[:, 2:-2]).any(axis=1)
+    sinprevia = {}
+
+    def _condensacion(j, gprevia=None):
+        """Condensaciones en el periodo j, reutilizando las que no tienen previa"""
+        if gprevia is not None and gprevia.any():
+            return cerr.condensacionperfil(p[j], p_sat[j], gprevia)
+        if j not in sinprevia:
+            if posible[j]:
+                sinprevia[j] = cerr.condensacionperfil(p[j], p_sat[j])
+            else:
+                sinprevia[j] = numpy.zeros(ninterfases)
+        return sinprevia[j]
+
+    # Localizar primer mes sin condensaciones previas
+    prevcondensa = True
+    for startindex in range(nperiodos):
+        cond = _condensacion(startindex).any()
+        if not cond:
+            prevcondensa = False
+        elif not prevcondensa:
+            break
+    # Si agotamos la lista sin condensaciones volvemos al principio
+    if startindex == (nperiodos - 1) and not cond:
+        startindex = 0
+    # Calculamos condensaciones en orden
+    gprevia = None
+    for j in range(startindex, nperiodos) + range(0, startindex):
+        gprevia = g[j] = _condensacion(j, gprevia)
+    return g
+
+class CondensacionesIntersticiales(object):
+    """Condensaciones intersticiales por periodos e interfases
+
+    Almacena las cantidades condensadas acumuladas [g/m²mes] en un array con
+    forma periodos x interfases, sobre el que se calculan de forma
+    vectorizada los totales por periodo, los máximos acumulados, en total y
+    por interfase, y los periodos o interfases con condensaciones.
+
+    Para compatibilidad, se comporta como la lista de periodos que devolvía
+    :py:func:`calculaintersticiales`, en la que cada elemento es la lista de
+    tuplas (índice de interfase, cantidad condensada) de las interfases con
+    condensación en ese periodo:
+
+    [[(1, 2.5), (3, 3.0), ..., (i, gi)], ..., mesj]
+    """
+    def __init__(self, g):
+        """Inicialización a partir del array de condensaciones
+
+        :param array g: cantidades condensadas acumuladas [g/m²mes] con forma
+            periodos x interfases
+        """
+        #: condensaciones acumuladas por periodos e interfases [g/m²mes] (array)
+        self.g = numpy.asarray(g, dtype=float)
+
+    def __len__(self):
+        return self.g.shape[0]
+
+    def __getitem__(self, i):
+        return [(n, gn) for n, gn in enumerate(self.g[i].tolist()) if gn > 0.0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tuplas(self):
+        """Lista de condensaciones por periodos en formato de tuplas
+
+        :returns: Lista de listas de tuplas (interfase, cantidad) por periodo
+        :rtype: list
+        """
+        return list(self)
+
+    @property
+    def nperiodos(self):
+        """Número de periodos"""
+        return self.g.shape[0]
+
+    @property
+    def ninterfases(self):
+        """Número de interfases"""
+        return self.g.shape[1]
+
+    @property
+    def totalperiodos(self):
+        """Condensación total en todas las interfases por periodo [g/m²mes]"""
+        return self.g.sum(axis=1)
+
+    @property
+    def gmaxinterfases(self):
+        """Máxima cantidad condensada acumulada en cada interfase [g/m²]
+
+        Las cantidades de cada periodo ya incluyen las acumuladas en los
+        periodos anteriores, por lo que no se suman entre periodos.
+        """
+        return self.g.max(axis=0)
+
+    @property
+    def gmax(self):
+        """Máxima cantidad condensada acumulada en una interfase [g/m²]"""
+        return float(self.g.max()) if self.g.size else 0.0
+
+    @property
+    def periodoscondensan(self):
+        """Máscara de periodos con condensaciones (array de bool)"""
+        return (self.g > 0.0).any(axis=1)
+
+    @property
+    def interfasescondensan(self):
+        """Máscara de interfases con condensaciones en algún periodo"""
+        return (self.g > 0.0).any(axis=0)
+
+    @property
+    def condensa(self):
+        """¿Existen condensaciones en algún periodo?"""
+        return bool((self.g > 0.0).any())
+
 def calculaintersticiales(cerr, ti, hri, climasext):
-    """Devuelve lista de condensaciones intersticiales para cada interfase
+    """Devuelve las condensaciones intersticiales para cada interfase
     
     Se calcula usando como clima exterior cada uno de los elementos en
     self.climaslist y condiciones interiores ti, hri.
@@ -106,27 +258,12 @@ def calculaintersticiales(cerr, ti, hri, climasext):
     con condensación intersticial.
     
     [[(1, 2.5), (3, 3.0), ..., (i, gi)], ..., mesj]
+
+    El cálculo se realiza con :py:func:`cicloanual` y el resultado se
+    devuelve como :py:class:`CondensacionesIntersticiales`, que ofrece esa
+    vista como lista de tuplas junto a los datos en forma de array.
     """
-    # Localizar primer mes sin condensaciones previas
-    prevcondensa = True
-    for startindex, climaj in enumerate(climasext):
-        cond = cerr.condensacion(climaj.temp, ti, climaj.HR, hri)
-        if not cond:
-            prevcondensa = False
-        elif not prevcondensa:
-            break
-    # Si agotamos la lista sin condensaciones volvemos al principio
-    if startindex == (len(climasext) - 1) and not cond:
-        startindex = 0
-    # Calculamos condensaciones en orden
-    glist = []
-    cond = []
-    for i in range(startindex, len(climasext)) + range(0, startindex):
-        climaj = climasext[i]
-        cond = cerr.condensacion(climaj.temp, ti, climaj.HR, hri, cond)
-        glist.append(cond)
-    # Reordenar lista y guardar
-    return glist[-startindex:] + glist[:-startindex]
+    return CondensacionesIntersticiales(cicloanual(cerr, ti, hri, climasext))
 
 def gperiodo(glist, i=0):
     """Cantidad de condensación total de un periodo i en [g/m²mes]
@@ -137,12 +274,12 @@ def gperiodo(glist, i=0):
     :returns: Cantidad acumulada condensada durante el periodo
     :rtype: float
     """
-    if i < len(glist):
-        g = glist[i]
-        totalg = 0.0 if not g else sum(zip(*g)[1])
-    else:
-        totalg = 0.0
-    return totalg
+    if i >= len(glist):
+        return 0.0
+    if isinstance(glist, CondensacionesIntersticiales):
+        return float(glist.g[i].sum())
+    g = glist[i]
+    return 0.0 if not g else sum(zip(*g)[1])
 
 def gmeses(glist):
     """Lista de condensaciones acumuladas en todas las interfases por periodos
@@ -151,6 +288,8 @@ def gmeses(glist):
     :returns: Lista de condensaciones acumuladas
     :rtype: list
     """
+    if isinstance(glist, CondensacionesIntersticiales):
+        return glist.totalperiodos.tolist()
     return [gperiodo(glist, i) for i in range(len(glist))]
 
 def testcondensai(cerr, temp_ext, temp_int, HR_ext, HR_int):
@@ -193,3 +332,131 @@ def testcondensaciones(cerr, temp_ext, temp_int, HR_ext, HR_int):
     cs = testcondensas(cerr, temp_ext, temp_int, HR_int)
 
     return ci or cs
+
+def cumplecerramiento(cerr, ti, hri, climasext):
+    """Comprueba la ausencia de condensaciones superficiales e intersticiales
+
+    La condición de condensaciones superficiales se evalúa con el primer
+    clima de climasext (el mes de enero en las BBDD de climas mensuales) y se
+    omite si su temperatura es igual a la interior. La de condensaciones
+    intersticiales con el ciclo de todos los climas (ver cicloanual).
+
+    :param Cerramiento cerr: Cerramiento para comprobar
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param list climasext: Lista de climas exteriores (uno por periodo)
+    :returns: `True` si no existen condensaciones
+    :rtype: bool
+    """
+    if climasext[0].temp != ti:
+        if fRsi(cerr.U) < fRsimin(climasext[0].temp, ti, hri):
+            return False
+    return not cicloanual(cerr, ti, hri, climasext).any()
+
+def espesorminimo(cerr, indice, emin, emax, climasext, ti=20.0, hri=55.0,
+                  tolerancia=0.001):
+    """Espesor mínimo de una capa para que no existan condensaciones
+
+    Busca el menor espesor de la capa indice del cerramiento en el intervalo
+    [emin, emax] con el que fRsi >= fRsimin y no existen condensaciones
+    intersticiales (ver cumplecerramiento).
+
+    Se supone que el cumplimiento es monótono con el espesor, como ocurre al
+    aumentar el aislamiento de un cerramiento: U disminuye y los perfiles de
+    temperatura y presión varían de forma monótona. Así, el espesor necesario
+    por condensaciones superficiales se calcula directamente a partir de la
+    resistencia térmica necesaria y, si con él existen condensaciones
+    intersticiales, se acota el espesor mínimo por bisección. El número de
+    cálculos del ciclo anual es del orden de log2((emax - emin) / tolerancia).
+
+    La suposición no se cumple, por ejemplo, en una capa con resistencia al
+    vapor situada en el lado frío del aislamiento, cuyo aumento de espesor
+    puede provocar condensaciones intersticiales. Por ello se comprueba que
+    los extremos del intervalo acotan la solución y se produce un error si
+    se cumple con emin pero no con emax. Si el cumplimiento no es monótono en
+    el interior del intervalo el resultado cumple las condiciones, pero
+    puede no ser el menor espesor que las cumple.
+
+    El cerramiento recibido no se modifica.
+
+    :param Cerramiento cerr: Cerramiento para comprobar
+    :param int indice: Índice de la capa de espesor variable
+    :param float emin: Espesor mínimo de la capa [m]
+    :param float emax: Espesor máximo de la capa [m]
+    :param list climasext: Lista de climas exteriores (uno por periodo)
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param float tolerancia: Precisión del espesor [m]
+    :returns: espesor mínimo [m], que cumple las condiciones, o None si no
+        se cumplen con el espesor máximo
+    :rtype: float
+    :raise ValueError: si la capa no tiene conductividad (p.e. un material
+        de tipo RESISTANCE), el intervalo no es válido o se cumplen las
+        condiciones con emin pero no con emax
+    """
+    if not 0.0 <= emin <= emax:
+        raise ValueError('Intervalo de espesores no válido')
+    K = cerr.K[indice]
+    if not K > 0.0:
+        raise ValueError('El espesor de la capa %i no modifica su resistencia'
+                         % indice)
+    c = copy.copy(cerr)
+    nombre, e0 = c.capas[indice]
+    def cumple(e):
+        c.capas[indice] = (nombre, e)
+        return cumplecerramiento(c, ti, hri, climasext)
+
+    cumplemin, cumplemax = cumple(emin), cumple(emax)
+    if cumplemin and not cumplemax:
+        raise ValueError('El cumplimiento no es monótono con el espesor de la '
+                         'capa %i: se cumple con %s m pero no con %s m'
+                         % (indice, emin, emax))
+    if cumplemin:
+        return emin
+    if not cumplemax:
+        return None
+    # Espesor necesario para fRsi >= fRsimin: U <= 4 (1 - fRsimin)
+    inferior = emin
+    te = climasext[0].temp
+    if te != ti:
+        Rnecesaria = 1.0 / (4.0 * (1.0 - fRsimin(te, ti, hri)))
+        inferior = max(emin, e0 + (Rnecesaria - cerr.R_total) * K)
+    if inferior >= emax:
+        return emax
+    if cumple(inferior):
+        return inferior
+    superior = emax
+    while superior - inferior > tolerancia:
+        medio = 0.5 * (inferior + superior)
+        if cumple(medio):
+            superior = medio
+        else:
+            inferior = medio
+    return superior
+
+def espesorminimolocalidades(cerr, indice, emin, emax, climasdb, ti=20.0,
+                             hri=55.0, tolerancia=0.001):
+    """Espesor mínimo de una capa en cada localidad de una BBDD de climas
+
+    Ver :py:func:`espesorminimo`.
+
+    :param Cerramiento cerr: Cerramiento para comprobar
+    :param int indice: Índice de la capa de espesor variable
+    :param float emin: Espesor mínimo de la capa [m]
+    :param float emax: Espesor máximo de la capa [m]
+    :param dict climasdb: diccionario de listas de climas exteriores por
+        localidad (p.e. la BBDD de climas)
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param float tolerancia: Precisión del espesor [m]
+    :returns: diccionario de espesores mínimos [m] por localidad (None si no
+        se cumplen las condiciones con el espesor máximo)
+    :rtype: dict
+    :raise ValueError: en los casos de espesorminimo
+    """
+    return dict((localidad, espesorminimo(cerr, indice, emin, emax,
+                                          climasext, ti, hri, tolerancia))
+                for localidad, climasext in climasdb.items())
+
+perfil.registra(__name__, 'calculaintersticiales', 'cicloanual',
+                'espesorminimo')
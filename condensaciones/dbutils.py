@@ -27,24 +27,43 @@ sus propiedades.
 """
 
 import os
+import time
 import codecs
+import tempfile
+import multiprocessing
 import configobj
+import material, cerramiento, clima, sqlitedb
 from material import Material
 
 #===============================================================================
 # Funciones de conversión desde BBDD de Lider / Calener a BBDD de Materiales
 #===============================================================================
 
-def parsefile(dbfile):
-    """Interpreta secciones de la base de datos
-    
-    Devuelve:
-        - diccionario de secciones con diccionario de materiales por sección.
-    
-    El diccionario de materiales contiene diccionario de propiedades.
-    
+#: Sección a la que pertenecen los bloques previos a cualquier sección
+DEFAULT_SECTION = u'default'
+
+def _parseblock(block):
+    """Convierte bloque de datos a diccionario indexado por propiedades"""
+    _dict = {}
+    _nombre, _propiedad = block[0].split('=')
+    _dict[_propiedad.strip(" \"")] = _nombre.strip(" \"")
+    for line in block[1:]:
+        _prop, _dato = line.split('=')
+        _dict[_prop.strip(" \"")] = _dato.strip(" \"")
+    return _dict
+
+def iterblocks(dbfile):
+    """Genera los bloques de datos de la base de datos, uno a uno
+
+    El archivo se lee de forma incremental, de modo que la memoria necesaria
+    no depende del tamaño de la base de datos.
+
+    Genera tuplas (sección, bloque), donde bloque es un diccionario de
+    propiedades del elemento y sección es el nombre de la sección en la que
+    se encuentra (DEFAULT_SECTION si no está en ninguna).
+
     Las bases de datos se almacenan con codificación ISO-8859-1.
-    
+
     Formato general del archivo
     ---------------------------
     
@@ -87,129 +106,336 @@ def parsefile(dbfile):
     KEYWORDS = ('TEMPLARY',)
     SECTIONDELIMITER = '+++'
     COMMENT = '$'
-    DEFAULT_SECTION = u'default'
-    
-    def parseblock(block):
-        """Convierte bloque de datos a diccionario indexado por propiedades"""
-        _dict = {}
-        _nombre, _propiedad = block[0].split('=')
-        _dict[_propiedad.strip(" \"")] = _nombre.strip(" \"")
-        for line in block[1:]:
-            _prop, _dato = line.split('=')
-            _dict[_prop.strip(" \"")] = _dato.strip(" \"")
-        return _dict
-
-    lines = codecs.open(dbfile, 'rb', 'iso-8859-1')
-    data = {}
-    block = []
-    materiales = []
-    currentsection = DEFAULT_SECTION
-
-    for line in lines:
-        line = line.strip()
-        if line.startswith(COMMENT) or line == "":
-            continue
-        elif line.startswith(KEYWORDS):
-            continue
-        elif line.startswith(SECTIONDELIMITER):
-            nextsection = lines.next().strip()
-            lines.next() #el formato es delimitador // nombre // delimitador
-            data[currentsection] = materiales[:]
-            materiales = []
-            currentsection = nextsection
-            continue
-        else:
-            # Cuando llegamos al final de un bloque forzamos su interpretación
-            block = []
-            while not line.startswith('..'):
-                block.append(line)
-                line = lines.next().strip()
-            materiales.append(parseblock(block))
-    if not data.keys(): # solamente hay sección default 
-        data[currentsection] = materiales[:]
+
+    with codecs.open(dbfile, 'rb', 'iso-8859-1') as lines:
+        currentsection = DEFAULT_SECTION
+        for line in lines:
+            line = line.strip()
+            if line.startswith(COMMENT) or line == "":
+                continue
+            elif line.startswith(KEYWORDS):
+                continue
+            elif line.startswith(SECTIONDELIMITER):
+                #el formato es delimitador // nombre // delimitador
+                currentsection = lines.next().strip()
+                lines.next()
+                continue
+            else:
+                # Cuando llegamos al final de un bloque forzamos su
+                # interpretación
+                block = []
+                while not line.startswith('..'):
+                    block.append(line)
+                    line = lines.next().strip()
+                yield currentsection, _parseblock(block)
+
+def parsefile(dbfile):
+    """Interpreta secciones de la base de datos
+
+    Devuelve:
+        - diccionario de secciones con lista de materiales por sección.
+
+    Cada material es un diccionario de propiedades. La sección
+    DEFAULT_SECTION está siempre presente. Para archivos grandes es
+    preferible recorrer los bloques con iterblocks.
+    """
+    data = {DEFAULT_SECTION: []}
+    for section, block in iterblocks(dbfile):
+        data.setdefault(section, []).append(block)
     return data
 
+def _block2material(rm, db=''):
+    """Convierte un bloque de datos de material en una instancia de Material
+
+    :param dict rm: diccionario de propiedades del bloque
+    :param str db: base de datos de procedencia del material
+    :rtype: Material
+    """
+    mtype = rm['TYPE'].strip()
+    name = rm['NAME'].strip()
+    group = rm['GROUP'].strip()
+    mu = float(rm['VAPOUR-DIFFUSIVITY-FACTOR'].strip())
+    m = Material(name, group, mtype, mu, db)
+    if mtype == 'PROPERTIES':
+        m.conductivity = float(rm['CONDUCTIVITY'].strip())
+        m.thickness = float(rm['THICKNESS'].strip())
+        m.density = float(rm['DENSITY'].strip())
+        m.specific_heat = float(rm['SPECIFIC-HEAT'].strip())
+    elif mtype == 'RESISTANCE':
+        m.resistance = float(rm['RESISTANCE'].strip())
+    # Propiedades opcionales
+    if 'THICKNESS_CHANGE' in rm:
+        value = rm['THICKNESS_CHANGE'].strip().upper()
+        m.thickness_change = False if 'NO' in value else True
+    if 'THICKNESS_MIN' in rm:
+        m.thickness_min = float(rm['THICKNESS_MIN'].strip())
+    if 'THICKNESS_MAX' in rm:
+        m.thickness_max = float(rm['THICKNESS_MAX'].strip())
+    return m
+
+def _iterfilematerials(dbfile):
+    """Genera los materiales de la sección DEFAULT_SECTION de un archivo"""
+    db = os.path.basename(dbfile) or ''
+    for section, rm in iterblocks(dbfile):
+        if section == DEFAULT_SECTION:
+            yield _block2material(rm, db)
+
+def _filematerials(dbfile):
+    """Lista de materiales de un archivo y tiempo de interpretación [s]
+
+    Es la tarea que realiza cada proceso en la importación en paralelo.
+    """
+    t0 = time.time()
+    materiales = list(_iterfilematerials(dbfile))
+    return materiales, time.time() - t0
+
+def _iterfiles(dbfiles, workers=1):
+    """Genera los materiales de cada archivo en el orden indicado
+
+    Genera tuplas (archivo, materiales, tiempo). Con varios procesos los
+    archivos se interpretan en paralelo, materiales es una lista y tiempo el
+    tiempo de interpretación en el proceso [s]. En otro caso materiales es un
+    generador que interpreta el archivo al recorrerlo y tiempo es None.
+    """
+    if workers > 1 and len(dbfiles) > 1:
+        pool = multiprocessing.Pool(min(workers, len(dbfiles)))
+        try:
+            for i, (materiales, tiempo) in enumerate(
+                                    pool.imap(_filematerials, dbfiles)):
+                yield dbfiles[i], materiales, tiempo
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for dbfile in dbfiles:
+            yield dbfile, _iterfilematerials(dbfile), None
+
+def itermaterials(dbfiles):
+    """Genera los materiales de una lista de archivos de BBDD LIDER/CALENER
+
+    Se leen los bloques de la sección DEFAULT_SECTION de cada archivo, en el
+    orden indicado. Si un nombre de material se repite prevalece su primera
+    aparición y se omiten las siguientes.
+    """
+    if not isinstance(dbfiles, (tuple, list)):
+        dbfiles = [dbfiles]
+    seen = set()
+    for _f in dbfiles:
+        for m in _iterfilematerials(_f):
+            if m.name in seen:
+                continue
+            seen.add(m.name)
+            yield m
+
 def _db2data(dbfiles):
     """Convierte lista de archivos de BBDD LIDER/CALENER en objetos Python
-    
+
     Devuelve:
         - diccionario de nombres de material con instancias de Material
         - lista de nombres de materiales (por orden de aparición en BBDD)
         - diccionario grupos con conjuntos de nombres de material
+
+    Si un nombre de material se repite prevalece su primera aparición.
     """
-    DEFAULT_SECTION = u'default'
-    
     materiales, nombres, groups = {}, [], {}
-    if not isinstance(dbfiles, (tuple, list)):
-        dbfiles = [dbfiles]
-
-    for _f in dbfiles:
-        rawmaterials = parsefile(_f)
-        for rm in rawmaterials[DEFAULT_SECTION]:
-            mtype = rm['TYPE'].strip()
-            name = rm['NAME'].strip()
-            group = rm['GROUP'].strip()
-            mu = float(rm['VAPOUR-DIFFUSIVITY-FACTOR'].strip())
-            db = os.path.basename(_f) or ''
-            m = Material(name, group, mtype, mu, db)
-            if mtype == 'PROPERTIES':
-                m.conductivity = float(rm['CONDUCTIVITY'].strip())
-                m.thickness = float(rm['THICKNESS'].strip())
-                m.density = float(rm['DENSITY'].strip())
-                m.specific_heat = float(rm['SPECIFIC-HEAT'].strip())
-            elif mtype == 'RESISTANCE':
-                m.resistance = float(rm['RESISTANCE'].strip())
-            # Propiedades opcionales
-            if 'THICKNESS_CHANGE' in rm:
-                value = rm['THICKNESS_CHANGE'].strip().upper()
-                m.thickness_change = False if 'NO' in value else True
-            if 'THICKNESS_MIN' in rm:
-                m.thickness_min = float(rm['THICKNESS_MIN'].strip())
-            if 'THICKNESS_MAX' in rm:
-                m.thickness_max = float(rm['THICKNESS_MAX'].strip())
-            groups.setdefault(group, set()).add(name)
-            nombres.append(name)
-            materiales[name] = m
+    for m in itermaterials(dbfiles):
+        groups.setdefault(m.group, set()).add(m.name)
+        nombres.append(m.name)
+        materiales[m.name] = m
     return materiales, nombres, groups
 
-def DB2ini(dbfiles, filename='DB.ini'):
-    """Guarda bases de datos de formato LIDER/CALENER en formato ConfigObj
-    
-    Devuelve:
-        - número de materiales
-        - número de grupos
-    """
+def _material2lines(mat):
+    """Líneas en formato ConfigObj de la sección de un material"""
     def escape(data):
         """Escape &, [ and ] a string of data."""
         data = data.replace("&", "&amp;")
         return data.replace("[", "&lb;").replace("]", "&rb;")
-    
-    materiales, names, groups = _db2data(dbfiles)
-    config = configobj.ConfigObj(filename, encoding='utf-8')
 
-    for name in names:
-        mat = materiales[name]
-        # Problema con corchetes en nombre de sección mat.name
-        section = escape(mat.name)
-        config[section] = {}
-        config.comments[section].insert(0, '#') #linea en blanco
-        config[section]['name'] = mat.name
-        config[section]['db'] = mat.db
-        config[section]['group'] = mat.group
-        config[section]['type'] = mat.type
-        config[section]['mu'] = mat.mu
-        if hasattr(mat, 'thickness_change'):
-            config[section]['thickness_change'] = str(mat.thickness_change)
-        if mat.type == 'PROPERTIES':
-            config[section]['thickness'] = str(mat.thickness)
-            config[section]['conductivity'] = str(mat.conductivity)
-            config[section]['density'] = str(mat.density)
-            config[section]['specific_heat'] = str(mat.specific_heat)
-            if hasattr(mat, 'thickness_min'):
-                config[section]['thickness_min'] = str(mat.thickness_min)
-            if hasattr(mat, 'thickness_max'):
-                config[section]['thickness_max'] = str(mat.thickness_max)
-        elif mat.type == 'RESISTANCE':
-            config[section]['resistance'] = str(mat.resistance)
+    config = configobj.ConfigObj(encoding='utf-8')
+    # Problema con corchetes en nombre de sección mat.name
+    section = escape(mat.name)
+    config[section] = {}
+    config.comments[section].insert(0, '#') #linea en blanco
+    config[section]['name'] = mat.name
+    config[section]['db'] = mat.db
+    config[section]['group'] = mat.group
+    config[section]['type'] = mat.type
+    config[section]['mu'] = mat.mu
+    if hasattr(mat, 'thickness_change'):
+        config[section]['thickness_change'] = str(mat.thickness_change)
+    if mat.type == 'PROPERTIES':
+        config[section]['thickness'] = str(mat.thickness)
+        config[section]['conductivity'] = str(mat.conductivity)
+        config[section]['density'] = str(mat.density)
+        config[section]['specific_heat'] = str(mat.specific_heat)
+        if getattr(mat, 'thickness_min', None) is not None:
+            config[section]['thickness_min'] = str(mat.thickness_min)
+        if getattr(mat, 'thickness_max', None) is not None:
+            config[section]['thickness_max'] = str(mat.thickness_max)
+    elif mat.type == 'RESISTANCE':
+        config[section]['resistance'] = str(mat.resistance)
+    return config.write()
+
+def _fusionaini(filename, nuevos):
+    """Añade a un archivo ConfigObj las secciones de otro
+
+    Las secciones con el mismo nombre se sustituyen manteniendo su posición.
+
+    :param str filename: archivo que se actualiza
+    :param str nuevos: archivo con las secciones que se añaden
+    """
+    config = configobj.ConfigObj(filename, encoding='utf-8')
+    nuevas = configobj.ConfigObj(nuevos, encoding='utf-8')
+    for section in nuevas:
+        config[section] = nuevas[section].dict()
+        config.comments[section] = nuevas.comments[section]
     config.write()
-    return len(names), len(groups)
+
+def DB2ini(dbfiles, filename='DB.ini', workers=1, informe=None,
+           sobrescribe=False):
+    """Guarda bases de datos de formato LIDER/CALENER en formato ConfigObj
+
+    Con un único proceso cada material se escribe en cuanto se interpreta,
+    sin cargar la base de datos completa en memoria, por lo que es la opción
+    predeterminada. Con varios procesos los archivos se interpretan en
+    paralelo y se escriben en el orden indicado, de modo que el resultado es
+    el mismo, pero cada proceso devuelve la lista completa de materiales de
+    su archivo y pueden estar en memoria a la vez tantos archivos como
+    procesos. Si un nombre de material se repite prevalece su primera
+    aparición.
+
+    Si el archivo de destino ya existe los materiales se añaden a los que
+    contiene, sustituyendo los que tengan el mismo nombre y conservando el
+    resto de secciones (p.e. config). En ese caso los materiales se escriben
+    primero en un archivo temporal y la fusión sí carga ambas BBDD en
+    memoria. Con sobrescribe=True el archivo de destino se sustituye.
+
+    :param list dbfiles: archivos de BBDD LIDER/CALENER
+    :param str filename: archivo de destino
+    :param int workers: número de procesos de interpretación
+    :param informe: función a la que se llama al terminar cada archivo con
+        los argumentos (archivo, número de materiales, número de materiales
+        añadidos, tiempo de interpretación [s])
+    :param bool sobrescribe: sustituir el archivo de destino si existe en
+        lugar de añadirle los materiales
+
+    Devuelve:
+        - número de materiales convertidos
+        - número de grupos de los materiales convertidos
+    """
+    if not isinstance(dbfiles, (tuple, list)):
+        dbfiles = [dbfiles]
+    fusiona = not sobrescribe and os.path.exists(filename)
+    if fusiona:
+        fd, destino = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(
+                                                os.path.abspath(filename)))
+        outfile = os.fdopen(fd, 'wb')
+    else:
+        destino = filename
+        outfile = open(filename, 'wb')
+    seen, groups = set(), set()
+    try:
+        with outfile:
+            for dbfile, materiales, tiempo in _iterfiles(dbfiles, workers):
+                t0 = time.time()
+                nmats = nnuevos = 0
+                for mat in materiales:
+                    nmats += 1
+                    if mat.name in seen:
+                        continue
+                    seen.add(mat.name)
+                    for line in _material2lines(mat):
+                        outfile.write(line + os.linesep)
+                    nnuevos += 1
+                    groups.add(mat.group)
+                if informe is not None:
+                    if tiempo is None:
+                        tiempo = time.time() - t0
+                    informe(dbfile, nmats, nnuevos, tiempo)
+        if fusiona:
+            _fusionaini(filename, destino)
+    finally:
+        if fusiona and os.path.exists(destino):
+            os.remove(destino)
+    return len(seen), len(groups)
+
+#===============================================================================
+# Funciones de conversión entre BBDD ConfigObj y SQLite
+#===============================================================================
+
+def ini2sqlite(dbfile, materialesfile=None, cerramientosfile=None,
+               climasfile=None):
+    """Importa bases de datos en formato ConfigObj a una BBDD SQLite
+
+    Los registros existentes en la base de datos SQLite con el mismo nombre
+    se sustituyen. La importación se realiza en una única transacción.
+
+    :param str dbfile: archivo de la base de datos SQLite
+    :param str materialesfile: BBDD de materiales en formato ConfigObj
+    :param str cerramientosfile: BBDD de cerramientos en formato ConfigObj
+    :param str climasfile: BBDD de climas en formato ConfigObj
+
+    Devuelve:
+        - número de materiales, cerramientos y localidades importados
+    """
+    mdb = cdb = None
+    if materialesfile:
+        mdb = material.MaterialesDB(materialesfile)
+    if cerramientosfile:
+        cdb = cerramiento.CerramientosDB(cerramientosfile, matDB=mdb)
+    climas, cnames, climasconfig = (clima.loadclimadb(climasfile)
+                                    if climasfile else ({}, [], None))
+    db = sqlitedb.SQLiteDB(dbfile)
+    try:
+        with db.transaccion():
+            if mdb is not None:
+                db.setconfig('materiales', mdb.config)
+                for nombre in mdb.nombres:
+                    db.setmaterial(material.material2record(mdb[nombre]))
+            if cdb is not None:
+                db.setconfig('cerramientos', cdb.config)
+                for nombre in cdb.nombres:
+                    c = cdb[nombre]
+                    db.setcerramiento(nombre, c.descripcion, list(c.capas),
+                                      c.tipo, c.Rse, c.Rsi)
+            if climasfile:
+                db.setconfig('climas', climasconfig)
+                for nombre in cnames:
+                    db.setclima(nombre, [(c.temp, c.HR)
+                                         for c in climas[nombre]])
+    finally:
+        db.close()
+    return (len(mdb) if mdb else 0, len(cdb.nombres) if cdb else 0,
+            len(cnames))
+
+def sqlite2ini(dbfile, materialesfile=None, cerramientosfile=None,
+               climasfile=None):
+    """Exporta una BBDD SQLite a bases de datos en formato ConfigObj
+
+    :param str dbfile: archivo de la base de datos SQLite
+    :param str materialesfile: BBDD de materiales en formato ConfigObj
+    :param str cerramientosfile: BBDD de cerramientos en formato ConfigObj
+    :param str climasfile: BBDD de climas en formato ConfigObj
+    """
+    db = sqlitedb.SQLiteDB(dbfile)
+    try:
+        hasmateriales = bool(db.nombres('materiales'))
+    finally:
+        db.close()
+    mdb = material.MaterialesDB(dbfile) if hasmateriales else None
+    if materialesfile:
+        with open(materialesfile, 'wb') as outfile:
+            if mdb is not None and mdb.config:
+                config = configobj.ConfigObj(encoding='utf-8')
+                config['config'] = mdb.config
+                for line in config.write():
+                    outfile.write(line + os.linesep)
+            for nombre in (mdb.nombres if mdb is not None else []):
+                for line in _material2lines(mdb[nombre]):
+                    outfile.write(line + os.linesep)
+    if cerramientosfile:
+        cdb = cerramiento.CerramientosDB(dbfile, matDB=mdb)
+        cdb.savecerramientosdb(cerramientosfile)
+    if climasfile:
+        climas, cnames, climasconfig = clima.loadclimadb(dbfile)
+        clima.saveclimasdb(climas, cnames, climasconfig, climasfile)
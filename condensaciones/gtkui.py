@@ -250,7 +250,8 @@ class GtkCondensa(object):
         addtxt((u"\n¿Existen condensaciones superficiales?: %s\n"
                 u"¿Existen condensaciones intersticiales?: %s\n") % (cs, ci), resultados)
         if m.ci:
-            meses = u", ".join(u"%i" % i for i, value in enumerate(m.glist) if value)
+            meses = u", ".join(u"%i" % i for i
+                               in m.glist.periodoscondensan.nonzero()[0])
             addtxt((u"\nPeriodos con condensaciones intersticiales: %s\n") % meses, resultados)
         # Nota copyright
         today = datetime.datetime.now().strftime("%d/%m/%Y - %H:%M:%S")
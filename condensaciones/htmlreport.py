@@ -24,6 +24,7 @@
 
 import datetime
 from .util import config
+from . import perfil
 
 __HTMLTEMPLATE = u"""
 <!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN"
@@ -127,7 +128,8 @@ def createreport(ui, model):
     cs = u"Sí" if model.cs else u"No"
     ci = u"Sí" if model.ci else u"No"
     if model.ci:
-        meses = u", ".join(u"%i" % i for i, value in enumerate(model.glist) if value)
+        meses = u", ".join(u"%i" % i for i
+                           in model.glist.periodoscondensan.nonzero()[0])
         cimeses = u"\nPeriodos con condensaciones intersticiales: %s\n" % meses
     else:
         cimeses = u''
@@ -173,3 +175,5 @@ def createreport(ui, model):
     graficaprestemp.save(filename)
     filename = config.userresource('report','condensacionesplot.png')
     graficacondensaciones.save(filename)
+
+perfil.registra(__name__, 'createreport')
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Análisis de incertidumbre por el método de Monte Carlo
+
+Los valores de conductividad y difusividad al vapor de la BBDD de materiales
+son nominales y los climas mensuales son valores medios. Este módulo evalúa
+el ciclo anual de condensaciones de un cerramiento para muestras aleatorias
+de esos valores (ver Perturbacion y montecarlo) y obtiene la probabilidad
+de condensación y la distribución de las cantidades condensadas.
+
+Las muestras se evalúan en bloques con el cálculo vectorizado de
+:py:mod:`barrido`. Cada bloque tiene su propio generador de números
+aleatorios, inicializado con la semilla y el número de bloque, de modo que
+los resultados son los mismos con cualquier número de procesos.
+"""
+
+import numpy
+import multiprocessing
+from . import barrido, comprobaciones, perfil
+from .clima import climas2arrays
+
+class Perturbacion(object):
+    """Distribución de la perturbación aleatoria de una propiedad
+
+    - tipo: 'normal', 'lognormal' o 'uniforme'
+    - dispersion: desviación típica ('normal'), desviación típica del
+      logaritmo ('lognormal') o semiamplitud del intervalo ('uniforme')
+
+    Las propiedades de los materiales se multiplican por factores aleatorios
+    (1 + d, o exp(d) en la distribución lognormal, siendo d la desviación
+    aleatoria) y a las de los climas se les suman incrementos aleatorios d,
+    en sus unidades (ºC, %).
+
+    Los factores 1 + d de las distribuciones normal y uniforme se truncan en
+    FACTORMINIMO (las desviaciones que dan factores menores se vuelven a
+    generar), de modo que las propiedades perturbadas sean siempre
+    positivas aunque la dispersión sea grande.
+    """
+    TIPOS = ('normal', 'lognormal', 'uniforme')
+    #: Factor mínimo de las distribuciones normal y uniforme
+    FACTORMINIMO = 0.01
+
+    def __init__(self, tipo='normal', dispersion=0.1):
+        """Inicialización de la distribución
+
+        :param str tipo: tipo de distribución (ver TIPOS)
+        :param float dispersion: dispersión de la distribución
+        :raise ValueError: si el tipo no existe o la dispersión es negativa
+        """
+        if tipo not in self.TIPOS:
+            raise ValueError('Distribución desconocida: %s' % tipo)
+        if not dispersion >= 0.0:
+            raise ValueError('Dispersión no válida: %s' % dispersion)
+        self.tipo = tipo
+        self.dispersion = float(dispersion)
+
+    def __repr__(self):
+        return 'Perturbacion(%r, %r)' % (self.tipo, self.dispersion)
+
+    def _desviaciones(self, rng, forma):
+        """Desviaciones aleatorias con la distribución y forma dadas"""
+        if self.tipo == 'uniforme':
+            return self.dispersion * rng.uniform(-1.0, 1.0, forma)
+        return self.dispersion * rng.standard_normal(forma)
+
+    def factores(self, rng, forma):
+        """Factores aleatorios para perturbaciones relativas
+
+        :param numpy.random.RandomState rng: generador de números aleatorios
+        :param tuple forma: forma del array de factores
+        :rtype: numpy.ndarray
+        """
+        d = self._desviaciones(rng, forma)
+        if self.tipo == 'lognormal':
+            return numpy.exp(d)
+        factores = 1.0 + d
+        fuera = numpy.flatnonzero(factores < self.FACTORMINIMO)
+        while len(fuera):
+            factores.flat[fuera] = 1.0 + self._desviaciones(rng, len(fuera))
+            fuera = fuera[factores.flat[fuera] < self.FACTORMINIMO]
+        return factores
+
+    def incrementos(self, rng, forma):
+        """Incrementos aleatorios para perturbaciones absolutas
+
+        :param numpy.random.RandomState rng: generador de números aleatorios
+        :param tuple forma: forma del array de incrementos
+        :rtype: numpy.ndarray
+        :raise ValueError: si la distribución es lognormal
+        """
+        if self.tipo == 'lognormal':
+            raise ValueError('La distribución lognormal no es aditiva')
+        return self._desviaciones(rng, forma)
+
+#: Perturbaciones predeterminadas de conductividad (o resistencia) y
+#: difusividad al vapor de los materiales y de temperatura y humedad relativa
+#: exteriores de cada periodo
+PERTURBACIONES = {'conductividad': Perturbacion('lognormal', 0.1),
+                  'mu': Perturbacion('lognormal', 0.3),
+                  'temperatura': Perturbacion('normal', 1.0),
+                  'humedad': Perturbacion('normal', 5.0)}
+
+class ResultadoMontecarlo(object):
+    """Resultados de un análisis de Monte Carlo
+
+    - U: transmitancia térmica de cada muestra [W/m²K]
+    - cs: ¿existen condensaciones superficiales en cada muestra? (bool)
+    - gmax: máxima condensación acumulada en el ciclo de periodos de cada
+      muestra en cada interfase [g/m²], con forma muestras x interfases
+    - ganual: suma de las condensaciones de todos los periodos de cada
+      muestra [g/m²]
+    """
+    def __init__(self, U, cs, gmax, ganual):
+        self.U = U
+        self.cs = cs
+        self.gmax = gmax
+        self.ganual = ganual
+
+    @property
+    def nmuestras(self):
+        """Número de muestras"""
+        return len(self.U)
+
+    @property
+    def ci(self):
+        """¿Existen condensaciones intersticiales en cada muestra? (bool)"""
+        return (self.gmax > 0.0).any(axis=1)
+
+    @property
+    def probabilidad(self):
+        """Probabilidad de condensaciones intersticiales"""
+        return self.ci.mean()
+
+    @property
+    def probabilidadcs(self):
+        """Probabilidad de condensaciones superficiales"""
+        return self.cs.mean()
+
+    @property
+    def probabilidadinterfases(self):
+        """Probabilidad de condensaciones en cada interfase"""
+        return (self.gmax > 0.0).mean(axis=0)
+
+    def cuantiles(self, probabilidades=(0.05, 0.5, 0.95)):
+        """Cuantiles de la condensación acumulada máxima de cada interfase
+
+        :param list probabilidades: probabilidades de los cuantiles [0, 1]
+        :returns: array de cuantiles [g/m²] con forma probabilidades x
+            interfases
+        :rtype: numpy.ndarray
+        """
+        return numpy.percentile(self.gmax,
+                                100.0 * numpy.asarray(probabilidades), axis=0)
+
+# Datos de cada proceso de cálculo, fijados al iniciarlo (ver _iniciaproceso)
+_proceso = {}
+
+def _modelo(cerr, climasext, ti, hri, perturbaciones, nmuestras, semilla,
+            lote):
+    """Datos necesarios para evaluar los bloques de muestras de un cerramiento
+
+    Los materiales distintos del cerramiento se numeran en orden de primera
+    aparición, de modo que todas las capas de un mismo material reciben la
+    misma perturbación.
+    """
+    nombres = cerr.nombres
+    materiales = []
+    for nombre in nombres:
+        if nombre not in materiales:
+            materiales.append(nombre)
+    ids = cerr.matDB.getids(materiales)
+    te, hre = climas2arrays(climasext)
+    return {'capas': numpy.array([materiales.index(nombre)
+                                  for nombre in nombres], dtype=int),
+            'e': numpy.array(cerr.tabla.e),
+            'K': cerr.matDB.columna('conductivity')[ids],
+            'resistencia': cerr.matDB.columna('resistance')[ids],
+            'mu': cerr.matDB.columna('mu')[ids],
+            'Rse': cerr.Rse, 'Rsi': cerr.Rsi, 'te': te, 'hre': hre,
+            'ti': ti, 'hri': hri, 'perturbaciones': perturbaciones,
+            'nmuestras': nmuestras, 'semilla': semilla, 'lote': lote}
+
+def evaluabloque(modelo, bloque):
+    """Evalúa un bloque de muestras
+
+    El generador de números aleatorios del bloque se inicializa con la
+    semilla y el número de bloque, de modo que cada bloque da siempre las
+    mismas muestras, sea cual sea el proceso que lo evalúa.
+
+    La perturbación de conductividad de los materiales de tipo RESISTANCE se
+    aplica dividiendo su resistencia térmica por el factor aleatorio.
+
+    :param dict modelo: datos del cerramiento, climas y perturbaciones
+    :param int bloque: número de bloque
+    :returns: arrays de U, cs, gmax y ganual de las muestras del bloque (ver
+        ResultadoMontecarlo)
+    :rtype: tuple
+    """
+    m = modelo
+    inicio = bloque * m['lote']
+    n = min(m['lote'], m['nmuestras'] - inicio)
+    nmateriales = len(m['K'])
+    nperiodos = len(m['te'])
+    perturbaciones = m['perturbaciones']
+    rng = numpy.random.RandomState([m['semilla'], bloque])
+
+    def _factores(nombre):
+        p = perturbaciones.get(nombre)
+        if p is None:
+            return numpy.ones((n, nmateriales))
+        return p.factores(rng, (n, nmateriales))
+
+    def _incrementos(nombre):
+        p = perturbaciones.get(nombre)
+        if p is None:
+            return numpy.zeros((n, nperiodos))
+        return p.incrementos(rng, (n, nperiodos))
+
+    fK = _factores('conductividad')
+    fmu = _factores('mu')
+    te = m['te'] + _incrementos('temperatura')
+    hre = numpy.clip(m['hre'] + _incrementos('humedad'), 0.0, 100.0)
+    # Tabla de capas de las muestras (ver TablaCapas)
+    capas = m['capas']
+    K = (m['K'] * fK)[:, capas]
+    Rcapa = numpy.where(~numpy.isnan(K), m['e'] / K,
+                        (m['resistencia'] / fK)[:, capas])
+    R = numpy.concatenate((numpy.repeat(m['Rse'], n)[:, numpy.newaxis], Rcapa,
+                           numpy.repeat(m['Rsi'], n)[:, numpy.newaxis]),
+                          axis=1)
+    S = m['e'] * (m['mu'] * fmu)[:, capas]
+    U, g = barrido.ciclovariantes(R, S, te, hre, m['ti'], m['hri'])
+    fRsimin = numpy.array([comprobaciones.fRsimin(t, m['ti'], m['hri'])
+                           if t != m['ti'] else numpy.nan for t in te[:, 0]])
+    cs = comprobaciones.fRsi(U) < fRsimin
+    return U, cs, g.max(axis=1), g.sum(axis=2).sum(axis=1)
+
+def _iniciaproceso(modelo):
+    """Fija los datos comunes de un proceso de cálculo"""
+    _proceso['modelo'] = modelo
+
+def _evaluaenproceso(bloque):
+    """Evalúa un bloque de muestras en un proceso de cálculo"""
+    return evaluabloque(_proceso['modelo'], bloque)
+
+def montecarlo(cerr, climasext, nmuestras=10000, ti=20.0, hri=55.0,
+               perturbaciones=None, semilla=0, procesos=1, lote=1000):
+    """Análisis de Monte Carlo de las condensaciones de un cerramiento
+
+    Cada muestra perturba la conductividad (o resistencia) y la difusividad
+    al vapor de cada material del cerramiento y la temperatura y humedad
+    relativa exteriores de cada periodo, según las distribuciones de
+    perturbaciones, y calcula el ciclo de periodos de condensaciones como
+    comprobaciones.cicloanual. Las condiciones interiores no se perturban.
+
+    fRsimin se calcula para cada muestra con la temperatura de su primer
+    clima exterior (el mes de enero en las BBDD de climas mensuales).
+
+    Las muestras se dividen en bloques de lote muestras, que se reparten
+    entre los procesos. Los resultados dependen de la semilla y del tamaño
+    del lote, pero no del número de procesos.
+
+    :param Cerramiento cerr: cerramiento
+    :param list climasext: Lista de climas exteriores (uno por periodo)
+    :param int nmuestras: número de muestras
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param dict perturbaciones: perturbaciones que sustituyen a las
+        predeterminadas, por nombre ('conductividad', 'mu', 'temperatura' o
+        'humedad'). Con valor None no se perturba esa propiedad.
+    :param int semilla: semilla de los generadores de números aleatorios
+    :param int procesos: número de procesos de cálculo (None: uno por CPU)
+    :param int lote: número de muestras de cada bloque
+    :returns: resultados del análisis
+    :rtype: ResultadoMontecarlo
+    :raise ValueError: si alguna perturbación no es válida
+    """
+    _perturbaciones = dict(PERTURBACIONES)
+    if perturbaciones:
+        for nombre in perturbaciones:
+            if nombre not in PERTURBACIONES:
+                raise ValueError('Perturbación desconocida: %s' % nombre)
+        _perturbaciones.update(perturbaciones)
+    for nombre in ('temperatura', 'humedad'):
+        p = _perturbaciones[nombre]
+        if p is not None and p.tipo == 'lognormal':
+            raise ValueError('La perturbación de %s debe ser aditiva' % nombre)
+    modelo = _modelo(cerr, climasext, ti, hri, _perturbaciones, nmuestras,
+                     semilla, lote)
+    bloques = range((nmuestras + lote - 1) // lote)
+    if procesos is None:
+        procesos = multiprocessing.cpu_count()
+    procesos = min(procesos, len(bloques))
+    if procesos <= 1:
+        resultados = [evaluabloque(modelo, bloque) for bloque in bloques]
+    else:
+        pool = multiprocessing.Pool(procesos, _iniciaproceso, (modelo,))
+        try:
+            resultados = pool.map(_evaluaenproceso, bloques, 1)
+        finally:
+            pool.terminate()
+            pool.join()
+    if not resultados:
+        ninterfases = len(cerr.capas) + 1
+        return ResultadoMontecarlo(numpy.zeros(0), numpy.zeros(0, dtype=bool),
+                                   numpy.zeros((0, ninterfases)),
+                                   numpy.zeros(0))
+    return ResultadoMontecarlo(*[numpy.concatenate(partes)
+                                 for partes in zip(*resultados)])
+
+perfil.registra(__name__, 'montecarlo')
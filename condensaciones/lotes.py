@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Cálculo por lotes de comprobaciones de cerramientos en varias localidades
+
+Evalúa las comprobaciones del CTE DB-HE (ver :py:mod:`comprobaciones`) para
+todos los pares cerramiento x localidad, de forma opcional en varios procesos.
+"""
+
+import csv
+import json
+import itertools
+import collections
+import multiprocessing
+from . import comprobaciones, material, sqlitedb
+from .cerramiento import Cerramiento
+
+#: Resultado de las comprobaciones de un cerramiento en una localidad
+#:
+#: - cerramiento: nombre del cerramiento
+#: - localidad: nombre de la localidad
+#: - U: transmitancia térmica del cerramiento [W/m²K]
+#: - fRsi: factor de temperatura de la superficie interior
+#: - fRsimin: factor de temperatura de la superficie interior mínimo
+#: - cs: ¿existen condensaciones superficiales? (bool)
+#: - ci: ¿existen condensaciones intersticiales? (bool)
+#: - gmeses: condensaciones totales de cada periodo [g/m²mes] (list)
+Resultado = collections.namedtuple('Resultado', ['cerramiento', 'localidad',
+                                                 'U', 'fRsi', 'fRsimin',
+                                                 'cs', 'ci', 'gmeses'])
+
+#: Climas de las BBDD de climas que no corresponden a localidades (climas
+#: exterior e interior por defecto, ver appmodel.climasdefecto)
+NOLOCALIDADES = ('Climaext', 'Climaint')
+
+#: Número de cerramientos de cada tarea de los procesos de cálculo cuando no
+#: se conoce el número total de cerramientos (p.e. al leerlos de iterjson)
+LOTE = 16
+
+# Datos de cada proceso de cálculo, fijados al iniciarlo (ver _iniciaproceso)
+_proceso = {}
+
+def tablamateriales(cerramientos):
+    """Tabla compacta de los materiales usados en una lista de cerramientos
+
+    Cada material se representa con una tupla de los valores de sus campos
+    (ver sqlitedb.CAMPOSMATERIAL), en el orden de primera aparición.
+
+    :param list cerramientos: lista de cerramientos
+    :returns: lista de tuplas de campos de material
+    :rtype: list
+    """
+    vistos = set()
+    tabla = []
+    for cerr in cerramientos:
+        for nombre in cerr.nombres:
+            if nombre not in vistos:
+                vistos.add(nombre)
+                m = cerr.matDB[nombre]
+                tabla.append(tuple(getattr(m, campo, None)
+                                   for campo in sqlitedb.CAMPOSMATERIAL))
+    return tabla
+
+def tablamaterialesdb(matDB):
+    """Tabla compacta de todos los materiales de una BBDD de materiales
+
+    :param MaterialesDB matDB: BBDD de materiales
+    :returns: lista de tuplas de campos de material (ver tablamateriales)
+    :rtype: list
+    """
+    return [tuple(getattr(matDB[nombre], campo, None)
+                  for campo in sqlitedb.CAMPOSMATERIAL)
+            for nombre in matDB.nombres]
+
+def tabla2materialesdb(tabla):
+    """BBDD de materiales a partir de una tabla compacta de materiales
+
+    :param list tabla: lista de tuplas de campos (ver tablamateriales)
+    :rtype: material.MaterialesDB
+    """
+    matDB = material.MaterialesDB(None)
+    for campos in tabla:
+        m = material.record2material(dict(zip(sqlitedb.CAMPOSMATERIAL, campos)))
+        matDB[m.name] = m
+    return matDB
+
+def localidadesdb(climasdb, nombres=None):
+    """Lista de tuplas (localidad, climas exteriores) de una BBDD de climas
+
+    Se omiten los climas que no corresponden a localidades (ver
+    NOLOCALIDADES).
+
+    :param dict climasdb: diccionario de listas de climas exteriores por
+        localidad
+    :param list nombres: nombres de las localidades en el orden de la BBDD
+        (p.e. los devueltos por clima.loadclimadb). None: orden alfabético
+    :rtype: list
+    """
+    if nombres is None:
+        nombres = sorted(climasdb)
+    return [(nombre, climasdb[nombre]) for nombre in nombres
+            if nombre not in NOLOCALIDADES]
+
+def _localidades(climas):
+    """Lista de tuplas (localidad, climas exteriores)"""
+    if isinstance(climas, dict):
+        return localidadesdb(climas)
+    return [(nombre, climasext) for nombre, climasext in climas]
+
+def evaluacerramiento(cerr, localidades, climai):
+    """Comprobaciones de un cerramiento en varias localidades
+
+    fRsimin se calcula con el primer clima exterior de cada localidad (el mes
+    de enero en las BBDD de climas mensuales), como en appmodel.Model.
+    Si su temperatura es igual a la interior fRsimin vale NaN y no se
+    consideran condensaciones superficiales.
+
+    :param Cerramiento cerr: cerramiento
+    :param list localidades: lista de tuplas (localidad, climas exteriores)
+    :param Clima climai: clima interior
+    :returns: resultados por localidad
+    :rtype: list
+    """
+    U = cerr.U
+    fRsi = comprobaciones.fRsi(U)
+    resultados = []
+    for localidad, climasext in localidades:
+        try:
+            fRsimin = comprobaciones.fRsimin(climasext[0].temp,
+                                             climai.temp, climai.HR)
+        except ValueError:
+            # Sin diferencia de temperaturas fRsimin no está definido
+            fRsimin = float('nan')
+        glist = comprobaciones.calculaintersticiales(cerr, climai.temp,
+                                                     climai.HR, climasext)
+        resultados.append(Resultado(cerr.nombre, localidad, U, fRsi, fRsimin,
+                                    fRsi < fRsimin, glist.condensa,
+                                    glist.totalperiodos.tolist()))
+    return resultados
+
+def _iniciaproceso(tabla, cerramientos, localidades, climai):
+    """Fija los datos comunes de un proceso de cálculo
+
+    :param list tabla: tabla compacta de materiales (ver tablamateriales)
+    :param list cerramientos: datos de los cerramientos (ver _tareas), o None
+        si se envían en cada tarea
+    """
+    _proceso['matDB'] = tabla2materialesdb(tabla)
+    _proceso['cerramientos'] = cerramientos
+    _proceso['localidades'] = localidades
+    _proceso['climai'] = climai
+
+def _datoscerramiento(cerr):
+    """Nombre, capas, Rse y Rsi de un cerramiento"""
+    return (cerr.nombre, list(cerr.capas), cerr.Rse, cerr.Rsi)
+
+def _tareas(cerramientos, lote, matDB):
+    """Genera los datos de los cerramientos de un iterador, de lote en lote
+
+    Los cerramientos se leen según se generan las tareas.
+
+    :param MaterialesDB matDB: BBDD de materiales enviada a los procesos
+    :returns: listas de datos de cerramientos (ver _datoscerramiento)
+    :raise ValueError: si un cerramiento usa otra BBDD de materiales
+    """
+    while True:
+        bloque = list(itertools.islice(cerramientos, lote))
+        if not bloque:
+            return
+        for cerr in bloque:
+            if cerr.matDB is not matDB:
+                raise ValueError(u'El cerramiento %s usa una BBDD de '
+                                 u'materiales distinta de la del primero'
+                                 % cerr.nombre)
+        yield [_datoscerramiento(cerr) for cerr in bloque]
+
+def _evaluaenproceso(tarea):
+    """Comprobaciones de los cerramientos de una tarea en un proceso de cálculo
+
+    :param list tarea: índices de los cerramientos fijados al iniciar el
+        proceso o, si no se fijaron, sus datos (ver _datoscerramiento)
+    :returns: resultados por cerramientos y localidades
+    :rtype: list
+    """
+    matDB = _proceso['matDB']
+    cerramientos = _proceso['cerramientos']
+    resultados = []
+    for elemento in tarea:
+        if cerramientos is not None:
+            elemento = cerramientos[elemento]
+        nombre, capas, Rse, Rsi = elemento
+        cerr = Cerramiento(nombre, '', capas, Rse, Rsi, matDB=matDB)
+        resultados.extend(evaluacerramiento(cerr, _proceso['localidades'],
+                                            _proceso['climai']))
+    return resultados
+
+def evaluamatriz(cerramientos, climas, climai, procesos=1, lote=None):
+    """Comprobaciones de cada cerramiento en cada localidad
+
+    Con varios procesos, cada proceso recibe al iniciarse una única vez los
+    climas y la tabla compacta de materiales (ver tablamateriales). Con una
+    lista de cerramientos recibe también al iniciarse sus capas, y las
+    tareas solamente indican los índices de los cerramientos que calcular.
+    Con un iterador la tabla contiene todos los materiales de la BBDD de
+    materiales del primer cerramiento, que debe ser la de todos ellos, y
+    cada tarea lleva las capas de sus cerramientos.
+
+    Los resultados se generan según se calculan, por cerramientos y, para
+    cada cerramiento, por localidades, en el orden de las listas recibidas.
+
+    Los cerramientos se recorren según se generan los resultados, de modo
+    que pueden proceder de un generador (p.e. iterjson) sin leerlos todos en
+    memoria: con varios procesos solamente hay pendientes de cálculo dos
+    tareas por proceso.
+
+    :param list cerramientos: lista o iterador de cerramientos
+    :param climas: diccionario de listas de climas exteriores por localidad
+        (se recorre por nombres ordenados, ver localidadesdb) o lista de
+        tuplas (localidad, climas exteriores)
+    :param Clima climai: clima interior
+    :param int procesos: número de procesos de cálculo (None: uno por CPU)
+    :param int lote: número de cerramientos de cada tarea enviada a los
+        procesos (None: con una lista se reparten en unas cuatro tareas por
+        proceso y con un iterador en tareas de LOTE cerramientos)
+    :returns: iterador de resultados (ver Resultado)
+    :raise ValueError: si los cerramientos de un iterador usan BBDD de
+        materiales distintas
+    """
+    localidades = _localidades(climas)
+    if procesos is None:
+        procesos = multiprocessing.cpu_count()
+    conocidos = hasattr(cerramientos, '__len__')
+    if conocidos:
+        procesos = min(procesos, len(cerramientos))
+    if procesos <= 1:
+        for cerr in cerramientos:
+            for resultado in evaluacerramiento(cerr, localidades, climai):
+                yield resultado
+        return
+    if conocidos:
+        n = len(cerramientos)
+        lote = lote or max(1, n // (4 * procesos))
+        tabla = tablamateriales(cerramientos)
+        datos = [_datoscerramiento(cerr) for cerr in cerramientos]
+        tareas = (range(i, min(i + lote, n)) for i in xrange(0, n, lote))
+    else:
+        cerramientos = iter(cerramientos)
+        primero = next(cerramientos, None)
+        if primero is None:
+            return
+        tabla = tablamaterialesdb(primero.matDB)
+        datos = None
+        tareas = _tareas(itertools.chain([primero], cerramientos),
+                         lote or LOTE, primero.matDB)
+    pool = multiprocessing.Pool(procesos, _iniciaproceso,
+                                (tabla, datos, localidades, climai))
+    pendientes = collections.deque()
+    try:
+        for tarea in tareas:
+            pendientes.append(pool.apply_async(_evaluaenproceso, (tarea,)))
+            if len(pendientes) < 2 * procesos:
+                continue
+            for resultado in pendientes.popleft().get():
+                yield resultado
+        while pendientes:
+            for resultado in pendientes.popleft().get():
+                yield resultado
+    finally:
+        pool.terminate()
+        pool.join()
+
+#===============================================================================
+# Funciones de E/S de cerramientos y resultados
+#===============================================================================
+
+def json2cerramiento(linea, matDB=None):
+    """Cerramiento a partir de su definición en formato JSON
+
+    La definición es un objeto con las claves nombre, descripcion, capas
+    (lista de pares [material, espesor], de exterior a interior), Rse, Rsi y
+    tipo, de las que solamente nombre y capas son obligatorias. Ejemplo::
+
+        {"nombre": "Muro", "capas": [["Enlucido de yeso 1000 < d < 1300", 0.01]]}
+
+    :param str linea: definición del cerramiento en formato JSON
+    :param MaterialesDB matDB: BBDD de materiales (None: la predeterminada)
+    :rtype: Cerramiento
+    :raise ValueError: si la definición no es válida
+    """
+    datos = json.loads(linea)
+    try:
+        capas = [(nombre, float(e)) for nombre, e in datos['capas']]
+        return Cerramiento(datos['nombre'], datos.get('descripcion', u''),
+                           capas, datos.get('Rse'), datos.get('Rsi'),
+                           datos.get('tipo'), matDB=matDB)
+    except (KeyError, TypeError), e:
+        raise ValueError(u'Definición de cerramiento no válida: %r' % e)
+
+def iterjson(lineas, matDB=None):
+    """Genera los cerramientos definidos en líneas en formato JSON
+
+    Se omiten las líneas vacías (ver json2cerramiento).
+
+    :param lineas: iterable de líneas (p.e. un archivo)
+    :param MaterialesDB matDB: BBDD de materiales (None: la predeterminada)
+    :raise ValueError: si alguna línea no es válida, indicando su número
+    """
+    for i, linea in enumerate(lineas):
+        if not linea.strip():
+            continue
+        try:
+            yield json2cerramiento(linea, matDB)
+        except ValueError, e:
+            mensaje = e.args[0] if e.args else ''
+            if not isinstance(mensaje, unicode):
+                mensaje = mensaje.decode('utf-8')
+            raise ValueError(u'Línea %i: %s' % (i + 1, mensaje))
+
+def resultado2dict(resultado):
+    """Diccionario de campos de un resultado, con None en lugar de NaN
+
+    :param Resultado resultado: resultado de evaluamatriz
+    :rtype: dict
+    """
+    datos = resultado._asdict()
+    if datos['fRsimin'] != datos['fRsimin']:
+        datos['fRsimin'] = None
+    return datos
+
+def escribejson(resultados, salida):
+    """Escribe resultados en formato JSON, uno por línea
+
+    Cada línea se escribe y vacía en cuanto se genera el resultado.
+
+    :param resultados: iterable de resultados (ver evaluamatriz)
+    :param file salida: archivo de salida
+    :returns: número de resultados escritos
+    :rtype: int
+    """
+    n = 0
+    for resultado in resultados:
+        salida.write(json.dumps(resultado2dict(resultado)) + '\n')
+        salida.flush()
+        n += 1
+    return n
+
+def escribecsv(resultados, salida):
+    """Escribe resultados en formato CSV, con una fila de cabecera
+
+    Las condensaciones de cada periodo se separan con espacios en la columna
+    gmeses y los textos se codifican en UTF-8. Cada fila se escribe y vacía
+    en cuanto se genera el resultado.
+
+    :param resultados: iterable de resultados (ver evaluamatriz)
+    :param file salida: archivo de salida
+    :returns: número de resultados escritos
+    :rtype: int
+    """
+    escritor = csv.writer(salida)
+    escritor.writerow(Resultado._fields)
+    n = 0
+    for resultado in resultados:
+        datos = resultado2dict(resultado)
+        escritor.writerow([datos['cerramiento'].encode('utf-8'),
+                           datos['localidad'].encode('utf-8'),
+                           repr(datos['U']), repr(datos['fRsi']),
+                           '' if datos['fRsimin'] is None
+                           else repr(datos['fRsimin']),
+                           int(datos['cs']), int(datos['ci']),
+                           ' '.join(repr(g) for g in datos['gmeses'])])
+        salida.flush()
+        n += 1
+    return n
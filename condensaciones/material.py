@@ -22,9 +22,34 @@
 #   02110-1301, USA.
 """Módulo para la definición, almacenamiento y recuperación de materiales."""
 
+import bisect
+import collections
+import unicodedata
+import numpy
 import configobj
+from .util import loadcache, savecache
+from . import sqlitedb, perfil
 
-class Material(object):
+#: Versión del formato de la caché de la BBDD de materiales
+CACHEVERSION = 2
+
+#: Propiedades numéricas de los materiales que se guardan por columnas
+COLUMNAS = ('mu', 'conductivity', 'resistance', 'density', 'specific_heat',
+            'thickness')
+
+# Atributos de los materiales cuya modificación actualiza las columnas de las
+# BBDD que los contienen
+_ATRIBUTOSCOLUMNAS = frozenset(COLUMNAS + ('group',))
+
+class _MaterialBase(object):
+    """Base de Material con las BBDD de materiales que contienen el material
+
+    Se separa de Material para que Material.__slots__ enumere únicamente las
+    propiedades del material.
+    """
+    __slots__ = ('_bbdds',)
+
+class Material(_MaterialBase):
     """Material tipo definido por su nombre, tipo y propiedades
 
     Los materiales pueden ser del tipo `RESISTANCE`, `PROPERTIES` o
@@ -39,7 +64,15 @@ class Material(object):
     thickness_max (opcional).
 
     Propiedades exclusivas de los materiales del tipo `RESISTANCE`: resistance.
+
+    Al modificar el grupo o una propiedad numérica (ver COLUMNAS) de un
+    material se actualizan las columnas de las BBDD de materiales que lo
+    contienen.
     """
+    __slots__ = ('name', 'group', 'type', 'mu', 'db', 'thickness_change',
+                 'thickness', 'conductivity', 'density', 'specific_heat',
+                 'thickness_min', 'thickness_max', 'resistance')
+
     def __init__(self, name, group, mtype, mu, db=''):
         """Inicialización de datos generales
 
@@ -81,84 +114,498 @@ class Material(object):
             #: resistencia térmica del elemento [m²/K.W]
             self.resistance = None
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _ATRIBUTOSCOLUMNAS:
+            for matDB in getattr(self, '_bbdds', ()):
+                matDB._actualiza(self)
+
+    def __getstate__(self):
+        # Las BBDD que contienen el material no se copian con él
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__
+                    if hasattr(self, attr))
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = state[1]
+        for attr, value in state.iteritems():
+            object.__setattr__(self, attr, value)
+
+class _VistaMateriales(collections.MutableMapping):
+    """Vista de los materiales de una BBDD por nombre
+
+    Las asignaciones y eliminaciones se hacen en la propia BBDD, de modo que
+    mantienen al día sus columnas.
+    """
+    def __init__(self, matDB):
+        self._matDB = matDB
+
+    def __getitem__(self, key):
+        return self._matDB[key]
+
+    def __setitem__(self, key, value):
+        self._matDB[key] = value
+
+    def __delitem__(self, key):
+        del self._matDB[key]
+
+    def __contains__(self, key):
+        return key in self._matDB.ids
+
+    def __iter__(self):
+        return iter(self._matDB.ids)
+
+    def __len__(self):
+        return len(self._matDB.ids)
+
+def normaliza(texto):
+    """Normaliza un texto para búsquedas
+
+    Convierte a minúsculas y elimina tildes y otros signos diacríticos.
+
+    :param unicode texto: texto original
+    :rtype: unicode
+    """
+    if not isinstance(texto, unicode):
+        texto = texto.decode('utf-8')
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return u''.join(c for c in descompuesto
+                    if not unicodedata.combining(c)).lower()
+
+class IndiceMateriales(object):
+    """Índices de búsqueda de una BBDD de materiales
+
+    - nombres: lista ordenada de nombres normalizados (ver normaliza)
+    - idsnombres: identificadores correspondientes a nombres
+    - texto: nombres normalizados unidos por un separador
+    - inicios: posición de cada nombre (por orden de identificador) en texto
+    - idstexto: identificadores correspondientes a inicios
+    - ordenados: diccionario por propiedad (ver COLUMNAS) de tuplas (valores,
+      ids) de los materiales con la propiedad definida, por valor creciente
+    - grupos: identificadores de los materiales de cada grupo por índice de
+      grupo
+    """
+    SEPARADOR = u'\x00'
+
+    def __init__(self, matDB):
+        """Construye los índices
+
+        :param MaterialesDB matDB: BBDD de materiales
+        """
+        normalizados = sorted((normaliza(nombre), mid)
+                              for nombre, mid in matDB.ids.iteritems())
+        self.nombres = [nombre for nombre, mid in normalizados]
+        self.idsnombres = [mid for nombre, mid in normalizados]
+        porid = sorted(normalizados, key=lambda item: item[1])
+        self.idstexto = [mid for nombre, mid in porid]
+        self.inicios, inicio = [], 0
+        for nombre, mid in porid:
+            self.inicios.append(inicio)
+            inicio += len(nombre) + 1
+        self.texto = self.SEPARADOR.join(nombre for nombre, mid in porid)
+        self.ordenados = {}
+        for prop in COLUMNAS:
+            valores = matDB.columna(prop)
+            ids = numpy.flatnonzero(~numpy.isnan(valores))
+            orden = ids[numpy.argsort(valores[ids], kind='mergesort')]
+            self.ordenados[prop] = (valores[orden], orden)
+        grupos = matDB.columna('grupo')
+        self.grupos = [numpy.flatnonzero(grupos == gid)
+                       for gid in range(len(matDB.nombresgrupos))]
+
 class MaterialesDB(object):
-    """Base de datos de Materiales"""
+    """Base de datos de Materiales
+
+    Cada material tiene un identificador entero estable, asignado por orden
+    de inserción, que no se reutiliza al eliminar materiales. Las propiedades
+    numéricas (ver COLUMNAS) y el identificador de grupo se guardan además por
+    columnas en arrays indexados por identificador, de modo que los cálculos
+    vectorizados pueden obtener las propiedades de varios materiales con
+    indexación de arrays::
+
+        ids = matDB.getids(nombres)
+        mu = matDB.columna('mu')[ids]
+
+    Las columnas se mantienen al día también cuando se modifica directamente
+    un material de la BBDD (ver Material), y cada cambio en ellas aumenta el
+    número de versión de la BBDD (ver version), de modo que los datos
+    derivados de las columnas pueden saber si siguen al día.
+    """
 
     def __init__(self, filename='DB.ini'):
         """Inicialización de la BBDD de Cerramientos
 
-        :param str filename: nombre del archivo desde el que cargar la base de datos
+        :param str filename: nombre del archivo desde el que cargar la base de
+            datos. Si es None se crea una BBDD vacía.
         """
         #: nombre del archivo desde el que cargar la base de datos (str)
         self.filename = filename
         #: diccionario de configuración (nombre, ...) (dict)
         self.config = None
-        #: lista de nombres de materiales de la BBDD (list)
-        self.nombres = []
         #: lista de nombres de grupos de la BBDD (list)
         self.nombresgrupos = []
-        #: diccionario de materiales de la BBDD por nombre de material (dict)
-        self.materiales = {}
-        self.loadmaterialesdb(filename)
+        #: diccionario de identificadores de material por nombre (dict)
+        self.ids = {}
+        self._idsgrupos = {} # identificadores de grupo por nombre
+        self._materiales = [] # materiales por identificador (None: eliminado)
+        self._nombres = None # lista ordenada de nombres (ver nombres)
+        self._vista = _VistaMateriales(self) # ver materiales
+        self._indice = None # índices de búsqueda (ver indice)
+        self._columnas = dict((prop, numpy.empty(0)) for prop in COLUMNAS)
+        self._columnas['grupo'] = numpy.empty(0, dtype=int)
+        #: versión de las columnas, que aumenta con cada cambio (int)
+        self.version = 0
+        if filename is not None:
+            self.loadmaterialesdb(filename)
 
     def __getitem__(self, key):
-        return self.materiales[key]
+        return self._materiales[self.ids[key]]
 
     def __setitem__(self, key, value):
-        self.materiales[key] = value
-        #FIXME: se puede ordenar de otra forma
-        self.nombres.append(key)
+        """Inserta o sustituye un material
+
+        Un material nuevo recibe un identificador nuevo y se añade al final de
+        la lista de nombres. Al sustituir un material se mantiene su
+        identificador.
+        """
+        if key in self.ids:
+            mid = self.ids[key]
+            self._libera(self._materiales[mid])
+        else:
+            mid = len(self._materiales)
+            self._reserva(mid + 1)
+            self._materiales.append(None)
+            self.ids[key] = mid
+            self._nombres = None
+        self._materiales[mid] = value
+        bbdds = getattr(value, '_bbdds', ())
+        if self not in bbdds:
+            value._bbdds = bbdds + (self,)
+        self._guardacolumnas(mid, value)
 
     def __delitem__(self, key):
-        del self.materiales[key]
-        self.nombres.remove(key)
+        mid = self.ids.pop(key)
+        self._libera(self._materiales[mid])
+        self._materiales[mid] = None
+        for prop in COLUMNAS:
+            self._columnas[prop][mid] = numpy.nan
+        self._columnas['grupo'][mid] = -1
+        self._nombres = None
+        self._indice = None
+        self.version += 1
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _guardacolumnas(self, mid, m):
+        """Guarda en las columnas las propiedades de un material"""
+        self._indice = None
+        self.version += 1
+        if m.group not in self._idsgrupos:
+            self._idsgrupos[m.group] = len(self.nombresgrupos)
+            self.nombresgrupos.append(m.group)
+        columnas = self._columnas
+        columnas['grupo'][mid] = self._idsgrupos[m.group]
+        for prop in COLUMNAS:
+            valor = getattr(m, prop, None)
+            columnas[prop][mid] = numpy.nan if valor is None else valor
+
+    def _actualiza(self, m):
+        """Actualiza las columnas de un material modificado (ver Material)"""
+        mid = self.ids.get(getattr(m, 'name', None))
+        if mid is not None and self._materiales[mid] is m:
+            self._guardacolumnas(mid, m)
+
+    def _libera(self, m):
+        """Deja de notificar a la BBDD los cambios de un material retirado"""
+        bbdds = getattr(m, '_bbdds', ())
+        if self in bbdds:
+            m._bbdds = tuple(matDB for matDB in bbdds if matDB is not self)
+
+    def _reserva(self, n):
+        """Amplía las columnas para alojar al menos n identificadores"""
+        capacidad = len(self._columnas['grupo'])
+        if n <= capacidad:
+            return
+        capacidad = max(n, 2 * capacidad, 64)
+        for prop, col in self._columnas.items():
+            nueva = numpy.empty(capacidad, dtype=col.dtype)
+            nueva[:len(col)] = col
+            self._columnas[prop] = nueva
+
+    @property
+    def nombres(self):
+        """Lista de nombres de materiales de la BBDD por orden de inserción"""
+        if self._nombres is None:
+            nombres = [None] * len(self._materiales)
+            for nombre, mid in self.ids.iteritems():
+                nombres[mid] = nombre
+            self._nombres = [nombre for nombre in nombres if nombre is not None]
+        return self._nombres
+
+    @property
+    def materiales(self):
+        """Vista, como diccionario, de los materiales de la BBDD por nombre de
+        material, que refleja siempre su contenido actual y a través de la
+        que se pueden añadir, sustituir o eliminar materiales"""
+        return self._vista
+
+    def getids(self, nombres):
+        """Identificadores de una secuencia de nombres de material
 
-    def loadmaterialesdb(self, filename=None):
+        :param list nombres: nombres de material
+        :returns: identificadores de los materiales
+        :rtype: numpy.ndarray
+        """
+        ids = self.ids
+        return numpy.array([ids[nombre] for nombre in nombres], dtype=int)
+
+    def columna(self, prop):
+        """Columna de valores de una propiedad indexada por identificador
+
+        Los materiales eliminados, y los que no tienen definida la propiedad
+        (p.e. la conductividad de un material de tipo `RESISTANCE`), tienen
+        valor NaN. La columna 'grupo' contiene el índice del grupo en
+        nombresgrupos (-1 para los materiales eliminados).
+
+        :param str prop: propiedad (ver COLUMNAS) o 'grupo'
+        :returns: vista de la columna (no debe modificarse)
+        :rtype: numpy.ndarray
+        """
+        return self._columnas[prop][:len(self._materiales)]
+
+    #{ Búsquedas
+
+    @property
+    def indice(self):
+        """Índices de búsqueda, que se construyen en el primer uso y tras
+        cada modificación de la BBDD (tipo: IndiceMateriales)"""
+        if self._indice is None:
+            self._indice = IndiceMateriales(self)
+        return self._indice
+
+    def getnombres(self, ids):
+        """Nombres de una secuencia de identificadores de material
+
+        :param ids: identificadores de material
+        :rtype: list
+        """
+        return [self._materiales[mid].name for mid in ids]
+
+    def buscaprefijo(self, prefijo):
+        """Materiales cuyo nombre empieza por un texto
+
+        La búsqueda no distingue mayúsculas ni tildes.
+
+        :param str prefijo: comienzo del nombre
+        :returns: iterador de identificadores, por orden alfabético
+        """
+        indice = self.indice
+        prefijo = normaliza(prefijo)
+        i = bisect.bisect_left(indice.nombres, prefijo)
+        while i < len(indice.nombres) and indice.nombres[i].startswith(prefijo):
+            yield indice.idsnombres[i]
+            i += 1
+
+    def buscatexto(self, texto):
+        """Materiales cuyo nombre contiene un texto
+
+        La búsqueda no distingue mayúsculas ni tildes.
+
+        :param str texto: texto a buscar
+        :returns: iterador de identificadores, por orden de identificador
+        """
+        indice = self.indice
+        texto = normaliza(texto)
+        if IndiceMateriales.SEPARADOR in texto:
+            return
+        pos = indice.texto.find(texto)
+        while pos != -1:
+            i = bisect.bisect_right(indice.inicios, pos) - 1
+            yield indice.idstexto[i]
+            if i + 1 == len(indice.inicios):
+                break
+            pos = indice.texto.find(texto, indice.inicios[i + 1])
+
+    def buscagrupo(self, grupo):
+        """Materiales de un grupo
+
+        :param str grupo: nombre del grupo
+        :returns: iterador de identificadores, por orden de identificador
+        """
+        if grupo not in self._idsgrupos:
+            return iter(())
+        return iter(self.indice.grupos[self._idsgrupos[grupo]].tolist())
+
+    def buscarango(self, prop, minimo=None, maximo=None):
+        """Materiales con una propiedad en un intervalo minimo <= valor < maximo
+
+        Los materiales sin la propiedad definida no se incluyen.
+
+        :param str prop: propiedad (ver COLUMNAS)
+        :param float minimo: valor mínimo (None: sin límite)
+        :param float maximo: valor máximo, excluido (None: sin límite)
+        :returns: iterador de identificadores, por valor creciente
+        """
+        valores, ids = self.indice.ordenados[prop]
+        i = 0 if minimo is None else valores.searchsorted(minimo, 'left')
+        j = (len(valores) if maximo is None
+             else valores.searchsorted(maximo, 'left'))
+        return iter(ids[i:j].tolist())
+
+    def busca(self, texto=None, grupo=None, **rangos):
+        """Materiales que cumplen a la vez varios criterios
+
+        Ejemplo (aislantes con conductividad < 0,035 W/mK y mu < 50)::
+
+            matDB.busca(grupo=u'Aislantes', conductivity=(None, 0.035),
+                        mu=(None, 50))
+
+        :param str texto: texto contenido en el nombre (ver buscatexto)
+        :param str grupo: nombre del grupo (ver buscagrupo)
+        :param rangos: intervalos (minimo, maximo) por propiedad (ver
+            buscarango)
+        :returns: iterador de identificadores, por orden de identificador
+        """
+        n = len(self._materiales)
+        seleccion = numpy.ones(n, dtype=bool)
+        criterios = []
+        if texto is not None:
+            criterios.append(self.buscatexto(texto))
+        if grupo is not None:
+            criterios.append(self.buscagrupo(grupo))
+        for prop, (minimo, maximo) in rangos.items():
+            criterios.append(self.buscarango(prop, minimo, maximo))
+        for ids in criterios:
+            cumple = numpy.zeros(n, dtype=bool)
+            cumple[numpy.fromiter(ids, dtype=int)] = True
+            seleccion &= cumple
+        ids = numpy.flatnonzero(seleccion)
+        if not criterios:
+            ids = ids[[self._materiales[mid] is not None for mid in ids]]
+        return iter(ids.tolist())
+
+    #{ Lectura
+
+    def loadmaterialesdb(self, filename=None, cache=True):
         """Lee base de datos de materiales en formato ConfigObj de archivo
 
+        Si existe una caché binaria del archivo al día se usa en lugar de
+        interpretar el archivo, y si no existe o no está al día se actualiza.
+        Si el archivo es una base de datos SQLite (ver sqlitedb.essqlite) se
+        lee de ella, sin caché.
+
         :param str filename: nombre del archivo desde el que cargar la base de datos
+        :param bool cache: usar y actualizar la caché binaria del archivo
         """
-        def unescape(data):
-            """Unescape &amp;, &lt;, and &gt; in a string of data."""
-            k = data.replace("&lb;", "[").replace("&rb;", "]")
-            return k.replace("&amp;", "&")
-
         if not filename:
             if self.filename:
                 filename = self.filename
             else:
                 raise ValueError, "No se ha especificado un archivo"
-        config = configobj.ConfigObj(filename, encoding='utf-8',
-                                     raise_errors=True)
+        if sqlitedb.essqlite(filename):
+            cache = False
+            data = _loadsqlitematerialesdb(filename)
+        else:
+            data = loadcache(filename, CACHEVERSION) if cache else None
+        if data is None:
+            data = _parsematerialesdb(filename)
+            if cache:
+                savecache(filename, CACHEVERSION, data)
+        dbconfig, materiales = data
         # Lee valores de configuración de la base de datos si existe
-        if 'config' in config:
-            self.config = config['config'].copy()
-            del config['config']
+        if dbconfig is not None:
+            self.config = dbconfig
         # Lee datos
-        for section in config:
-            material = config[section]
-            name = unescape(section)
-            db = material['db']
-            group = material['group']
-            mtype = material['type']
-            mu = material.as_float('mu')
-            m = Material(name, group, mtype, mu, db)
-            # Valores por tipo
-            if mtype == 'RESISTANCE':
-                m.resistance = material.as_float('resistance')
-            elif mtype == 'PROPERTIES':
-                m.conductivity = material.as_float('conductivity')
-                m.thickness = material.as_float('thickness')
-                m.density = material.as_float('density')
-                m.specific_heat = material.as_float('specific_heat')
-            # Valores opcionales
-            if 'thickness_change' in material:
-                m.thickness_change = material.as_bool('thickness_change')
-            if 'thickness_min' in material:
-                m.thickness_min = material.as_float('thickness_min')
-            if 'thickness_max' in material:
-                m.thickness_max = material.as_float('thickness_max')
-            self.nombres.append(name)
-            if group not in self.nombresgrupos:
-                self.nombresgrupos.append(group)
-            self.materiales[name] = m
+        self._reserva(len(self._materiales) + len(materiales))
+        for m in materiales:
+            self[m.name] = m
+
+def _parsematerialesdb(filename):
+    """Interpreta un archivo de BBDD de materiales en formato ConfigObj
+
+    :param str filename: nombre del archivo de la base de datos
+    :returns: sección de configuración (o None) y lista ordenada de materiales
+    :rtype: tuple
+    """
+    def unescape(data):
+        """Unescape &amp;, &lt;, and &gt; in a string of data."""
+        k = data.replace("&lb;", "[").replace("&rb;", "]")
+        return k.replace("&amp;", "&")
+
+    config = configobj.ConfigObj(filename, encoding='utf-8',
+                                 raise_errors=True)
+    dbconfig = None
+    if 'config' in config:
+        dbconfig = config['config'].copy()
+        del config['config']
+    materiales = []
+    for section in config:
+        material = config[section]
+        name = unescape(section)
+        db = material['db']
+        group = material['group']
+        mtype = material['type']
+        mu = material.as_float('mu')
+        m = Material(name, group, mtype, mu, db)
+        # Valores por tipo
+        if mtype == 'RESISTANCE':
+            m.resistance = material.as_float('resistance')
+        elif mtype == 'PROPERTIES':
+            m.conductivity = material.as_float('conductivity')
+            m.thickness = material.as_float('thickness')
+            m.density = material.as_float('density')
+            m.specific_heat = material.as_float('specific_heat')
+        # Valores opcionales
+        if 'thickness_change' in material:
+            m.thickness_change = material.as_bool('thickness_change')
+        if 'thickness_min' in material:
+            m.thickness_min = material.as_float('thickness_min')
+        if 'thickness_max' in material:
+            m.thickness_max = material.as_float('thickness_max')
+        materiales.append(m)
+    return dbconfig, materiales
+
+def material2record(m):
+    """Diccionario de campos de un material (ver sqlitedb.CAMPOSMATERIAL)
+
+    Los campos no definidos en el material valen None.
+    """
+    return dict((campo, getattr(m, campo, None))
+                for campo in sqlitedb.CAMPOSMATERIAL)
+
+def record2material(record):
+    """Material a partir de un diccionario de campos
+
+    :param dict record: campos del material (ver sqlitedb.CAMPOSMATERIAL)
+    :rtype: Material
+    """
+    m = Material(record['name'], record['group'], record['type'],
+                 record['mu'], record['db'] or '')
+    for campo in sqlitedb.CAMPOSMATERIAL[5:]:
+        if record.get(campo) is not None:
+            setattr(m, campo, record[campo])
+    if record.get('thickness_change') is not None:
+        m.thickness_change = bool(record['thickness_change'])
+    return m
+
+def _loadsqlitematerialesdb(filename):
+    """Lee la BBDD de materiales de una base de datos SQLite
+
+    :param str filename: nombre del archivo de la base de datos
+    :returns: sección de configuración (o None) y lista ordenada de materiales
+    :rtype: tuple
+    """
+    db = sqlitedb.SQLiteDB(filename)
+    try:
+        return (db.getconfig('materiales'),
+                [record2material(record) for record in db.materiales()])
+    finally:
+        db.close()
+
+perfil.registra(__name__, 'MaterialesDB.loadmaterialesdb')
+perfil.registracache(__name__, 'loadcache', 'bbdd.materiales',
+                     lambda data: data is not None)
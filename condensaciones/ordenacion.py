@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Ordenación de las capas de un cerramiento
+
+Busca el orden de las capas de un cerramiento que minimiza las condensaciones
+intersticiales en un ciclo de periodos, manteniendo opcionalmente algunas
+capas en su posición (p.e. el revestimiento exterior y el acabado interior).
+
+La búsqueda es de ramificación y poda: las capas se colocan de exterior a
+interior y se descartan los órdenes parciales cuya cota inferior de
+condensaciones supera la mejor solución encontrada. Los órdenes completos se
+evalúan en lotes con el cálculo vectorizado de :py:mod:`barrido`.
+
+El resultado se puede aplicar al modelo de la aplicación con
+:py:meth:`appmodel.Model.capasordena`, que realiza los intercambios de capas
+de :py:func:`intercambios`.
+"""
+
+import collections
+import multiprocessing
+import numpy
+from . import barrido, psicrom, perfil
+from .clima import climas2arrays
+
+#: Resultado de la ordenación de capas
+#:
+#: - orden: índices de las capas originales en el nuevo orden
+#: - capas: capas (nombre, espesor) en el nuevo orden
+#: - g: condensaciones totales del ciclo de periodos con el nuevo orden
+#:   [g/m²] (ver appmodel.Model.ci)
+#: - ginicial: condensaciones totales con el orden original [g/m²]
+#: - evaluados: número de órdenes completos evaluados
+Ordenacion = collections.namedtuple('Ordenacion', ['orden', 'capas', 'g',
+                                                   'ginicial', 'evaluados'])
+
+#: Tolerancia relativa de la comparación de la cota con la mejor solución
+TOLERANCIA = 1e-9
+
+# Datos de cada proceso de cálculo, fijados al iniciarlo (ver _iniciaproceso)
+_proceso = {}
+
+def intercambios(orden):
+    """Intercambios de pares de capas que producen un orden dado
+
+    Aplicados sucesivamente (p.e. con appmodel.Model.capaswap) sobre la lista
+    de capas original la dejan en el orden indicado.
+
+    :param list orden: índices de las capas originales en el nuevo orden
+    :returns: lista de tuplas (índice1, índice2)
+    :rtype: list
+    """
+    actual = range(len(orden))
+    pares = []
+    for i, capa in enumerate(orden):
+        j = actual.index(capa)
+        if j != i:
+            actual[i], actual[j] = actual[j], actual[i]
+            pares.append((i, j))
+    return pares
+
+def _evalua(modelo, ordenes):
+    """Condensaciones totales del ciclo de periodos de una lista de órdenes"""
+    ordenes = numpy.array(ordenes, dtype=int)
+    n = len(ordenes)
+    R = numpy.concatenate((numpy.repeat(modelo['Rse'], n)[:, numpy.newaxis],
+                           modelo['Rcapa'][ordenes],
+                           numpy.repeat(modelo['Rsi'], n)[:, numpy.newaxis]),
+                          axis=1)
+    S = modelo['S'][ordenes]
+    U, g = barrido.ciclovariantes(R, S, modelo['te'], modelo['hre'],
+                                  modelo['ti'], modelo['hri'])
+    return g.sum(axis=2).sum(axis=1)
+
+def _iniciaproceso(modelo):
+    """Fija los datos comunes de un proceso de cálculo"""
+    _proceso['modelo'] = modelo
+
+def _evaluaenproceso(ordenes):
+    """Evalúa una lista de órdenes en un proceso de cálculo"""
+    return _evalua(_proceso['modelo'], ordenes)
+
+class _Cota(object):
+    """Cota inferior de las condensaciones de los órdenes parciales
+
+    Sin condensación previa, la condensación total de un periodo es la
+    diferencia entre las pendientes del último y del primer tramo de la
+    envolvente inferior de los puntos (S, p) de las interfases (ver
+    Cerramiento.envolventeperfil), es decir, entre la máxima pendiente de un
+    punto al interior y la mínima pendiente del exterior a un punto. Las
+    condensaciones acumuladas de cada periodo del ciclo no son menores que
+    las que habría en ese periodo sin condensación previa.
+
+    La posición y la presión de saturación de una interfase solo dependen de
+    qué capas tiene a cada lado, y no de su orden, ya que las resistencias y
+    espesores de aire equivalente totales son fijos. Las interfases
+    conocidas de un orden parcial acotan ambas pendientes y, por tanto, la
+    condensación total del ciclo.
+
+    La cota solo es válida si todas las capas tienen espesor de aire
+    equivalente, de modo que las interfases no coincidan. En otro caso vale
+    siempre 0.
+    """
+    def __init__(self, modelo):
+        te, hre = modelo['te'], modelo['hre']
+        ti, hri = modelo['ti'], modelo['hri']
+        self.valida = bool((modelo['S'] > 0.0).all())
+        self.R_total = (modelo['Rse'] + modelo['Rcapa'].sum() +
+                        modelo['Rsi'])
+        self.S_total = modelo['S'].sum()
+        self.te = te
+        self.ti = ti
+        self.pe = psicrom.pvapor(te, hre)
+        self.pi = psicrom.pvapor(ti, hri)
+        self.factor = barrido.SEGUNDOSMES * 2.0 * 10.0**(-7.0)
+
+    def inicial(self):
+        """Pendientes extremas con solo las superficies exterior e interior"""
+        pendiente = (self.pi - self.pe) / self.S_total
+        return pendiente, pendiente
+
+    def interfase(self, pendientes, Racum, x):
+        """Actualiza las pendientes extremas con una interfase conocida
+
+        :param tuple pendientes: máximas pendientes al interior y mínimas
+            pendientes desde el exterior de cada periodo
+        :param float Racum: resistencia térmica desde el aire exterior [m²K/W]
+        :param float x: espesor de aire equivalente desde el exterior [m]
+        """
+        amax, bmin = pendientes
+        if not 0.0 < x < self.S_total:
+            return pendientes
+        temperatura = self.te + Racum * (self.ti - self.te) / self.R_total
+        p_sat = psicrom.psat(temperatura)
+        return (numpy.maximum(amax, (self.pi - p_sat) / (self.S_total - x)),
+                numpy.minimum(bmin, (p_sat - self.pe) / x))
+
+    def valor(self, pendientes):
+        """Cota inferior de las condensaciones totales del ciclo [g/m²]"""
+        if not self.valida:
+            return 0.0
+        amax, bmin = pendientes
+        return float(self.factor * (amax - bmin).sum())
+
+def ordenoptima(cerr, climasext, ti=20.0, hri=55.0, fijas=(), lote=64,
+                procesos=1):
+    """Orden de las capas que minimiza las condensaciones intersticiales
+
+    Minimiza la suma de las condensaciones acumuladas de todos los periodos
+    del ciclo (ver appmodel.Model.ci). Entre órdenes con las mismas
+    condensaciones se prefiere el que cambia de posición menos capas y,
+    entre estos, el primero encontrado. Las capas iguales (mismo material y
+    espesor) se consideran intercambiables.
+
+    Los órdenes completos que no se descartan se evalúan en lotes de lote
+    órdenes. Con varios procesos se evalúan a la vez tantos lotes como
+    procesos, y la cota de los siguientes órdenes parciales se compara con la
+    mejor solución tras evaluarlos.
+
+    :param Cerramiento cerr: cerramiento
+    :param list climasext: Lista de climas exteriores (uno por periodo)
+    :param float ti: Temperatura del ambiente interior [ºC]
+    :param float hri: Humedad relativa interior [%]
+    :param list fijas: posiciones de las capas que no se mueven (se admiten
+        índices negativos, p.e. -1 para la capa interior)
+    :param int lote: número de órdenes de cada lote evaluado
+    :param int procesos: número de procesos de cálculo (None: uno por CPU)
+    :returns: resultado de la ordenación
+    :rtype: Ordenacion
+    :raise ValueError: si alguna posición fija no existe
+    """
+    capas = list(cerr.capas)
+    ncapas = len(capas)
+    fijas = set(i + ncapas if i < 0 else i for i in fijas)
+    for i in fijas:
+        if not 0 <= i < ncapas:
+            raise ValueError('Posición de capa inexistente: %i' % (i - ncapas))
+    te, hre = climas2arrays(climasext)
+    tabla = cerr.tabla
+    modelo = {'Rcapa': numpy.array(tabla.Rcapa), 'S': numpy.array(tabla.S),
+              'Rse': cerr.Rse, 'Rsi': cerr.Rsi, 'te': te, 'hre': hre,
+              'ti': ti, 'hri': hri}
+    original = range(ncapas)
+    mejor = [_evalua(modelo, [original])[0], 0, original]
+    ginicial = mejor[0]
+    evaluados = [1]
+    if ncapas < 2 or (mejor[0] <= 0.0) or len(fijas) >= ncapas - 1:
+        return Ordenacion(original, capas, mejor[0], ginicial, evaluados[0])
+    cota = _Cota(modelo)
+    Rcapa, S = modelo['Rcapa'], modelo['S']
+    # Capas intercambiables: se representan por el primer índice de su clase
+    clases = [capas.index(capa) for capa in capas]
+    # Posiciones finales fijas consecutivas: sus interfases son conocidas
+    final = ncapas
+    while final - 1 in fijas:
+        final -= 1
+    pendientes = cota.inicial()
+    Racum = cerr.Rse + Rcapa.sum()
+    x = S.sum()
+    for i in range(ncapas - 1, final - 1, -1):
+        Racum -= Rcapa[i]
+        x -= S[i]
+        pendientes = cota.interfase(pendientes, Racum, x)
+
+    def _descarta(g, desplazadas):
+        """¿No puede mejorar un orden con estas cotas a la mejor solución?"""
+        mejorg, mejordesplazadas = mejor[0], mejor[1]
+        if g > mejorg + TOLERANCIA * max(1.0, mejorg):
+            return True
+        return g >= mejorg and desplazadas >= mejordesplazadas
+
+    def _ordenes(orden, libres, pendientes, Racum, x, desplazadas):
+        """Genera los órdenes completos que no se pueden descartar"""
+        i = len(orden)
+        if i == final:
+            yield (orden + range(final, ncapas), cota.valor(pendientes),
+                   desplazadas)
+            return
+        if i in fijas:
+            candidatas = [i]
+        else:
+            vistas = set()
+            candidatas = []
+            for capa in libres:
+                if clases[capa] not in vistas:
+                    vistas.add(clases[capa])
+                    candidatas.append(capa)
+        hijos = []
+        for capa in candidatas:
+            _Racum = Racum + Rcapa[capa]
+            _x = x + S[capa]
+            _pendientes = cota.interfase(pendientes, _Racum, _x)
+            _desplazadas = desplazadas + (clases[capa] != clases[i])
+            hijos.append((cota.valor(_pendientes), _desplazadas, capa,
+                          _pendientes, _Racum, _x))
+        # Primero las ramas más prometedoras
+        hijos.sort(key=lambda hijo: hijo[:3])
+        for g, _desplazadas, capa, _pendientes, _Racum, _x in hijos:
+            if _descarta(g, _desplazadas):
+                continue
+            _libres = [c for c in libres if c != capa]
+            for resultado in _ordenes(orden + [capa], _libres, _pendientes,
+                                      _Racum, _x, _desplazadas):
+                yield resultado
+
+    def _actualiza(ordenes, valores):
+        """Actualiza la mejor solución con los órdenes evaluados"""
+        evaluados[0] += len(ordenes)
+        for orden, g in zip(ordenes, valores):
+            desplazadas = sum(clases[capa] != clases[i]
+                              for i, capa in enumerate(orden))
+            if (g, desplazadas) < (mejor[0], mejor[1]):
+                mejor[:] = [g, desplazadas, orden]
+
+    libres = [i for i in range(final) if i not in fijas]
+    generador = _ordenes([], libres, pendientes, cerr.Rse, 0.0, 0)
+    if procesos is None:
+        procesos = multiprocessing.cpu_count()
+    pool = None
+    if procesos > 1:
+        pool = multiprocessing.Pool(procesos, _iniciaproceso, (modelo,))
+    try:
+        while True:
+            # Los órdenes generados se comprueban de nuevo con la mejor
+            # solución, que puede haber mejorado desde que se generaron
+            candidatos = []
+            for orden, g, desplazadas in generador:
+                if not _descarta(g, desplazadas):
+                    candidatos.append(orden)
+                if len(candidatos) == lote * max(1, procesos):
+                    break
+            if not candidatos:
+                break
+            if pool is None:
+                valores = _evalua(modelo, candidatos)
+            else:
+                lotes = [candidatos[i:i + lote]
+                         for i in range(0, len(candidatos), lote)]
+                valores = numpy.concatenate(pool.map(_evaluaenproceso, lotes,
+                                                     1))
+            _actualiza(candidatos, valores)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    orden = mejor[2]
+    return Ordenacion(orden, [capas[i] for i in orden], mejor[0], ginicial,
+                      evaluados[0])
+
+perfil.registra(__name__, 'ordenoptima')
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Instrumentación opcional de las funciones más costosas
+
+Cuenta las llamadas y mide el tiempo de las funciones y métodos registrados
+por cada módulo (ver registra), y cuenta los aciertos y fallos de sus cachés
+(ver registracache).
+
+La instrumentación se activa definiendo la variable de entorno
+CONDENSACIONES_PERFIL o llamando a :py:func:`activa`. Mientras no está
+activa las funciones registradas no se modifican, por lo que no tiene
+ningún coste. Al activarla se sustituyen por envolturas que acumulan los
+datos y, al terminar el programa, se muestra un resumen y se guarda en
+formato JSON.
+
+El valor de la variable de entorno es el archivo JSON del resumen o, si vale
+1, perfil.json en el directorio actual. Ejemplo::
+
+    CONDENSACIONES_PERFIL=perfil.json python bin/condensa lote -j 1
+"""
+
+import os, sys
+import json
+import atexit
+import timeit
+
+#: Variable de entorno que activa la instrumentación
+VARIABLE = 'CONDENSACIONES_PERFIL'
+#: Archivo JSON del resumen si la variable de entorno vale 1
+ARCHIVOPERFIL = 'perfil.json'
+
+#: ¿Está activa la instrumentación?
+activo = False
+_archivo = None # archivo JSON del resumen al terminar
+_atexit = False # ¿se ha registrado la función de salida?
+_puntos = [] # tuplas (módulo, punto, envoltura) registradas
+_originales = [] # tuplas (objeto, atributo, valor original) sustituidas
+_llamadas = {} # [llamadas, tiempo total] por nombre de punto
+_caches = {} # [aciertos, fallos] por nombre de caché
+
+def _medida(nombre, funcion):
+    """Envoltura que cuenta las llamadas y el tiempo de una función"""
+    reloj = timeit.default_timer
+    def medida(*args, **kwargs):
+        inicio = reloj()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            datos = _llamadas.setdefault(nombre, [0, 0.0])
+            datos[0] += 1
+            datos[1] += reloj() - inicio
+    return medida
+
+def _cache(nombre, acierto, antes):
+    """Constructor de envolturas que cuentan aciertos y fallos de una caché
+
+    :param str nombre: nombre de la caché en el resumen
+    :param acierto: función que indica si hay acierto. Si antes es True
+        recibe los argumentos de la llamada y se evalúa antes de hacerla y,
+        en otro caso, recibe el resultado.
+    """
+    def envoltura(_nombre, funcion):
+        def cache(*args, **kwargs):
+            if antes:
+                hit = acierto(*args, **kwargs)
+                resultado = funcion(*args, **kwargs)
+            else:
+                resultado = funcion(*args, **kwargs)
+                hit = acierto(resultado)
+            datos = _caches.setdefault(nombre, [0, 0])
+            datos[0 if hit else 1] += 1
+            return resultado
+        return cache
+    return envoltura
+
+def _sustituye(modulo, punto, envoltura):
+    """Sustituye un punto de un módulo por su versión instrumentada
+
+    El punto es el nombre de una función del módulo o 'Clase.atributo' para
+    un método o propiedad de una clase.
+    """
+    objeto = sys.modules[modulo]
+    partes = punto.split('.')
+    for parte in partes[:-1]:
+        objeto = getattr(objeto, parte)
+    atributo = partes[-1]
+    original = (objeto.__dict__[atributo] if isinstance(objeto, type)
+                else getattr(objeto, atributo))
+    nombre = '%s.%s' % (modulo.rsplit('.', 1)[-1], punto)
+    if isinstance(original, property):
+        nuevo = property(envoltura(nombre, original.fget), original.fset,
+                         original.fdel, original.__doc__)
+    else:
+        nuevo = envoltura(nombre, original)
+        nuevo.__name__ = original.__name__
+        nuevo.__doc__ = original.__doc__
+    _originales.append((objeto, atributo, original))
+    setattr(objeto, atributo, nuevo)
+
+def registra(modulo, *puntos):
+    """Registra funciones o métodos de un módulo para medir sus llamadas
+
+    Se llama al final de cada módulo instrumentado. Si la instrumentación
+    está activa los puntos se sustituyen inmediatamente.
+
+    :param str modulo: nombre del módulo (__name__)
+    :param puntos: nombres de funciones del módulo o 'Clase.metodo'
+    """
+    for punto in puntos:
+        _puntos.append((modulo, punto, _medida))
+        if activo:
+            _sustituye(modulo, punto, _medida)
+
+def registracache(modulo, punto, nombre, acierto, antes=False):
+    """Registra una función o propiedad que usa una caché
+
+    :param str modulo: nombre del módulo (__name__)
+    :param str punto: nombre de la función o 'Clase.propiedad'
+    :param str nombre: nombre de la caché en el resumen
+    :param acierto: función que indica si hay acierto (ver antes)
+    :param bool antes: si es True, acierto recibe los argumentos de la
+        llamada y se evalúa antes de hacerla y, si es False, recibe su
+        resultado
+    """
+    envoltura = _cache(nombre, acierto, antes)
+    _puntos.append((modulo, punto, envoltura))
+    if activo:
+        _sustituye(modulo, punto, envoltura)
+
+def activa(archivo=None):
+    """Activa la instrumentación
+
+    :param str archivo: archivo JSON en el que guardar el resumen al
+        terminar el programa (None: no se guarda)
+    """
+    global activo, _archivo, _atexit
+    _archivo = archivo
+    if activo:
+        return
+    activo = True
+    for modulo, punto, envoltura in _puntos:
+        _sustituye(modulo, punto, envoltura)
+    if not _atexit:
+        atexit.register(_alterminar)
+        _atexit = True
+
+def desactiva():
+    """Desactiva la instrumentación y restaura las funciones originales
+
+    Los datos acumulados se conservan hasta llamar a reinicia.
+    """
+    global activo
+    activo = False
+    while _originales:
+        objeto, atributo, original = _originales.pop()
+        setattr(objeto, atributo, original)
+
+def reinicia():
+    """Descarta los datos acumulados"""
+    _llamadas.clear()
+    _caches.clear()
+
+def resumen():
+    """Resumen de los datos acumulados
+
+    :returns: diccionario con las claves 'llamadas' (por punto, llamadas,
+        tiempo total y medio [s]) y 'caches' (por caché, aciertos, fallos y
+        tasa de aciertos)
+    :rtype: dict
+    """
+    llamadas = dict((nombre, {'llamadas': n, 'tiempo': t, 'medio': t / n})
+                    for nombre, (n, t) in _llamadas.items())
+    caches = dict((nombre, {'aciertos': a, 'fallos': f,
+                            'tasa': float(a) / (a + f)})
+                  for nombre, (a, f) in _caches.items())
+    return {'llamadas': llamadas, 'caches': caches}
+
+def informe(salida=None):
+    """Escribe una tabla con los datos acumulados
+
+    Las llamadas se ordenan por tiempo total decreciente. Los tiempos de las
+    funciones incluyen los de las funciones instrumentadas a las que llaman.
+
+    :param file salida: archivo de salida (None: salida de errores)
+    """
+    salida = salida or sys.stderr
+    datos = resumen()
+    salida.write("%-45s %10s %12s %12s\n" % ('Llamadas', 'n',
+                                               'total [s]', 'medio [ms]'))
+    for nombre, d in sorted(datos['llamadas'].items(),
+                            key=lambda item: -item[1]['tiempo']):
+        salida.write("%-45s %10i %12.4f %12.4f\n" % (nombre, d['llamadas'],
+                                                      d['tiempo'],
+                                                      1000 * d['medio']))
+    if datos['caches']:
+        salida.write("\n%-45s %10s %12s %12s\n" % ('Cachés', 'aciertos',
+                                                     'fallos', 'tasa [%]'))
+        for nombre, d in sorted(datos['caches'].items()):
+            salida.write("%-45s %10i %12i %12.1f\n" % (nombre, d['aciertos'],
+                                                        d['fallos'],
+                                                        100 * d['tasa']))
+
+def guarda(archivo):
+    """Guarda el resumen en formato JSON
+
+    :param str archivo: nombre del archivo
+    """
+    with open(archivo, 'wb') as f:
+        json.dump(resumen(), f, indent=2, sort_keys=True)
+
+def _alterminar():
+    """Muestra y guarda el resumen al terminar el programa"""
+    if not activo or not (_llamadas or _caches):
+        return
+    informe()
+    if _archivo:
+        guarda(_archivo)
+
+_valor = os.environ.get(VARIABLE)
+if _valor:
+    activa(ARCHIVOPERFIL if _valor == '1' else _valor)
@@ -49,44 +49,73 @@ Cálculos psicrométricos:
 # delta_alt = None y se usen siempre?
 
 import math
+import numpy
+from . import perfil
+
+_ESCALARES = (int, long, float)
+
+def _esescalar(*values):
+    """¿Son todos los valores escalares de Python (o NumPy float64)?"""
+    for value in values:
+        if not isinstance(value, _ESCALARES):
+            return False
+    return True
 
 def psat(temp):
     """Presión de saturación del aire húmedo [Pa]
 
+    Acepta también arrays de NumPy (o secuencias) de cualquier forma, en
+    cuyo caso se aplica la fórmula por tramos (hielo / agua) elemento a
+    elemento y se devuelve un array de la misma forma.
+
     :param float temp: temperatura del aire [ºC]
     :rtype: float
     """
-    if temp > 0.0:
-        return 610.5 * math.exp(17.269 * temp / (237.3 + temp))
-    else:
-        return 610.5 * math.exp(21.875 * temp / (267.5 + temp))
+    if isinstance(temp, _ESCALARES):
+        if temp > 0.0:
+            return 610.5 * math.exp(17.269 * temp / (237.3 + temp))
+        else:
+            return 610.5 * math.exp(21.875 * temp / (267.5 + temp))
+    temp = numpy.asarray(temp, dtype=float)
+    agua = temp > 0.0
+    a = numpy.where(agua, 17.269, 21.875)
+    b = numpy.where(agua, 237.3, 267.5)
+    return 610.5 * numpy.exp(a * temp / (b + temp))
 
 def pvapor(temp, humedad):
     """Presión de vapor del aire húmedo [Pa]
 
+    Acepta también arrays de NumPy, que se combinan según las reglas de
+    difusión (*broadcasting*) de NumPy.
+
     :param float temp: Temperatura del aire [ºC]
     :param float humedad: humedad relativa del aire [%]
     :rtype: float
     """
+    if not _esescalar(humedad):
+        humedad = numpy.asarray(humedad, dtype=float)
     return (humedad / 100.0) * psat(temp)
 
 def temploc(temp, deltah):
     """Temperatura de una localidad no capital de provincia [ºC]
 
     Es función de la temperatura y diferencia de altitud con la capital de
-    provincia.
+    provincia. Acepta también arrays de NumPy.
 
     :param float temp: temperatura media exterior de la capital para el mes dado [ºC]
     :param float deltah: altura de la localidad sobre la de la capital [m]
     :rtype: float
     """
+    if not _esescalar(temp, deltah):
+        temp = numpy.asarray(temp, dtype=float)
+        deltah = numpy.asarray(deltah, dtype=float)
     return temp - 1.0 * deltah / 100.0
 
 def psatloc(temp, deltah):
     """Presión de saturación en una localidad no capital de provincia [Pa]
 
     Es función de la temperatura y diferencia de altitud con la capital de
-    provincia.
+    provincia. Acepta también arrays de NumPy.
 
     :param float temp: temperatura media exterior de la capital para el mes dado [ºC]
     :param float deltah: altura de la localidad sobre la de la capital [m]
@@ -98,7 +127,7 @@ def hrloc(temp, humedad, deltah):
     """Humedad relativa para la localidad no capital de provincia [%]
 
     Es función de la temperatura, humedad y diferencia de nivel con la capital
-    de provincia [%].
+    de provincia [%]. Acepta también arrays de NumPy.
 
     Si la altura fuese negativa se debería tomar como altura la de la capital.
 
@@ -107,8 +136,11 @@ def hrloc(temp, humedad, deltah):
     :param float deltah: altura de la localidad sobre la de la capital [m]
     :rtype: float
     """
-    if deltah < 0.0:
-        deltah = 0.0
+    if _esescalar(deltah):
+        if deltah < 0.0:
+            deltah = 0.0
+    else:
+        deltah = numpy.maximum(numpy.asarray(deltah, dtype=float), 0.0)
     return 100.0 * (pvapor(temp, humedad) / psatloc(temp, deltah))
 
 def g(pe, pi, Se, Si, kunits=1.0):
@@ -223,3 +255,5 @@ def hrintCTE(text=None, tint=None, tsint=None,
     # Constante de gas para el vapor de agua Rv = 462 [Pa.m³/K.kg]
     delta_p = 462.0 * deltav * (tint + text) / 2.0
     return (100.0 * (pvapor(text, hrext) + delta_p) / psat(tsint))
+
+perfil.registra(__name__, 'psat')
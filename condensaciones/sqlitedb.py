@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Almacenamiento de bases de datos de materiales, cerramientos y climas en
+SQLite
+
+Es una alternativa a los archivos ConfigObj que permite modificar registros
+individuales dentro de transacciones y compartir una misma base de datos
+entre varios usuarios. Los módulos material, cerramiento y clima usan este
+almacenamiento cuando el nombre del archivo tiene una extensión de SQLite
+(ver essqlite).
+
+Este módulo trabaja únicamente con datos simples (diccionarios, tuplas y
+listas), y son los módulos de cada tipo de dato los que construyen los
+objetos correspondientes.
+"""
+
+import os
+import sqlite3
+from contextlib import contextmanager
+
+#: Extensiones de archivo que se interpretan como bases de datos SQLite
+SQLITEEXTS = ('.sqlite', '.sqlite3', '.db')
+
+#: Campos de los materiales (nombres de atributo de material.Material)
+CAMPOSMATERIAL = ('name', 'group', 'type', 'mu', 'db', 'thickness_change',
+                  'thickness', 'conductivity', 'density', 'specific_heat',
+                  'thickness_min', 'thickness_max', 'resistance')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    tabla TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    valor TEXT,
+    PRIMARY KEY (tabla, clave)
+);
+CREATE TABLE IF NOT EXISTS materiales (
+    id INTEGER PRIMARY KEY,
+    orden INTEGER NOT NULL,
+    "name" TEXT NOT NULL UNIQUE,
+    "group" TEXT NOT NULL,
+    "type" TEXT NOT NULL,
+    "mu" REAL NOT NULL,
+    "db" TEXT,
+    "thickness_change" INTEGER,
+    "thickness" REAL,
+    "conductivity" REAL,
+    "density" REAL,
+    "specific_heat" REAL,
+    "thickness_min" REAL,
+    "thickness_max" REAL,
+    "resistance" REAL
+);
+CREATE INDEX IF NOT EXISTS materiales_group ON materiales ("group");
+CREATE INDEX IF NOT EXISTS materiales_type ON materiales ("type");
+CREATE TABLE IF NOT EXISTS cerramientos (
+    id INTEGER PRIMARY KEY,
+    orden INTEGER NOT NULL,
+    nombre TEXT NOT NULL UNIQUE,
+    descripcion TEXT,
+    tipo TEXT,
+    Rse REAL,
+    Rsi REAL
+);
+CREATE TABLE IF NOT EXISTS capas (
+    cerramiento INTEGER NOT NULL
+                REFERENCES cerramientos (id) ON DELETE CASCADE,
+    posicion INTEGER NOT NULL,
+    material TEXT NOT NULL,
+    espesor REAL NOT NULL,
+    PRIMARY KEY (cerramiento, posicion)
+);
+CREATE TABLE IF NOT EXISTS localidades (
+    id INTEGER PRIMARY KEY,
+    orden INTEGER NOT NULL,
+    nombre TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS climas (
+    localidad INTEGER NOT NULL
+              REFERENCES localidades (id) ON DELETE CASCADE,
+    mes INTEGER NOT NULL,
+    temp REAL NOT NULL,
+    HR REAL NOT NULL,
+    PRIMARY KEY (localidad, mes)
+);
+"""
+
+# Campo de nombre de los registros de cada tabla
+_CAMPONOMBRE = {'materiales': '"name"', 'cerramientos': 'nombre',
+                'localidades': 'nombre'}
+
+def essqlite(filename):
+    """Indica si un nombre de archivo corresponde a una base de datos SQLite
+
+    :param str filename: nombre del archivo
+    :rtype: bool
+    """
+    return bool(filename) and os.path.splitext(filename)[1] in SQLITEEXTS
+
+def mezclaorden(propio, guardado, eliminados=()):
+    """Combina el orden de una copia de una tabla con el orden guardado
+
+    La base de datos puede compartirse, de modo que puede contener registros
+    que la copia no conoce (p.e. añadidos y guardados desde otra copia). Se
+    mantiene el orden propio y cada registro desconocido se coloca tras el
+    registro que lo precede en el orden guardado. Se omiten los registros
+    eliminados.
+
+    :param list propio: nombres de los registros de la copia, por orden
+    :param list guardado: nombres de los registros guardados, por orden
+    :param eliminados: nombres de los registros eliminados en la copia
+    :returns: lista de nombres en el orden combinado
+    :rtype: list
+    """
+    resultado = list(propio)
+    conocidos = set(resultado)
+    eliminados = set(eliminados)
+    anterior = None
+    for nombre in guardado:
+        if nombre in eliminados:
+            continue
+        if nombre not in conocidos:
+            posicion = 0 if anterior is None else resultado.index(anterior) + 1
+            resultado.insert(posicion, nombre)
+            conocidos.add(nombre)
+        anterior = nombre
+    return resultado
+
+class SQLiteDB(object):
+    """Base de datos SQLite de materiales, cerramientos y climas
+
+    Cada operación de escritura se realiza en una transacción. Para agrupar
+    varias operaciones en una única transacción se usa transaccion()::
+
+        with db.transaccion():
+            db.setcerramiento(...)
+            db.delcerramiento(...)
+    """
+    def __init__(self, filename):
+        """Abre (o crea) la base de datos
+
+        :param str filename: nombre del archivo de la base de datos
+        """
+        #: nombre del archivo de la base de datos (str)
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self._nivel = 0 # nivel de anidamiento de transacciones
+        with self.transaccion():
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Cierra la conexión con la base de datos"""
+        self.conn.close()
+
+    @contextmanager
+    def transaccion(self):
+        """Contexto de transacción
+
+        Los cambios se confirman al salir del contexto más externo, o se
+        deshacen todos si se produce una excepción.
+        """
+        self._nivel += 1
+        try:
+            yield self.conn
+        except:
+            self._nivel -= 1
+            if self._nivel == 0:
+                self.conn.rollback()
+            raise
+        self._nivel -= 1
+        if self._nivel == 0:
+            self.conn.commit()
+
+    def _orden(self, tabla, campo, nombre):
+        """Posición de un registro, o la siguiente a la última si es nuevo"""
+        row = self.conn.execute('SELECT orden FROM %s WHERE %s = ?' %
+                                (tabla, campo), (nombre,)).fetchone()
+        if row is not None:
+            return row[0]
+        row = self.conn.execute('SELECT MAX(orden) FROM %s' % tabla).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def setorden(self, tabla, nombres):
+        """Establece el orden de los registros de una tabla
+
+        :param str tabla: materiales, cerramientos o localidades
+        :param list nombres: nombres de los registros en el orden deseado
+        """
+        campo = _CAMPONOMBRE[tabla]
+        with self.transaccion() as conn:
+            conn.executemany('UPDATE %s SET orden = ? WHERE %s = ?' %
+                             (tabla, campo), enumerate(nombres))
+
+    def nombres(self, tabla):
+        """Nombres de los registros de una tabla, por orden
+
+        :param str tabla: materiales, cerramientos o localidades
+        :rtype: list
+        """
+        campo = _CAMPONOMBRE[tabla]
+        return [row[0] for row in self.conn.execute(
+                'SELECT %s FROM %s ORDER BY orden' % (campo, tabla))]
+
+    #{ Configuración
+
+    def getconfig(self, tabla):
+        """Sección de configuración de una tabla
+
+        :param str tabla: nombre de la tabla (materiales, cerramientos...)
+        :returns: diccionario de configuración o None si no existe
+        """
+        rows = self.conn.execute('SELECT clave, valor FROM config '
+                                 'WHERE tabla = ?', (tabla,)).fetchall()
+        return dict(rows) if rows else None
+
+    def setconfig(self, tabla, config):
+        """Sustituye la sección de configuración de una tabla
+
+        :param str tabla: nombre de la tabla (materiales, cerramientos...)
+        :param dict config: diccionario de configuración o None
+        """
+        with self.transaccion() as conn:
+            conn.execute('DELETE FROM config WHERE tabla = ?', (tabla,))
+            if config:
+                conn.executemany('INSERT INTO config VALUES (?, ?, ?)',
+                                 [(tabla, k, unicode(v))
+                                  for k, v in config.items()])
+
+    #{ Materiales
+
+    def materiales(self, grupo=None, tipo=None):
+        """Materiales de la base de datos, por orden
+
+        :param str grupo: devolver solo los materiales de este grupo
+        :param str tipo: devolver solo los materiales de este tipo
+        :returns: lista de diccionarios de campos (ver CAMPOSMATERIAL). Los
+                  campos no definidos valen None.
+        """
+        campos = ', '.join('"%s"' % campo for campo in CAMPOSMATERIAL)
+        condiciones, valores = [], []
+        if grupo is not None:
+            condiciones.append('"group" = ?')
+            valores.append(grupo)
+        if tipo is not None:
+            condiciones.append('"type" = ?')
+            valores.append(tipo)
+        where = ' WHERE ' + ' AND '.join(condiciones) if condiciones else ''
+        rows = self.conn.execute('SELECT %s FROM materiales%s ORDER BY orden'
+                                 % (campos, where), valores)
+        return [dict(zip(CAMPOSMATERIAL, row)) for row in rows]
+
+    def setmaterial(self, registro):
+        """Inserta o actualiza un material
+
+        Un material nuevo se añade al final de la base de datos.
+
+        :param dict registro: diccionario de campos (ver CAMPOSMATERIAL)
+        """
+        with self.transaccion() as conn:
+            orden = self._orden('materiales', '"name"', registro['name'])
+            conn.execute('INSERT OR REPLACE INTO materiales (orden, %s) '
+                         'VALUES (?, %s)' %
+                         (', '.join('"%s"' % campo for campo in CAMPOSMATERIAL),
+                          ', '.join('?' * len(CAMPOSMATERIAL))),
+                         [orden] + [registro.get(campo)
+                                    for campo in CAMPOSMATERIAL])
+
+    def delmaterial(self, nombre):
+        """Elimina un material
+
+        :param str nombre: nombre del material
+        """
+        with self.transaccion() as conn:
+            conn.execute('DELETE FROM materiales WHERE "name" = ?', (nombre,))
+
+    #{ Cerramientos
+
+    def cerramientos(self):
+        """Cerramientos de la base de datos, por orden
+
+        :returns: lista ordenada de tuplas (nombre, descripcion, capas, tipo,
+                  Rse, Rsi), donde capas es una lista de tuplas (material,
+                  espesor)
+        """
+        capas = {}
+        for cid, material, espesor in self.conn.execute(
+                'SELECT cerramiento, material, espesor FROM capas '
+                'ORDER BY cerramiento, posicion'):
+            capas.setdefault(cid, []).append((material, espesor))
+        rows = self.conn.execute('SELECT id, nombre, descripcion, tipo, Rse, '
+                                 'Rsi FROM cerramientos ORDER BY orden')
+        return [(nombre, descripcion, capas.get(cid, []), tipo, Rse, Rsi)
+                for cid, nombre, descripcion, tipo, Rse, Rsi in rows]
+
+    def setcerramiento(self, nombre, descripcion, capas, tipo=None,
+                       Rse=None, Rsi=None):
+        """Inserta o actualiza un cerramiento y sus capas
+
+        Un cerramiento nuevo se añade al final de la base de datos.
+
+        :param str nombre: nombre del cerramiento
+        :param str descripcion: descripción del cerramiento
+        :param list capas: lista de tuplas (material, espesor)
+        :param str tipo: tipo de cerramiento
+        :param float Rse: resistencia superficial exterior [m²K/W]
+        :param float Rsi: resistencia superficial interior [m²K/W]
+        """
+        with self.transaccion() as conn:
+            orden = self._orden('cerramientos', 'nombre', nombre)
+            conn.execute('DELETE FROM cerramientos WHERE nombre = ?', (nombre,))
+            cur = conn.execute('INSERT INTO cerramientos (orden, nombre, '
+                               'descripcion, tipo, Rse, Rsi) '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               (orden, nombre, descripcion, tipo, Rse, Rsi))
+            cid = cur.lastrowid
+            conn.executemany('INSERT INTO capas VALUES (?, ?, ?, ?)',
+                             [(cid, i, material, espesor)
+                              for i, (material, espesor) in enumerate(capas)])
+
+    def delcerramiento(self, nombre):
+        """Elimina un cerramiento y sus capas
+
+        :param str nombre: nombre del cerramiento
+        """
+        with self.transaccion() as conn:
+            conn.execute('DELETE FROM cerramientos WHERE nombre = ?', (nombre,))
+
+    #{ Climas
+
+    def climas(self):
+        """Climas de la base de datos, por orden de localidad
+
+        :returns: lista ordenada de tuplas (localidad, datos), donde datos es
+                  una lista de tuplas (temperatura, HR) ordenadas por mes
+        """
+        datos = {}
+        for lid, temp, HR in self.conn.execute(
+                'SELECT localidad, temp, HR FROM climas '
+                'ORDER BY localidad, mes'):
+            datos.setdefault(lid, []).append((temp, HR))
+        rows = self.conn.execute('SELECT id, nombre FROM localidades '
+                                 'ORDER BY orden')
+        return [(nombre, datos.get(lid, [])) for lid, nombre in rows]
+
+    def setclima(self, nombre, datos):
+        """Inserta o actualiza los climas de una localidad
+
+        Una localidad nueva se añade al final de la base de datos.
+
+        :param str nombre: nombre de la localidad
+        :param list datos: lista de tuplas (temperatura, HR) por mes
+        """
+        with self.transaccion() as conn:
+            orden = self._orden('localidades', 'nombre', nombre)
+            conn.execute('DELETE FROM localidades WHERE nombre = ?', (nombre,))
+            cur = conn.execute('INSERT INTO localidades (orden, nombre) '
+                               'VALUES (?, ?)', (orden, nombre))
+            lid = cur.lastrowid
+            conn.executemany('INSERT INTO climas VALUES (?, ?, ?, ?)',
+                             [(lid, i + 1, temp, HR)
+                              for i, (temp, HR) in enumerate(datos)])
+
+    def delclima(self, nombre):
+        """Elimina los climas de una localidad
+
+        :param str nombre: nombre de la localidad
+        """
+        with self.transaccion() as conn:
+            conn.execute('DELETE FROM localidades WHERE nombre = ?', (nombre,))
@@ -21,9 +21,13 @@
 #   02110-1301, USA.
 """Módulo de utilidades varias"""
 
-import os, sys, shutil
+import os, sys, shutil, tempfile
+import cPickle as pickle
 from . import __version__
 
+#: Extensión de los archivos de caché de las bases de datos
+CACHEEXT = '.cache'
+
 def find_main_dir():
     """Find main dir even for py2exe frozen modules"""
     if hasattr(sys, "frozen"): #py2exe frozen module
@@ -57,18 +61,115 @@ def find_or_create_userdir(datadir=None):
         shutil.copy(os.path.join(datadir, 'report', 'style.css'), reportdir)
     return udir
 
+def _cachekey(filename, version):
+    """Clave de validez de la caché de un archivo
+
+    La clave incluye la ruta, fecha de modificación y tamaño del archivo y la
+    versión del formato de los datos guardados.
+    """
+    st = os.stat(filename)
+    return (os.path.abspath(filename), st.st_mtime, st.st_size, version)
+
+def loadcache(filename, version):
+    """Lee los datos guardados en la caché binaria de un archivo
+
+    :param str filename: nombre del archivo original (p.e. MaterialesDB.ini)
+    :param int version: versión del formato de los datos guardados
+    :returns: datos guardados o None si la caché no existe, no se puede leer o
+              no corresponde al estado actual del archivo o a la versión
+    """
+    try:
+        key = _cachekey(filename, version)
+        with open(filename + CACHEEXT, 'rb') as cfile:
+            ckey, data = pickle.load(cfile)
+    except Exception:
+        return None
+    return data if ckey == key else None
+
+def savecache(filename, version, data):
+    """Guarda datos en la caché binaria de un archivo
+
+    La caché se escribe con atomicwrite, de modo que una escritura
+    interrumpida no deja una caché corrupta. Los errores de escritura (p.e.
+    directorio de solo lectura) se ignoran.
+
+    :param str filename: nombre del archivo original (p.e. MaterialesDB.ini)
+    :param int version: versión del formato de los datos guardados
+    :param data: datos a guardar
+    :returns: True si se ha guardado la caché
+    :rtype: bool
+    """
+    try:
+        key = _cachekey(filename, version)
+        atomicwrite(filename + CACHEEXT,
+                    pickle.dumps((key, data), pickle.HIGHEST_PROTOCOL))
+    except (IOError, OSError, pickle.PicklingError):
+        return False
+    return True
+
+def atomicwrite(filename, data):
+    """Escribe un archivo de forma atómica
+
+    Los datos se escriben en un archivo temporal del mismo directorio que
+    sustituye al archivo original una vez escrito por completo, de modo que
+    una escritura interrumpida nunca deja el archivo incompleto.
+
+    El archivo nuevo conserva los permisos del original o, si no existía,
+    recibe los predeterminados según la máscara de permisos (umask).
+
+    :param str filename: nombre del archivo
+    :param str data: contenido del archivo
+    """
+    fdir = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(dir=fdir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmpfile:
+            tmpfile.write(data)
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmpname)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmpname, 0666 & ~umask)
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmpname, filename)
+    except:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
 class AppConfig(object):
+    """Configuración de la aplicación
+
+    El directorio de usuario (y sus archivos de configuración y bases de
+    datos) no se localiza o crea hasta que se usa por primera vez, de modo
+    que importar los módulos de cálculo no tiene efectos secundarios.
+    """
     def __init__(self):
         self.maindir = find_main_dir()
         self.datadir = os.path.join(self.maindir, 'data')
-        self.userdir = find_or_create_userdir(self.datadir)
-        self.paths = {
+        self._userdir = None
+        self.version = __version__
+
+    @property
+    def userdir(self):
+        """Directorio de usuario, que se crea si no existe"""
+        if self._userdir is None:
+            self._userdir = find_or_create_userdir(self.datadir)
+        return self._userdir
+
+    @property
+    def paths(self):
+        """Rutas de los archivos de configuración y bases de datos"""
+        return {
             'mainconf': os.path.join(self.userdir, 'Condensaciones.ini'),
             'cerramientosdb': os.path.join(self.userdir, 'CerramientosDB.ini'),
             'climasdb': os.path.join(self.userdir, 'ClimasDB.ini'),
             'materialesdb': os.path.join(self.userdir, 'MaterialesDB.ini')
         }
-        self.version = __version__
 
     def appresource(self, *path_list):
         """Localiza un recurso del programa"""
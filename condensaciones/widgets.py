@@ -32,6 +32,7 @@ from matplotlib.backends.backend_gtk3cairo import FigureCanvasGTK3Cairo as Figur
 
 from .clima import MESES
 from .util import config
+from . import perfil
 
 class CPTCanvas(FigureCanvas):
     """Diagrama de presiones de saturación frente a presiones o temperaturas"""
@@ -190,7 +191,7 @@ class CPTCanvas(FigureCanvas):
                          facecolor='red')
         # Lineas rojas de interfases con condensaciones en el mes actual
         # añadimos 1 al índice porque x_s tiene margen
-        for i, gi in m.glist[m.imes]:
+        for i in m.glist.g[m.imes].nonzero()[0]:
             ax1.axvline(x_s[i+1], lw=1.5, color='r', ymin=.05, ymax=.9)
         # Dejar margen fuera de zona de trazado
         ymin, ymax = ax1.get_ylim()
@@ -367,13 +368,14 @@ class CRuler(Gtk.DrawingArea):
         cr.translate(titmaxw, 0)
 
         # Casillas de Periodos
-        ln = len(self.model.gmeses)
+        gmeses = self.model.gmeses
+        ln = len(gmeses)
         ew = (1.0 * ww - titmaxw) / ln
         ismeses = ln == 12
-        gmax = max(self.model.gmeses)
+        gmax = max(gmeses)
         k = (1.0 * wh / gmax) if gmax else 0.0
 
-        for i, condensa in enumerate(self.model.gmeses):
+        for i, condensa in enumerate(gmeses):
             # Rectángulos de fondo
             cr.rectangle(i * ew, 0, ew, wh)
             if condensa > 0:
@@ -412,3 +414,5 @@ class CRuler(Gtk.DrawingArea):
             cr.rectangle(round(self.model.imes*ew)+1.5, 0.5, ew-2.0, wh-0.5)
             cr.set_source_rgb(1.0, 0.2, 0.2)
             cr.stroke()
+
+perfil.registra(__name__, 'CPTCanvas.dibuja', 'CCCanvas.dibuja')
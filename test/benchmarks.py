@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Pruebas de rendimiento de los cálculos, la E/S y la representación
+
+Mide el tiempo por llamada de las funciones más costosas y, opcionalmente,
+guarda los resultados en formato JSON y los compara con los de una ejecución
+de referencia, señalando las regresiones que superan un umbral.
+
+La referencia del proyecto se guarda en test/benchmarks_base.json (ver BASE)
+y se compara con ella con::
+
+    python test/benchmarks.py -b test/benchmarks_base.json
+
+Los tiempos dependen del equipo (se avisa si la referencia se midió en otro
+sistema), de modo que para comprobar un cambio en otro equipo se mide antes
+una referencia propia::
+
+    python test/benchmarks.py -o base.json
+    ... cambios ...
+    python test/benchmarks.py -b base.json -u 0.2
+
+La referencia del proyecto se regenera con -o test/benchmarks_base.json al
+añadir pruebas o cuando un cambio modifica intencionadamente los tiempos.
+Los tests (test_benchmarks) comprueban que incluye todas las pruebas
+registradas.
+
+Las bases de datos se copian a un directorio temporal, de modo que las
+cachés binarias no se escriben en el directorio de datos.
+"""
+
+import os, sys
+import json
+import shutil
+import timeit
+import optparse
+import platform
+import tempfile
+import numpy
+if not hasattr(sys, 'frozen'):
+    currpath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    sys.path.append(currpath)
+from condensaciones import (__version__, appmodel, barrido, cerramiento, clima,
+                            comprobaciones, dbutils, htmlreport, incertidumbre,
+                            material, ordenacion, psicrom)
+from condensaciones.util import config
+
+climae = clima.Clima(5, 96) #T, HR
+climai = clima.Clima(20.0, 55) #T, HR
+
+capas1 = [(u"1/2 pie LP métrico o catalán 40 mm< G < 60 mm", 0.11),
+          (u"Mortero de áridos ligeros [vermiculita perlita]", 0.01),
+          (u"EPS Poliestireno Expandido [ 0.037 W/[mK]]", 0.03),
+          (u"Tabique de LH sencillo [40 mm < Espesor < 60 mm]", 0.03),
+          (u"Enlucido de yeso 1000 < d < 1300", 0.01),]
+
+#: Número de materiales del catálogo LIDER/CALENER sintético
+NMATERIALESCATALOGO = 5000
+
+#: Resultados de referencia del proyecto
+BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    'benchmarks_base.json')
+
+class Omitida(Exception):
+    """La prueba no puede ejecutarse en este sistema"""
+
+#: Lista de pruebas registradas, como tuplas (nombre, preparación)
+PRUEBAS = []
+
+def prueba(nombre):
+    """Registra una prueba de rendimiento
+
+    La función decorada recibe los datos comunes (ver Datos), prepara la
+    prueba y devuelve la función sin argumentos cuyo tiempo se mide, de modo
+    que la preparación no se incluye en la medida.
+    """
+    def registra(preparacion):
+        PRUEBAS.append((nombre, preparacion))
+        return preparacion
+    return registra
+
+class Datos(object):
+    """Datos comunes de las pruebas, copiados a un directorio temporal"""
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix='condensaciones-bench-')
+        for nombre in ('MaterialesDB.ini', 'CerramientosDB.ini',
+                       'ClimasDB.ini'):
+            shutil.copy(os.path.join(config.datadir, nombre), self.dir)
+        self.materialesdb = os.path.join(self.dir, 'MaterialesDB.ini')
+        self.cerramientosdb = os.path.join(self.dir, 'CerramientosDB.ini')
+        self.climasdb = os.path.join(self.dir, 'ClimasDB.ini')
+        self.matDB = material.MaterialesDB(self.materialesdb)
+        self.cdb = cerramiento.CerramientosDB(self.cerramientosdb, self.matDB)
+        self.climas = clima.loadclimadb(self.climasdb)[0]
+        self.catalogo = os.path.join(self.dir, 'Catalogo.bdc')
+        _catalogosintetico(self.catalogo, NMATERIALESCATALOGO)
+
+    def cerramiento(self, ncapas):
+        """Cerramiento con ncapas capas (repitiendo las de capas1)"""
+        capas = (capas1 * (ncapas // len(capas1) + 1))[:ncapas]
+        return cerramiento.Cerramiento(u"Cerramiento %i capas" % ncapas,
+                                       u"Prueba", capas, matDB=self.matDB)
+
+    def modelo(self, ncapas=5):
+        """Modelo con un cerramiento de ncapas y una localidad mensual"""
+        m = appmodel.Model(self.cdb, self.climas)
+        m.c = self.cerramiento(ncapas)
+        m.localidad = u'Burgos'
+        return m
+
+    def limpia(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def _catalogosintetico(filename, nmateriales):
+    """Escribe un catálogo LIDER/CALENER con nmateriales materiales"""
+    bloque = (u'"Material %(i)i" = MATERIAL\r\n'
+              u'    TYPE           = PROPERTIES\r\n'
+              u'    THICKNESS      = 0.0%(e)i\r\n'
+              u'    CONDUCTIVITY   = 0.%(k)i\r\n'
+              u'    DENSITY        = %(d)i\r\n'
+              u'    SPECIFIC-HEAT  = 1000\r\n'
+              u'    VAPOUR-DIFFUSIVITY-FACTOR = %(mu)i\r\n'
+              u'    NAME           = "Material %(i)i"\r\n'
+              u'    NAME_CALENER   = ""\r\n'
+              u'    GROUP          = "Grupo %(g)i"\r\n'
+              u'    IMAGE          = "asfalto.bmp"\r\n'
+              u'    LIBRARY        = NO\r\n'
+              u'..\r\n')
+    with open(filename, 'wb') as f:
+        f.write('$ Catálogo sintético\r\n'.decode('utf-8').encode('iso-8859-1'))
+        for i in range(nmateriales):
+            f.write(bloque % dict(i=i, e=1 + i % 9, k=10 + i % 90,
+                                  d=100 + i % 2000, mu=1 + i % 50, g=i % 20))
+
+#===============================================================================
+# Pruebas
+#===============================================================================
+
+@prueba('psicrom.psat.escalar')
+def _psatescalar(datos):
+    return lambda: psicrom.psat(12.5)
+
+@prueba('psicrom.psat.array1000')
+def _psatarray(datos):
+    temps = numpy.linspace(-20.0, 40.0, 1000)
+    return lambda: psicrom.psat(temps)
+
+def _condensacion(ncapas):
+    def preparacion(datos):
+        c = datos.cerramiento(ncapas)
+        return lambda: c.condensacion(climae.temp, climai.temp,
+                                      climae.HR, climai.HR)
+    return preparacion
+
+for _ncapas in (5, 50, 500):
+    prueba('cerramiento.condensacion.%icapas' % _ncapas)(
+                                                    _condensacion(_ncapas))
+
+@prueba('comprobaciones.calculaintersticiales.12meses')
+def _intersticiales(datos):
+    c = datos.cerramiento(5)
+    climasext = datos.climas[u'Burgos']
+    return lambda: comprobaciones.calculaintersticiales(c, climai.temp,
+                                                        climai.HR, climasext)
+
+@prueba('barrido.barrido.20x20x3')
+def _barrido(datos):
+    c = datos.cerramiento(5)
+    climasext = datos.climas[u'Burgos']
+    ejes = [barrido.Eje('espesor', numpy.linspace(0.01, 0.2, 20), 0),
+            barrido.Eje('espesor', numpy.linspace(0.01, 0.2, 20), 2),
+            barrido.Eje('Rsi', [0.10, 0.13, 0.17])]
+    return lambda: barrido.barrido(c, ejes, climasext, climai.temp, climai.HR)
+
+@prueba('incertidumbre.montecarlo.10000muestras')
+def _montecarlo(datos):
+    c = datos.cerramiento(5)
+    climasext = datos.climas[u'Burgos']
+    return lambda: incertidumbre.montecarlo(c, climasext, 10000, climai.temp,
+                                            climai.HR)
+
+@prueba('ordenacion.ordenoptima.7capas')
+def _ordenoptima(datos):
+    c = datos.cerramiento(7)
+    climasext = datos.climas[u'Burgos']
+    return lambda: ordenacion.ordenoptima(c, climasext, climai.temp, 95.0,
+                                          (0, -1))
+
+@prueba('bbdd.materiales.interpreta')
+def _materialesinterpreta(datos):
+    return lambda: material._parsematerialesdb(datos.materialesdb)
+
+@prueba('bbdd.materiales.cache')
+def _materialescache(datos):
+    return lambda: material.MaterialesDB(datos.materialesdb)
+
+@prueba('bbdd.cerramientos.interpreta')
+def _cerramientosinterpreta(datos):
+    return lambda: cerramiento._parsecerramientosdb(datos.cerramientosdb)
+
+@prueba('bbdd.cerramientos.cache')
+def _cerramientoscache(datos):
+    return lambda: cerramiento.CerramientosDB(datos.cerramientosdb,
+                                              datos.matDB)
+
+@prueba('bbdd.climas.interpreta')
+def _climasinterpreta(datos):
+    return lambda: clima.loadclimadb(datos.climasdb, cache=False)
+
+@prueba('bbdd.climas.cache')
+def _climascache(datos):
+    return lambda: clima.loadclimadb(datos.climasdb)
+
+@prueba('dbutils.parsefile.%imateriales' % NMATERIALESCATALOGO)
+def _parsefile(datos):
+    return lambda: dbutils.parsefile(datos.catalogo)
+
+@prueba('htmlreport.capaslist.50capas')
+def _capaslist(datos):
+    m = datos.modelo(50)
+    return lambda: htmlreport.capaslist(m)
+
+@prueba('widgets.CPTCanvas.dibuja.agg')
+def _cptcanvas(datos):
+    try:
+        from condensaciones import widgets
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+    except ImportError, e:
+        raise Omitida('requiere Gtk y matplotlib (%s)' % e)
+
+    class LienzoAgg(object):
+        """CPTCanvas que se dibuja con el backend Agg, sin pantalla"""
+        dibuja = widgets.CPTCanvas.dibuja.im_func
+
+        def __init__(self, model):
+            self.model = model
+            figure = Figure()
+            self.canvas = FigureCanvasAgg(figure)
+            self.ax1 = figure.add_subplot(111)
+            self.ax2 = self.ax1.twinx()
+
+        def emit(self, signal):
+            pass
+
+    lienzo = LienzoAgg(datos.modelo(5))
+    def dibuja():
+        lienzo.dibuja()
+        lienzo.canvas.draw()
+    return dibuja
+
+#===============================================================================
+# Medida y comparación
+#===============================================================================
+
+def mide(funcion, repeticiones=5, tiempominimo=0.2):
+    """Tiempo por llamada de una función [s]
+
+    El número de llamadas de cada repetición se ajusta para que dure al
+    menos tiempominimo / repeticiones y se toma la repetición más rápida.
+
+    :returns: tiempo por llamada [s] y número de llamadas por repetición
+    :rtype: tuple
+    """
+    temporizador = timeit.Timer(funcion)
+    bucles = 1
+    while bucles < 10 ** 6:
+        if temporizador.timeit(bucles) >= tiempominimo / repeticiones:
+            break
+        bucles *= 10
+    return min(temporizador.repeat(repeticiones, bucles)) / bucles, bucles
+
+def ejecuta(filtro=None, repeticiones=5, tiempominimo=0.2, informe=None):
+    """Ejecuta las pruebas registradas
+
+    :param str filtro: ejecutar solo las pruebas cuyo nombre lo contiene
+    :param int repeticiones: repeticiones de cada medida (ver mide)
+    :param float tiempominimo: duración mínima de cada medida [s]
+    :param informe: función a la que se llama con el nombre y resultado de
+        cada prueba según termina
+    :returns: diccionario de resultados en formato JSON
+    :rtype: dict
+    """
+    resultados = {}
+    datos = Datos()
+    try:
+        for nombre, preparacion in PRUEBAS:
+            if filtro and filtro not in nombre:
+                continue
+            try:
+                funcion = preparacion(datos)
+            except Omitida, e:
+                resultado = {'omitida': str(e)}
+            else:
+                tiempo, bucles = mide(funcion, repeticiones, tiempominimo)
+                resultado = {'tiempo': tiempo, 'bucles': bucles,
+                             'repeticiones': repeticiones}
+            resultados[nombre] = resultado
+            if informe:
+                informe(nombre, resultado)
+    finally:
+        datos.limpia()
+    return {'version': __version__,
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'sistema': platform.platform(),
+            'pruebas': resultados}
+
+def compara(actual, base, umbral=0.2):
+    """Compara resultados con los de una ejecución de referencia
+
+    :param dict actual: resultados (ver ejecuta)
+    :param dict base: resultados de referencia
+    :param float umbral: aumento relativo del tiempo que se considera una
+        regresión (0.2: un 20% más lento)
+    :returns: lista de tuplas (prueba, tiempo de referencia, tiempo actual,
+        cociente, ¿regresión?) de las pruebas medidas en ambas ejecuciones
+    :rtype: list
+    """
+    comparacion = []
+    for nombre in sorted(actual['pruebas']):
+        nuevo = actual['pruebas'][nombre].get('tiempo')
+        viejo = base['pruebas'].get(nombre, {}).get('tiempo')
+        if nuevo is None or viejo is None:
+            continue
+        cociente = nuevo / viejo
+        comparacion.append((nombre, viejo, nuevo, cociente,
+                            cociente > 1.0 + umbral))
+    return comparacion
+
+def _formatotiempo(tiempo):
+    """Representación de un tiempo con unidades legibles"""
+    for unidad, escala in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if tiempo >= escala:
+            return '%8.3f %-2s' % (tiempo / escala, unidad)
+    return '%8.3f ns' % (tiempo / 1e-9)
+
+def _informe(nombre, resultado):
+    """Muestra el resultado de una prueba"""
+    if 'omitida' in resultado:
+        print "%-50s   omitida: %s" % (nombre, resultado['omitida'])
+    else:
+        print "%-50s %s  (%i llamadas)" % (nombre,
+                                            _formatotiempo(resultado['tiempo']),
+                                            resultado['bucles'])
+    sys.stdout.flush()
+
+def main(argv=None):
+    usage = "%prog [opciones]"
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option('-o', '--salida', action="store", default=None,
+                      dest="salida",
+                      help="Archivo JSON en el que guardar los resultados")
+    parser.add_option('-b', '--base', action="store", default=None,
+                      dest="base",
+                      help="Archivo JSON de resultados de referencia con el "
+                      "que comparar")
+    parser.add_option('-u', '--umbral', type="float", action="store",
+                      default=0.2, dest="umbral",
+                      help="Aumento relativo de tiempo considerado regresion "
+                      "(%default por defecto)")
+    parser.add_option('-f', '--filtro', action="store", default=None,
+                      dest="filtro",
+                      help="Ejecutar solo las pruebas cuyo nombre contiene "
+                      "este texto")
+    parser.add_option('-r', '--repeticiones', type="int", action="store",
+                      default=5, dest="repeticiones",
+                      help="Repeticiones de cada medida (%default por "
+                      "defecto)")
+    parser.add_option('-t', '--tiempo', type="float", action="store",
+                      default=0.2, dest="tiempo",
+                      help="Duracion minima de cada medida [s] (%default por "
+                      "defecto)")
+    (options, args) = parser.parse_args(argv)
+
+    resultados = ejecuta(options.filtro, options.repeticiones, options.tiempo,
+                         _informe)
+    if options.salida:
+        with open(options.salida, 'wb') as f:
+            json.dump(resultados, f, indent=2, sort_keys=True)
+    if options.base:
+        with open(options.base, 'rb') as f:
+            base = json.load(f)
+        comparacion = compara(resultados, base, options.umbral)
+        print
+        print "Comparacion con %s (umbral %+.0f%%)" % (options.base,
+                                                      100 * options.umbral)
+        if (base.get('sistema'), base.get('python')) != (
+                resultados['sistema'], resultados['python']):
+            print "Aviso: referencia medida en %s (Python %s)" % (
+                base.get('sistema'), base.get('python'))
+        for nombre in sorted(resultados['pruebas']):
+            if nombre not in base['pruebas']:
+                print "%-50s sin referencia" % nombre
+        for nombre, viejo, nuevo, cociente, regresion in comparacion:
+            print "%-50s %s %s %6.2fx %s" % (nombre, _formatotiempo(viejo),
+                                             _formatotiempo(nuevo), cociente,
+                                             'REGRESION' if regresion else '')
+        regresiones = [fila for fila in comparacion if fila[-1]]
+        if regresiones:
+            print "%i regresiones" % len(regresiones)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
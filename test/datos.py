@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Datos comunes de los tests de cálculo
+
+Cerramientos de capas conocidas y climas tomados de las bases de datos que
+acompañan al programa (ver config.appresource), de modo que los resultados
+no dependen de las bases de datos del usuario. Cada base de datos se lee
+una sola vez.
+"""
+
+from condensaciones import clima, material
+from condensaciones.cerramiento import Cerramiento, CerramientosDB
+from condensaciones.util import config
+
+#: Capas del cerramiento de ladrillo con aislamiento de EPS
+CAPAS1 = [(u"1/2 pie LP métrico o catalán 40 mm< G < 60 mm", 0.11),
+          (u"Mortero de áridos ligeros [vermiculita perlita]", 0.01),
+          (u"EPS Poliestireno Expandido [ 0.037 W/[mK]]", 0.03),
+          (u"Tabique de LH sencillo [40 mm < Espesor < 60 mm]", 0.03),
+          (u"Enlucido de yeso 1000 < d < 1300", 0.01),]
+
+#: Capas del cerramiento de granito con aislamiento de XPS
+CAPAS2 = [(u"Granito [2500 < d < 2700]", 0.03),
+          (u"Mortero de cemento o cal para albañilería y para "
+           u"revoco/enlucido 1800 < d < 2000", 0.02),
+          (u"XPS Expandido con dióxido de carbono CO2 [ 0.034 W/[mK]]", 0.05),
+          (u"Tabicón de LH doble  [60 mm < E < 90 mm]", 0.14),
+          (u"Enlucido de yeso 1000 < d < 1300", 0.015),]
+
+_materialesdb = None
+_cerramientosdb = None
+_climasdb = None
+
+def materialesdb():
+    """BBDD de materiales del programa"""
+    global _materialesdb
+    if _materialesdb is None:
+        _materialesdb = material.MaterialesDB(
+                                    config.appresource('MaterialesDB.ini'))
+    return _materialesdb
+
+def cerramientosdb():
+    """BBDD de cerramientos del programa"""
+    global _cerramientosdb
+    if _cerramientosdb is None:
+        _cerramientosdb = CerramientosDB(
+                config.appresource('CerramientosDB.ini'), materialesdb())
+    return _cerramientosdb
+
+def climas(localidad=u'Burgos'):
+    """Climas mensuales de una localidad de la BBDD de climas del programa"""
+    global _climasdb
+    if _climasdb is None:
+        _climasdb = clima.loadclimadb(config.appresource('ClimasDB.ini'))[0]
+    return _climasdb[localidad]
+
+def cerramiento(capas=CAPAS1, nombre=u'Cerramiento'):
+    """Cerramiento de capas dadas con la BBDD de materiales del programa"""
+    return Cerramiento(nombre, u'', list(capas), 0.04, 0.13,
+                       matDB=materialesdb())
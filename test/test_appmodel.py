@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests del módulo condensaciones.appmodel"""
+
+import os
+import unittest
+from condensaciones import appmodel, comprobaciones, cerramiento, clima
+from condensaciones.util import config
+
+class  ModelTestCase(unittest.TestCase):
+    """Comprobaciones de la caché de resultados del modelo"""
+    def setUp(self):
+        """Module-level setup"""
+        self.calculos = 0
+        self._calculaintersticiales = comprobaciones.calculaintersticiales
+        def contador(*args):
+            self.calculos += 1
+            return self._calculaintersticiales(*args)
+        comprobaciones.calculaintersticiales = contador
+        self.model = appmodel.Model()
+        self.model.localidad = self.model.climas[0]
+
+    def tearDown(self):
+        comprobaciones.calculaintersticiales = self._calculaintersticiales
+
+    def accesos(self):
+        """Accede a los resultados como lo hace la interfaz al actualizarse"""
+        m = self.model
+        return (m.fRsi, m.fRsimin, m.ci, m.cs, m.glist[m.imes],
+                len(m.gmeses), max(m.gmeses), list(m.gmeses), m.glist)
+
+    def test_cache(self):
+        """Un único cálculo anual por modificación"""
+        self.accesos()
+        self.accesos()
+        self.assertEqual(self.calculos, 1)
+        self.model.imes = 3
+        self.model.localidad = self.model.climas[0]
+        self.accesos()
+        self.assertEqual(self.calculos, 1)
+
+    def test_bbdd(self):
+        """Modelo con BBDD de cerramientos y climas explícitas"""
+        cdb = cerramiento.CerramientosDB(os.path.join(config.datadir,
+                                                      'CerramientosDB.ini'))
+        climasDB = {'Sevilla': [clima.Clima(10.7, 79)]}
+        m = appmodel.Model(cerramientosDB=cdb, climasDB=climasDB)
+        self.assertTrue(m.cerramientosDB is cdb)
+        self.assertEqual(m.climas, ['Sevilla'])
+        self.assertTrue(m.c is cdb[cdb.nombres[0]])
+        m.localidad = 'Sevilla'
+        self.assertEqual(m.climaslist, climasDB['Sevilla'])
+
+    def test_invalidacion(self):
+        """Las modificaciones del modelo invalidan los resultados"""
+        m = self.model
+        nombre, e = m.c.capas[0]
+        Rsi = m.c.Rsi
+        U = m.c.U
+        fRsi = m.fRsi
+        self.accesos()
+        m.set_capa(0, nombre, 2 * e)
+        self.accesos()
+        self.accesos()
+        self.assertEqual(self.calculos, 2)
+        self.assertNotEqual(m.fRsi, fRsi)
+        m.set_Rsi(Rsi + 0.01)
+        m.climai = (20.0, 62.0)
+        self.accesos()
+        self.assertEqual(self.calculos, 3)
+        m.set_capa(0, nombre, e)
+        m.set_Rsi(Rsi)
+        self.assertEqual(m.c.U, U)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(ModelTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests del módulo condensaciones.barrido"""
+
+import numpy
+import unittest
+from condensaciones import barrido, comprobaciones
+from condensaciones.cerramiento import Cerramiento
+import datos
+
+class  BarridoTestCase(unittest.TestCase):
+    """Barridos paramétricos de cerramientos"""
+    def setUp(self):
+        """Module-level setup"""
+        self.c = datos.cerramiento()
+        self.climas = datos.climas(u'Burgos')
+        self.ejes = [barrido.Eje('espesor', [0.01, 0.04, 0.1], 2),
+                     barrido.Eje('material',
+                                 [self.c.capas[4][0],
+                                  u'Mortero de cemento o cal para albañilería '
+                                  u'y para revoco/enlucido 1000 < d < 1250',
+                                  u'EPS Poliestireno Expandido [ 0.037 W/[mK]]'],
+                                 4),
+                     barrido.Eje('Rse', [0.04, 0.13])]
+
+    def test_barrido(self):
+        """Resultados iguales a los de cada cerramiento por separado"""
+        r = barrido.barrido(self.c, self.ejes, self.climas, 20.0, 55.0)
+        self.assertEqual(r.forma, (3, 3, 2))
+        self.assertEqual(r.gmeses.shape, (3, 3, 2, 12))
+        self.assertTrue(r.ci.any() and not r.ci.all())
+        for indice in numpy.ndindex(r.forma):
+            e, nombre, Rse = r.valores(indice)
+            capas = list(self.c.capas)
+            capas[2] = (capas[2][0], e)
+            capas[4] = (nombre, capas[4][1])
+            c = Cerramiento('Variante', '', capas, Rse, self.c.Rsi,
+                            matDB=self.c.matDB)
+            g = comprobaciones.cicloanual(c, 20.0, 55.0, self.climas)
+            self.assertEqual(r.U[indice], c.U)
+            self.assertEqual(r.fRsi[indice], comprobaciones.fRsi(c.U))
+            self.assertTrue(numpy.array_equal(r.gmeses[indice], g.sum(axis=1)))
+            self.assertEqual(r.mesescondensan[indice], (g > 0).any(axis=1).sum())
+        self.assertEqual(r.fRsimin, comprobaciones.fRsimin(self.climas[0].temp,
+                                                           20.0, 55.0))
+        # El resultado no depende del tamaño de los bloques
+        r2 = barrido.barrido(self.c, self.ejes, self.climas, 20.0, 55.0,
+                             bloque=4)
+        self.assertTrue(numpy.array_equal(r.gmeses, r2.gmeses))
+
+    def test_ejes(self):
+        """Ejes no válidos"""
+        self.assertRaises(ValueError, barrido.Eje, 'densidad', [1.0])
+        self.assertRaises(ValueError, barrido.Eje, 'espesor', [0.01])
+        self.assertRaises(ValueError, barrido.Eje, 'Rsi', [0.13], 1)
+        self.assertRaises(ValueError, barrido.Eje, 'Rse', [])
+        self.assertRaises(ValueError, barrido.barrido, self.c,
+                          [barrido.Eje('espesor', [0.01], 9)], self.climas)
+        self.assertRaises(ValueError, barrido.barrido, self.c,
+                          [barrido.Eje('material', [u'No existe'], 0)],
+                          self.climas)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(BarridoTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
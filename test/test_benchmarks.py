@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests de las pruebas de rendimiento (test/benchmarks.py)"""
+
+import sys
+import json
+import unittest
+from cStringIO import StringIO
+import benchmarks
+
+class  BenchmarksTestCase(unittest.TestCase):
+    """Resultados de referencia y comparación de las pruebas de rendimiento"""
+    def setUp(self):
+        """Module-level setup"""
+        with open(benchmarks.BASE, 'rb') as f:
+            self.base = json.load(f)
+
+    def test_base(self):
+        """La referencia incluye todas las pruebas registradas"""
+        nombres = [nombre for nombre, preparacion in benchmarks.PRUEBAS]
+        self.assertEqual(sorted(self.base['pruebas']), sorted(nombres))
+
+    def test_compara(self):
+        """Detección de regresiones respecto a la referencia"""
+        actual = {'pruebas': {'a': {'tiempo': 1.1}, 'b': {'tiempo': 1.3},
+                              'c': {'omitida': 'x'}, 'd': {'tiempo': 1.0}}}
+        base = {'pruebas': {'a': {'tiempo': 1.0}, 'b': {'tiempo': 1.0},
+                            'c': {'tiempo': 1.0}}}
+        comparacion = benchmarks.compara(actual, base, 0.2)
+        self.assertEqual([(fila[0], fila[-1]) for fila in comparacion],
+                         [('a', False), ('b', True)])
+        self.assertAlmostEqual(comparacion[1][3], 1.3)
+
+    def test_main(self):
+        """Comparación con la referencia del proyecto"""
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            resultado = benchmarks.main(['-f', 'psicrom.psat.escalar',
+                                         '-b', benchmarks.BASE, '-u', '1000',
+                                         '-r', '1', '-t', '0.001'])
+            salida = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(resultado, 0)
+        self.assertTrue(salida.splitlines()[-1].startswith(
+                                                'psicrom.psat.escalar'))
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(BenchmarksTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
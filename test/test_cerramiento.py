@@ -22,9 +22,13 @@
 #   02110-1301, USA.
 """Tests del módulo condensaciones.cerramiento"""
 
+import os
 import unittest
+import numpy
+from condensaciones import cerramiento, material
+from condensaciones.util import config
 from condensaciones.cerramiento import Cerramiento
-from condensaciones.clima import Clima
+from condensaciones.clima import Clima, climas2arrays
 
 climae = Clima(5, 96) #T, HR
 climai = Clima(20.0, 55) #T, HR
@@ -142,6 +146,78 @@ class  CerramientoTestCase(unittest.TestCase):
         self.assertAlmostEqual(psext, 871.86452524041533, places=8)
         self.assertAlmostEqual(psint, 2336.9511438023419, places=8)
 
+    def test_lote(self):
+        """Perfiles de temperaturas y presiones para un lote de climas"""
+        climas = [climae, climae1, Clima(-5.0, 85), Clima(25.0, 60)]
+        te, hre = climas2arrays(climas)
+        temps = self.c1.temperaturaslote(te, climai.temp)
+        pres = self.c1.presioneslote(te, climai.temp, hre, climai.HR)
+        psats = self.c1.presionessatlote(te, climai.temp)
+        self.assertEqual(temps.shape, (4, 8))
+        self.assertEqual(pres.shape, (4, 8))
+        self.assertEqual(psats.shape, (4, 8))
+        for i, clima in enumerate(climas):
+            self.assertEqual(temps[i].tolist(),
+                             self.c1.temperaturas(clima.temp, climai.temp))
+            numpy.testing.assert_allclose(pres[i],
+                self.c1.presiones(clima.temp, climai.temp, clima.HR, climai.HR))
+            numpy.testing.assert_allclose(psats[i],
+                self.c1.presionessat(clima.temp, climai.temp))
+        temps2d = self.c1.temperaturaslote(te.reshape(2, 2), climai.temp)
+        self.assertEqual(temps2d.shape, (2, 2, 8))
+
+    def test_tabla(self):
+        """Invalidación de la tabla de capas al modificar el cerramiento"""
+        tabla = self.c1.tabla
+        self.assertTrue(self.c1.tabla is tabla)
+        self.c1.capas[2] = (self.c1.capas[2][0], 0.06)
+        self.assertFalse(self.c1.tabla is tabla)
+        self.assertAlmostEqual(self.c1.R_total, 2.04426738, places=8)
+        tabla = self.c1.tabla
+        self.c1.Rsi = 0.17
+        self.assertFalse(self.c1.tabla is tabla)
+        self.assertAlmostEqual(self.c1.R_total, 2.08426738, places=8)
+        self.c1.capas.pop(2)
+        self.assertEqual(self.c1.S_total, self.c1.tabla.Sacum[-1])
+        self.assertAlmostEqual(self.c1.S_total, 1.56, places=8)
+
+    def test_tablamateriales(self):
+        """Invalidación de la tabla de capas al modificar los materiales"""
+        otradb = material.MaterialesDB(os.path.join(config.datadir,
+                                                    'MaterialesDB.ini'))
+        c2 = Cerramiento("Cerramiento tipo", "Descripción",
+                         capas1, Rse=0.04, Rsi=0.13, matDB=otradb)
+        self.assertAlmostEqual(c2.U, 0.80368578, places=8)
+        tabla = c2.tabla
+        self.assertTrue(c2.tabla is tabla)
+        # Modificación directa de un material de la BBDD
+        mat = otradb[capas1[2][0]]
+        conductividad = mat.conductivity
+        mat.conductivity = 0.075
+        self.assertFalse(c2.tabla is tabla)
+        self.assertAlmostEqual(c2.R[3], 0.40, places=8)
+        self.assertAlmostEqual(c2.U, 1.0 / (1.0 / 0.80368578 - 0.40),
+                               places=6)
+        # Sustitución de un material de la BBDD
+        tabla = c2.tabla
+        nuevo = material.Material(mat.name, mat.group, 'PROPERTIES', mat.mu)
+        nuevo.conductivity = conductividad
+        otradb[mat.name] = nuevo
+        self.assertFalse(c2.tabla is tabla)
+        self.assertAlmostEqual(c2.U, 0.80368578, places=6)
+
+    def test_matdb(self):
+        """BBDD de materiales explícita o predeterminada"""
+        self.assertTrue(self.c1.matDB is cerramiento.getmaterialesdb())
+        otradb = material.MaterialesDB(os.path.join(config.datadir,
+                                                    'MaterialesDB.ini'))
+        otradb[capas1[2][0]].conductivity = 0.075
+        c2 = Cerramiento("Cerramiento tipo", "Descripción",
+                         capas1, Rse=0.04, Rsi=0.13, matDB=otradb)
+        self.assertTrue(c2.matDB is otradb)
+        self.assertAlmostEqual(c2.R[3], 0.40, places=8)
+        self.assertAlmostEqual(self.c1.R[3], 0.80, places=8)
+
     def test_condensa(self):
         """Condensación intersticial en cerramiento [g/m2.mes]"""
         g = self.c1.condensacion(climae.temp, climai.temp, climae.HR, climai.HR)
@@ -150,6 +226,23 @@ class  CerramientoTestCase(unittest.TestCase):
         result_cc = 31.397530032177627
         self.assertEqual(cantidad_condensada, result_cc)
 
+    def test_envolvente_indices(self):
+        """Índices de interfase en la envolvente con capas sin espesor"""
+        envolv = self.c1.envolventec(climae.temp, climai.temp,
+                                     climae.HR, climai.HR)
+        self.assertEqual([n for S, p, n in envolv], [0, 1, 2, 5])
+        # Capa sin espesor tras la primera: las interfases 1 y 2 comparten
+        # posición y la condensación se asigna a la interfase de la envolvente
+        capas = capas1[:1] + [(capas1[1][0], 0.0)] + capas1[1:]
+        c2 = Cerramiento("Cerramiento tipo", "Descripción", capas)
+        x = c2.tabla.Sacum
+        self.assertEqual(x[1], x[2])
+        envolv = [(x[0], 836.98994423079864, 0),
+                  (x[2], 1034.1390998299653, 2),
+                  (x[6], 1285.3231290912881, 6)]
+        g = c2.cantidadc(envolv)
+        self.assertEqual([n for n, gn in g], [2])
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(CerramientoTestCase)
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -31,6 +31,9 @@ climae = Clima(5, 96) #T, HR
 climai = Clima(20.0, 55) #T, HR
 climae1 = Clima(10.7, 79) #datos enero Sevilla
 climai1 = Clima(20.0, 75) #T, HR
+climas12 = [climae, Clima(10, 55), Clima(3, 80), Clima(10, 55),
+            Clima(6, 85), Clima(10, 55), Clima(8, 85), Clima(10, 55),
+            Clima(3, 85), Clima(10, 55), Clima(3, 85), Clima(3, 55)]
 
 capas1 = [(u"1/2 pie LP métrico o catalán 40 mm< G < 60 mm", 0.11),
           (u"Mortero de áridos ligeros [vermiculita perlita]", 0.01),
@@ -110,6 +113,91 @@ class  ComprobacionesTestCase(unittest.TestCase):
                                                climae1.HR, climai.HR)
         self.assertFalse(_c)
 
+    def test_cicloanual(self):
+        """Condensaciones intersticiales acumuladas en el ciclo anual"""
+        g = comprobaciones.cicloanual(self.c1, climai.temp, climai.HR,
+                                      climas12)
+        self.assertEqual(g.shape, (12, 6))
+        self.assertEqual(g[0].tolist(),
+                         [0.0, 15.864904851206333, 28.04178080798583,
+                          0.0, 0.0, 0.0])
+        self.assertEqual(g[:, 2].tolist(),
+                         [28.04178080798583, 0.0, 38.973596451480034,
+                          0.0, 0.0, 0.0, 0.0, 0.0, 55.33310577046643,
+                          0.0, 55.33310577046643, 12.509155627014536])
+
+    def test_calculaintersticiales(self):
+        """Lista de condensaciones intersticiales por periodos"""
+        glist = comprobaciones.calculaintersticiales(self.c1, climai.temp,
+                                                     climai.HR, climas12)
+        self.assertEqual(len(glist), 12)
+        self.assertEqual(glist[0], [(1, 15.864904851206333),
+                                    (2, 28.04178080798583)])
+        self.assertEqual(glist[1], [])
+        self.assertEqual(glist[11], [(2, 12.509155627014536)])
+
+    def test_resultadointersticiales(self):
+        """Totales y máscaras de condensaciones intersticiales"""
+        glist = comprobaciones.calculaintersticiales(self.c1, climai.temp,
+                                                     climai.HR, climas12)
+        self.assertEqual(glist.g.shape, (12, 6))
+        self.assertTrue(glist.condensa)
+        self.assertEqual(glist.periodoscondensan.nonzero()[0].tolist(),
+                         [0, 2, 8, 10, 11])
+        self.assertEqual(glist.interfasescondensan.nonzero()[0].tolist(),
+                         [1, 2])
+        self.assertAlmostEqual(glist.gmax, 55.33310577, places=8)
+        self.assertAlmostEqual(glist.gmaxinterfases[1], 15.86490485, places=8)
+        self.assertAlmostEqual(glist.gmaxinterfases[2], glist.gmax, places=10)
+        gm = comprobaciones.gmeses(glist)
+        gm_tuplas = comprobaciones.gmeses(glist.tuplas())
+        self.assertEqual(len(gm), 12)
+        for a, b in zip(gm, gm_tuplas):
+            self.assertAlmostEqual(a, b, places=10)
+        self.assertAlmostEqual(comprobaciones.gperiodo(glist, 0),
+                               43.90668566, places=8)
+        self.assertEqual(comprobaciones.gperiodo(glist, 12), 0.0)
+
+    def test_espesorminimo(self):
+        """Espesor mínimo de aislamiento sin condensaciones"""
+        capas = [capas1[2]] + capas1[:2] + capas1[3:]
+        c = Cerramiento("Cerramiento tipo", "Descripción", capas)
+        e = comprobaciones.espesorminimo(c, 0, 0.0, 0.3, climas12,
+                                         climai.temp, climai.HR)
+        self.assertEqual(c.capas, capas)
+        self.assertAlmostEqual(e, 0.007, places=3)
+        self.assertTrue(comprobaciones.cumplecerramiento(
+            Cerramiento("", "", [(capas[0][0], e)] + capas[1:]),
+            climai.temp, climai.HR, climas12))
+        self.assertFalse(comprobaciones.cumplecerramiento(
+            Cerramiento("", "", [(capas[0][0], e - 0.001)] + capas[1:]),
+            climai.temp, climai.HR, climas12))
+        self.assertEqual(comprobaciones.espesorminimo(c, 0, 0.0, 0.3,
+                                                      [climae1], climai.temp,
+                                                      climai.HR), 0.0)
+        self.assertEqual(comprobaciones.espesorminimo(c, 0, 0.0, 0.001,
+                                                      climas12, climai.temp,
+                                                      climai.HR), None)
+        self.assertRaises(ValueError, comprobaciones.espesorminimo,
+                          c, 0, 0.1, 0.0, climas12)
+        espesores = comprobaciones.espesorminimolocalidades(
+            c, 0, 0.0, 0.3, {'A': climas12, 'B': [climae1]},
+            climai.temp, climai.HR)
+        self.assertEqual(espesores, {'A': e, 'B': 0.0})
+
+    def test_espesorminimonomonotono(self):
+        """Espesor mínimo de una capa que empeora el cumplimiento"""
+        # Betún en el lado frío del aislamiento: sin él no hay condensaciones
+        capas = [(u"Betún puro", 0.0), capas1[2]] + capas1[:2] + capas1[3:]
+        c = Cerramiento("Cerramiento tipo", "Descripción", capas)
+        self.assertTrue(comprobaciones.cumplecerramiento(
+            c, climai.temp, climai.HR, climas12))
+        self.assertRaises(ValueError, comprobaciones.espesorminimo,
+                          c, 0, 0.0, 0.05, climas12, climai.temp, climai.HR)
+        self.assertEqual(comprobaciones.espesorminimo(c, 0, 0.0, 0.0,
+                                                      climas12, climai.temp,
+                                                      climai.HR), 0.0)
+
 
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(ComprobacionesTestCase)
@@ -28,8 +28,14 @@
 #TODO: de materiales testea loadmaterialesdb
 
 import os
+import random
+import shutil
+import stat
+import tempfile
 import unittest
+import numpy
 import condensaciones.dbutils as dbutils
+from condensaciones import material, clima, cerramiento, util, sqlitedb
 
 this_dir = os.path.dirname(__file__)
 DB = os.path.join(this_dir, "./PCatalogo.bdc")
@@ -79,6 +85,80 @@ class  DBTestCase(unittest.TestCase):
         self.assertEqual(mk, keys)
         self.assertEqual(groupdata, keys)
 
+    def test_iterblocks(self):
+        """Interpretación incremental de bloques"""
+        blocks = dbutils.iterblocks(DB)
+        section, block = blocks.next()
+        self.assertEqual(section, dbutils.DEFAULT_SECTION)
+        self.assertEqual(block, parsedfile[u'default'][0])
+        self.assertEqual([b for s, b in blocks], parsedfile[u'default'][1:])
+
+    def test_db2ini(self):
+        """Conversión a BBDD de materiales en formato ConfigObj"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'DB.ini')
+            nmats, ngroups = dbutils.DB2ini([DB, DB], filename)
+            self.assertEqual((nmats, ngroups), (2, 1))
+            mdb = material.MaterialesDB(filename)
+            self.assertEqual(mdb.nombres, [u'B_Vapor Z3 (d_1mm)',
+                                           u'B_Vapor Al (d_0.008mm)'])
+            # Prevalece la primera aparición de un nombre repetido
+            self.assertEqual(mdb[u'B_Vapor Z3 (d_1mm)'].mu, 1350.0)
+            self.assertEqual(mdb[u'B_Vapor Al (d_0.008mm)'].thickness, 8e-6)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_db2ini_fusion(self):
+        """Conversión sobre una BBDD ConfigObj existente"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'DB.ini')
+            with open(filename, 'wb') as f:
+                f.write('[config]\nname = Previa\n'
+                        '[Otro]\nname = Otro\ndb = previa\ngroup = Otros\n'
+                        'type = RESISTANCE\nmu = 1.0\nresistance = 0.5\n'
+                        '[B_Vapor Z3 (d_1mm)]\nname = B_Vapor Z3 (d_1mm)\n'
+                        'db = previa\ngroup = Otros\ntype = RESISTANCE\n'
+                        'mu = 1.0\nresistance = 0.1\n')
+            self.assertEqual(dbutils.DB2ini([DB], filename), (2, 1))
+            mdb = material.MaterialesDB(None)
+            mdb.loadmaterialesdb(filename, cache=False)
+            self.assertEqual(mdb.config, {'name': 'Previa'})
+            self.assertEqual(mdb.nombres, [u'Otro', u'B_Vapor Z3 (d_1mm)',
+                                           u'B_Vapor Al (d_0.008mm)'])
+            self.assertEqual(mdb[u'Otro'].resistance, 0.5)
+            self.assertEqual(mdb[u'B_Vapor Z3 (d_1mm)'].mu, 1350.0)
+            self.assertEqual(os.listdir(tmpdir), ['DB.ini'])
+            # Sustitución del archivo existente
+            dbutils.DB2ini([DB], filename, sobrescribe=True)
+            mdb = material.MaterialesDB(None)
+            mdb.loadmaterialesdb(filename, cache=False)
+            self.assertEqual(mdb.config, None)
+            self.assertEqual(mdb.nombres, [u'B_Vapor Z3 (d_1mm)',
+                                           u'B_Vapor Al (d_0.008mm)'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_db2ini_paralelo(self):
+        """Conversión en paralelo con el mismo resultado que en serie"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            resultados = []
+            def informe(dbfile, nmats, nnuevos, tiempo):
+                resultados.append((dbfile, nmats, nnuevos))
+            serie = os.path.join(tmpdir, 'serie.ini')
+            paralelo = os.path.join(tmpdir, 'paralelo.ini')
+            dbutils.DB2ini([DB, DB], serie)
+            n = dbutils.DB2ini([DB, DB], paralelo, workers=2, informe=informe)
+            self.assertEqual(n, (2, 1))
+            self.assertEqual(resultados, [(DB, 3, 2), (DB, 3, 0)])
+            with open(serie, 'rb') as fserie:
+                with open(paralelo, 'rb') as fparalelo:
+                    self.assertEqual(fserie.read(), fparalelo.read())
+        finally:
+            shutil.rmtree(tmpdir)
+
     def test_db2data2(self):
         """Conversión de elementos a objetos"""
         m = self.materials[u'B_Vapor Al (d_0.008mm)']
@@ -89,6 +169,487 @@ class  DBTestCase(unittest.TestCase):
         self.assertEqual(m.thickness, 0.000008)
         self.assertEqual(m.mu, 1.0e8)
 
+class  CacheTestCase(unittest.TestCase):
+    """Comprobaciones de la caché binaria de las bases de datos"""
+    def setUp(self):
+        """Module-level setup"""
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ['MaterialesDB.ini', 'CerramientosDB.ini', 'ClimasDB.ini']:
+            shutil.copy(util.config.appresource(name), self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache(self):
+        """Uso e invalidación de la caché"""
+        filename = os.path.join(self.tmpdir, 'ClimasDB.ini')
+        self.assertEqual(util.loadcache(filename, clima.CACHEVERSION), None)
+        climas, cnames, dbconf = clima.loadclimadb(filename)
+        self.assertTrue(os.path.exists(filename + util.CACHEEXT))
+        ccache = clima.loadclimadb(filename)
+        self.assertEqual(ccache[1], cnames)
+        self.assertEqual(ccache[2], dbconf)
+        self.assertEqual([(c.temp, c.HR) for c in ccache[0][cnames[0]]],
+                         [(c.temp, c.HR) for c in climas[cnames[0]]])
+        self.assertEqual(util.loadcache(filename, clima.CACHEVERSION + 1),
+                         None)
+        # Una modificación del archivo invalida la caché
+        with open(filename, 'a') as dbfile:
+            dbfile.write('\n[Nueva]\nT = 10.0\nHR = 80.0\n')
+        self.assertEqual(util.loadcache(filename, clima.CACHEVERSION), None)
+        self.assertEqual(clima.loadclimadb(filename)[1], cnames + ['Nueva'])
+        self.assertEqual(clima.loadclimadb(filename)[1], cnames + ['Nueva'])
+
+    def test_bbdd(self):
+        """Bases de datos de materiales y cerramientos desde la caché"""
+        matfile = os.path.join(self.tmpdir, 'MaterialesDB.ini')
+        cfile = os.path.join(self.tmpdir, 'CerramientosDB.ini')
+        mdb = material.MaterialesDB(matfile)
+        cdb = cerramiento.CerramientosDB(cfile, matDB=mdb)
+        self.assertTrue(os.path.exists(matfile + util.CACHEEXT))
+        self.assertTrue(os.path.exists(cfile + util.CACHEEXT))
+        mdb2 = material.MaterialesDB(matfile)
+        cdb2 = cerramiento.CerramientosDB(cfile, matDB=mdb2)
+        self.assertEqual(mdb2.nombres, mdb.nombres)
+        self.assertEqual(mdb2.nombresgrupos, mdb.nombresgrupos)
+        self.assertEqual(mdb2.config, mdb.config)
+        for nombre in mdb.nombres:
+            for attr in material.Material.__slots__:
+                self.assertEqual(getattr(mdb2[nombre], attr, None),
+                                 getattr(mdb[nombre], attr, None))
+        self.assertEqual(cdb2.nombres, cdb.nombres)
+        self.assertEqual(cdb2.nombrestipos, cdb.nombrestipos)
+        for nombre in cdb.nombres:
+            c, c2 = cdb[nombre], cdb2[nombre]
+            self.assertEqual((c2.capas, c2.tipo, c2.Rse, c2.Rsi),
+                             (c.capas, c.tipo, c.Rse, c.Rsi))
+            self.assertTrue(c2.matDB is mdb2)
+
+class  MaterialesDBTestCase(unittest.TestCase):
+    """Comprobaciones de la BBDD de materiales por columnas"""
+    def setUp(self):
+        """Module-level setup"""
+        self.mdb = material.MaterialesDB(util.config.appresource(
+                                                        'MaterialesDB.ini'))
+
+    def test_columnas(self):
+        """Identificadores y columnas de propiedades"""
+        mdb = self.mdb
+        nombres = mdb.nombres[:3]
+        ids = mdb.getids(nombres)
+        self.assertEqual(ids.tolist(), [0, 1, 2])
+        self.assertEqual(mdb.columna('mu')[ids].tolist(),
+                         [mdb[nombre].mu for nombre in nombres])
+        for nombre in mdb.nombres:
+            m = mdb[nombre]
+            mid = mdb.ids[nombre]
+            self.assertFalse(hasattr(m, '__dict__'))
+            self.assertEqual(mdb.nombresgrupos[mdb.columna('grupo')[mid]],
+                             m.group)
+            if m.type == 'PROPERTIES':
+                self.assertEqual(mdb.columna('conductivity')[mid],
+                                 m.conductivity)
+                self.assertTrue(numpy.isnan(mdb.columna('resistance')[mid]))
+            elif m.type == 'RESISTANCE':
+                self.assertEqual(mdb.columna('resistance')[mid], m.resistance)
+                self.assertTrue(numpy.isnan(mdb.columna('conductivity')[mid]))
+
+    def test_modificacion(self):
+        """Inserción, sustitución y eliminación de materiales"""
+        mdb = self.mdb
+        n = len(mdb)
+        primero, segundo = mdb.nombres[:2]
+        idsegundo = mdb.ids[segundo]
+        del mdb[primero]
+        self.assertFalse(primero in mdb)
+        self.assertEqual(len(mdb), n - 1)
+        self.assertEqual(mdb.nombres[0], segundo)
+        self.assertEqual(mdb.ids[segundo], idsegundo)
+        m = material.Material(u'Nuevo', u'Grupo nuevo', 'RESISTANCE', 1.0)
+        m.resistance = 0.5
+        mdb[u'Nuevo'] = m
+        self.assertEqual(mdb.nombres[-1], u'Nuevo')
+        self.assertEqual(mdb.ids[u'Nuevo'], n)
+        self.assertEqual(mdb.nombresgrupos[-1], u'Grupo nuevo')
+        m.resistance = 0.25
+        mdb[u'Nuevo'] = m
+        self.assertEqual(mdb.ids[u'Nuevo'], n)
+        self.assertEqual(mdb.columna('resistance')[n], 0.25)
+        self.assertEqual(len(mdb.nombres), n)
+
+    def test_modificacioninterna(self):
+        """Columnas al día al modificar directamente un material"""
+        mdb = self.mdb
+        aislantes = list(mdb.buscagrupo(u'Aislantes'))
+        nombre = mdb.getnombres(aislantes[:1])[0]
+        mid = mdb.ids[nombre]
+        m = mdb[nombre]
+        m.conductivity = 0.5
+        m.group = u'Otro grupo'
+        self.assertEqual(mdb.columna('conductivity')[mid], 0.5)
+        self.assertEqual(mdb.nombresgrupos[mdb.columna('grupo')[mid]],
+                         u'Otro grupo')
+        self.assertEqual(list(mdb.buscagrupo(u'Aislantes')), aislantes[1:])
+        self.assertTrue(mid in mdb.buscarango('conductivity', 0.5, 0.6))
+        # Un material retirado de la BBDD ya no la modifica
+        del mdb[nombre]
+        m.conductivity = 0.7
+        self.assertTrue(numpy.isnan(mdb.columna('conductivity')[mid]))
+        otra = material.MaterialesDB(None)
+        otra[nombre] = m
+        m.mu = 3.0
+        self.assertEqual(otra.columna('mu')[0], 3.0)
+        self.assertTrue(numpy.isnan(mdb.columna('mu')[mid]))
+        # Vista de los materiales
+        materiales = mdb.materiales
+        self.assertTrue(materiales is mdb.materiales)
+        self.assertEqual(len(materiales), len(mdb))
+        self.assertFalse(nombre in materiales)
+        self.assertTrue(materiales[mdb.nombres[0]] is mdb[mdb.nombres[0]])
+        otra[u'Nuevo'] = material.Material(u'Nuevo', u'Grupo', 'RESISTANCE',
+                                           1.0)
+        self.assertEqual(sorted(otra.materiales), [nombre, u'Nuevo'])
+        # Las modificaciones a través de la vista actualizan la BBDD
+        nuevo = material.Material(u'Otro', u'Grupo', 'RESISTANCE', 2.0)
+        otra.materiales[u'Otro'] = nuevo
+        self.assertTrue(otra[u'Otro'] is nuevo)
+        self.assertEqual(otra.columna('mu')[otra.ids[u'Otro']], 2.0)
+        del otra.materiales[nombre]
+        self.assertFalse(nombre in otra)
+        self.assertEqual(otra.nombres, [u'Nuevo', u'Otro'])
+        otra.materiales.update({nombre: m})
+        self.assertEqual(otra.columna('mu')[otra.ids[nombre]], 3.0)
+
+    def test_busquedas(self):
+        """Búsquedas por nombre, grupo e intervalos de propiedades"""
+        mdb = self.mdb
+        normaliza = material.normaliza
+        self.assertEqual(normaliza(u'Áridos Ligeros'), u'aridos ligeros')
+        ids = list(mdb.buscaprefijo(u'asperon'))
+        self.assertEqual(mdb.getnombres(ids), [u'Asperón [1300 < d < 1900]',
+                                               u'Asperón [1900 < d < 2500]'])
+        for nombre in mdb.getnombres(mdb.buscaprefijo(u'EPS')):
+            self.assertTrue(normaliza(nombre).startswith(u'eps'))
+        ids = list(mdb.buscatexto(u'CATALAN'))
+        self.assertTrue(mdb.ids[u'1/2 pie LP métrico o catalán '
+                                u'40 mm< G < 60 mm'] in ids)
+        self.assertEqual(sorted(ids), ids)
+        self.assertEqual(sorted(mdb.ids[nombre] for nombre in mdb.nombres
+                                if u'catal' in normaliza(nombre)), ids)
+        aislantes = list(mdb.buscagrupo(u'Aislantes'))
+        self.assertEqual(len(aislantes), 22)
+        ids = list(mdb.buscarango('conductivity', 0.03, 0.035))
+        valores = mdb.columna('conductivity')[ids]
+        self.assertEqual(sorted(valores), valores.tolist())
+        self.assertTrue(((valores >= 0.03) & (valores < 0.035)).all())
+        ids = list(mdb.busca(grupo=u'Aislantes', conductivity=(None, 0.035),
+                             mu=(None, 50)))
+        esperados = [mid for mid in aislantes
+                     if mdb.columna('conductivity')[mid] < 0.035
+                     and mdb.columna('mu')[mid] < 50]
+        self.assertTrue(esperados)
+        self.assertEqual(ids, esperados)
+        # Las modificaciones invalidan los índices
+        del mdb[mdb.getnombres(ids[:1])[0]]
+        self.assertEqual(list(mdb.busca(grupo=u'Aislantes',
+                                        conductivity=(None, 0.035),
+                                        mu=(None, 50))), esperados[1:])
+        self.assertEqual(len(list(mdb.busca())), len(mdb))
+
+class  GuardadoTestCase(unittest.TestCase):
+    """Comprobaciones del guardado incremental de la BBDD de cerramientos"""
+    def setUp(self):
+        """Module-level setup"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'CerramientosDB.ini')
+        shutil.copy(util.config.appresource('CerramientosDB.ini'),
+                    self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_incremental(self):
+        """El guardado incremental equivale al guardado completo"""
+        cdb = cerramiento.CerramientosDB(self.filename)
+        self.assertEqual(cdb.modificados, [])
+        nombres = cdb.nombres[:]
+        cdb[nombres[1]].descripcion = u'Descripción nueva'
+        cdb[nombres[2]].capas.pop()
+        cdb.rename(nombres[3], u'Renombrado')
+        del cdb[nombres[0]]
+        cdb.nombres.reverse()
+        self.assertEqual(sorted(cdb.modificados),
+                         sorted([nombres[1], nombres[2], u'Renombrado']))
+        cdb.savecerramientosdb()
+        self.assertEqual(cdb.modificados, [])
+        completo = os.path.join(self.tmpdir, 'completo.ini')
+        cerramiento.CerramientosDB(self.filename).savecerramientosdb(completo)
+        cdb.savecerramientosdb(completo)
+        with open(self.filename, 'rb') as f1:
+            with open(completo, 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read())
+        cdb2 = cerramiento.CerramientosDB(self.filename)
+        self.assertEqual(cdb2.nombres, cdb.nombres)
+        self.assertEqual(cdb2[nombres[1]].descripcion, u'Descripción nueva')
+        self.assertEqual(cdb2[nombres[2]].capas, cdb[nombres[2]].capas)
+
+    def test_permisos(self):
+        """El guardado conserva los permisos del archivo"""
+        cdb = cerramiento.CerramientosDB(self.filename)
+        cdb[cdb.nombres[0]].Rsi = 0.17
+        for modo in (0644, 0640):
+            os.chmod(self.filename, modo)
+            cdb.savecerramientosdb()
+            self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode),
+                             modo)
+        nuevo = os.path.join(self.tmpdir, 'nuevo.ini')
+        umask = os.umask(0022)
+        try:
+            cdb.savecerramientosdb(nuevo)
+        finally:
+            os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(nuevo).st_mode), 0644)
+
+    def test_diario(self):
+        """Recuperación de un guardado interrumpido a partir del diario"""
+        cdb = cerramiento.CerramientosDB(self.filename)
+        nombres = cdb.nombres[:]
+        cdb[nombres[0]].Rsi = 0.17
+        del cdb[nombres[1]]
+        cdb.rename(nombres[2], u'Renombrado')
+        # Diario anotado, pero el guardado no llega a producirse
+        cdb._anotadiario(self.filename + cerramiento.JOURNALEXT,
+                         cdb.modificados)
+        cdb2 = cerramiento.CerramientosDB(self.filename)
+        self.assertEqual(cdb2.nombres, cdb.nombres)
+        self.assertEqual(cdb2[nombres[0]].Rsi, 0.17)
+        # Solo quedan pendientes los cambios anotados en el diario
+        self.assertEqual(cdb2.modificados, [nombres[0], u'Renombrado'])
+        self.assertEqual(cdb2._eliminados, set(nombres[1:3]))
+        cdb2.savecerramientosdb(journal=True)
+        self.assertFalse(os.path.exists(self.filename +
+                                        cerramiento.JOURNALEXT))
+        cdb3 = cerramiento.CerramientosDB(self.filename)
+        self.assertEqual(cdb3.nombres, cdb.nombres)
+        self.assertEqual(cdb3[nombres[0]].Rsi, 0.17)
+
+class  CerramientosDBTestCase(unittest.TestCase):
+    """Comprobaciones del índice de nombres de la BBDD de cerramientos"""
+    def setUp(self):
+        """Module-level setup"""
+        self.cdb = cerramiento.CerramientosDB(util.config.appresource(
+                                                        'CerramientosDB.ini'))
+
+    def comprueba(self):
+        """El índice de posiciones corresponde a la lista de nombres"""
+        for i, nombre in enumerate(self.cdb.nombres):
+            self.assertEqual(self.cdb.posicion(nombre), i)
+        self.assertEqual(sorted(self.cdb.nombres),
+                         sorted(self.cdb.cerramientos))
+
+    def test_posiciones(self):
+        """Inserción, intercambio, renombrado y eliminación"""
+        cdb = self.cdb
+        nombres = cdb.nombres[:]
+        self.comprueba()
+        ce = cdb.nombres
+        ce[0], ce[-1] = ce[-1], ce[0]
+        self.comprueba()
+        cdb.rename(nombres[2], u'Renombrado')
+        self.assertEqual(cdb.posicion(u'Renombrado'), 2)
+        self.assertRaises(ValueError, cdb.posicion, nombres[2])
+        self.comprueba()
+        cdb.insert(cerramiento.Cerramiento(u'Nuevo', u''), 1)
+        self.comprueba()
+        del cdb[nombres[1]]
+        self.comprueba()
+        cdb[u'Nuevo'] = cerramiento.Cerramiento(u'Nuevo', u'Otro')
+        self.assertEqual(cdb.nombres.count(u'Nuevo'), 1)
+        self.assertEqual(cdb[u'Nuevo'].descripcion, u'Otro')
+        self.comprueba()
+
+    def test_mezcla(self):
+        """Índice de posiciones tras operaciones mezcladas"""
+        cdb = self.cdb
+        random.seed(3)
+        for i in range(200):
+            operacion = random.choice(['insert', 'del', 'rename', 'append',
+                                       'pop', 'swap'])
+            n = len(cdb.nombres)
+            if operacion == 'insert':
+                nombre = cdb.nuevonombre(u'Insertado %i')
+                cdb.insert(cerramiento.Cerramiento(nombre, u''),
+                           random.randint(-n, n))
+            elif operacion == 'del':
+                del cdb[random.choice(cdb.nombres)]
+            elif operacion == 'rename':
+                cdb.rename(random.choice(cdb.nombres),
+                           cdb.nuevonombre(u'Renombrado %i'))
+            elif operacion == 'append':
+                nombre = cdb.nuevonombre(u'Añadido %i')
+                cdb[nombre] = cerramiento.Cerramiento(nombre, u'')
+            elif operacion == 'pop':
+                nombre = cdb.nombres.pop(random.randint(-n, n - 1))
+                cdb.nombres.insert(random.randint(0, n - 1), nombre)
+            else:
+                ce = cdb.nombres
+                a, b = random.randint(0, n - 1), random.randint(0, n - 1)
+                ce[a], ce[b] = ce[b], ce[a]
+            self.comprueba()
+        ce = cdb.nombres
+        ce.sort()
+        self.comprueba()
+        ce[2:4] = ce[3:1:-1]
+        self.comprueba()
+        self.assertTrue(ce[0] in ce)
+        self.assertFalse(u'Inexistente' in ce)
+        self.assertEqual(ce.index(ce[5]), 5)
+
+    def test_desplazamientos(self):
+        """Índice al día tras varias inserciones y eliminaciones seguidas"""
+        ce = cerramiento.NombresList(u'Nombre %i' % i for i in range(20))
+        for i in range(5):
+            ce.insert(i * 3, u'Insertado %i' % i)
+            self.assertTrue(u'Insertado %i' % i in ce)
+        del ce[7]
+        ce.pop(1)
+        ce.append(u'Añadido')
+        self.assertFalse(u'Nombre 4' in ce)
+        # Intercambio de un elemento desplazado con otro al día
+        ce[0], ce[10] = ce[10], ce[0]
+        ce.insert(-2, u'Insertado')
+        ce.remove(u'Nombre 12')
+        self.assertEqual(len(set(ce)), len(ce))
+        for i, nombre in enumerate(ce):
+            self.assertEqual(ce.posicion(nombre), i)
+        self.assertFalse(u'Nombre 12' in ce)
+
+    def test_nuevonombre(self):
+        """Generación de nombres libres"""
+        cdb = self.cdb
+        nombres = []
+        for i in range(5):
+            nombre = cdb.nuevonombre(u'Variante %i')
+            cdb.insert(cerramiento.Cerramiento(nombre, u''), 0)
+            nombres.append(nombre)
+        self.assertEqual(nombres, [u'Variante %i' % i for i in range(1, 6)])
+        del cdb[u'Variante 2']
+        self.assertEqual(cdb.nuevonombre(u'Variante %i'), u'Variante 2')
+        cdb.rename(u'Variante 4', u'Otro nombre')
+        cdb.insert(cerramiento.Cerramiento(u'Variante 2', u''), 0)
+        self.assertEqual(cdb.nuevonombre(u'Variante %i'), u'Variante 4')
+        self.comprueba()
+
+class  SQLiteTestCase(unittest.TestCase):
+    """Comprobaciones de la BBDD SQLite"""
+    def setUp(self):
+        """Module-level setup"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.tmpdir, 'biblioteca.sqlite')
+        self.inifiles = [util.config.appresource(name) for name in
+                         ['MaterialesDB.ini', 'CerramientosDB.ini',
+                          'ClimasDB.ini']]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_importacion(self):
+        """Importación y exportación de BBDD ConfigObj"""
+        nmats, ncerrs, nclimas = dbutils.ini2sqlite(self.dbfile,
+                                                    *self.inifiles)
+        mdb = material.MaterialesDB(self.inifiles[0])
+        cdb = cerramiento.CerramientosDB(self.inifiles[1], matDB=mdb)
+        climas, cnames, climasconfig = clima.loadclimadb(self.inifiles[2])
+        self.assertEqual((nmats, ncerrs, nclimas),
+                         (len(mdb), len(cdb.nombres), len(cnames)))
+        outfiles = [os.path.join(self.tmpdir, name) for name in
+                    ['m.ini', 'c.ini', 'k.ini']]
+        dbutils.sqlite2ini(self.dbfile, *outfiles)
+        for filename in [self.dbfile, outfiles[0]]:
+            mdb2 = material.MaterialesDB(filename)
+            self.assertEqual(mdb2.nombres, mdb.nombres)
+            self.assertEqual(mdb2.config, mdb.config)
+            for nombre in mdb.nombres:
+                for attr in material.Material.__slots__:
+                    self.assertEqual(getattr(mdb2[nombre], attr, None),
+                                     getattr(mdb[nombre], attr, None))
+        for filename in [self.dbfile, outfiles[1]]:
+            cdb2 = cerramiento.CerramientosDB(filename, matDB=mdb)
+            self.assertEqual(cdb2.nombres, cdb.nombres)
+            for nombre in cdb.nombres:
+                c, c2 = cdb[nombre], cdb2[nombre]
+                self.assertEqual((c2.descripcion, c2.capas, c2.tipo,
+                                  c2.Rse, c2.Rsi),
+                                 (c.descripcion, c.capas, c.tipo,
+                                  c.Rse, c.Rsi))
+        for filename in [self.dbfile, outfiles[2]]:
+            climas2, cnames2, climasconfig2 = clima.loadclimadb(filename)
+            self.assertEqual(cnames2, cnames)
+            self.assertEqual(climasconfig2, climasconfig)
+            for nombre in cnames:
+                self.assertEqual([(c.temp, c.HR) for c in climas2[nombre]],
+                                 [(c.temp, c.HR) for c in climas[nombre]])
+
+    def test_registros(self):
+        """Modificación de registros y transacciones"""
+        dbutils.ini2sqlite(self.dbfile, *self.inifiles)
+        mdb = material.MaterialesDB(self.dbfile)
+        cdb = cerramiento.CerramientosDB(self.dbfile, matDB=mdb)
+        nombres = cdb.nombres[:]
+        # Sustitución de un cerramiento, manteniendo su posición
+        db = sqlitedb.SQLiteDB(self.dbfile)
+        db.setcerramiento(nombres[1], u'Nueva', [(mdb.nombres[0], 0.2)])
+        self.assertEqual(db.nombres('cerramientos'), nombres)
+        # Una excepción deshace todos los cambios de la transacción
+        try:
+            with db.transaccion():
+                db.delcerramiento(nombres[0])
+                db.delmaterial(mdb.nombres[0])
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(db.nombres('cerramientos'), nombres)
+        self.assertEqual(db.nombres('materiales'), mdb.nombres)
+        db.close()
+        cdb2 = cerramiento.CerramientosDB(self.dbfile, matDB=mdb)
+        self.assertEqual(cdb2[nombres[1]].descripcion, u'Nueva')
+        self.assertEqual(cdb2[nombres[1]].capas, [(mdb.nombres[0], 0.2)])
+        # Guardado completo con reordenación y eliminación
+        del cdb2[nombres[0]]
+        cdb2.nombres[:] = nombres[:0:-1]
+        cdb2.savecerramientosdb()
+        cdb3 = cerramiento.CerramientosDB(self.dbfile, matDB=mdb)
+        self.assertEqual(cdb3.nombres, nombres[:0:-1])
+
+    def test_concurrencia(self):
+        """Guardado de dos copias de la misma BBDD SQLite"""
+        dbutils.ini2sqlite(self.dbfile, *self.inifiles)
+        mdb = material.MaterialesDB(self.dbfile)
+        cdba = cerramiento.CerramientosDB(self.dbfile, matDB=mdb)
+        cdbb = cerramiento.CerramientosDB(self.dbfile, matDB=mdb)
+        nombres = cdba.nombres[:]
+        cdbb.insert(cerramiento.Cerramiento(u'Muro de B', u'',
+                                            [(mdb.nombres[0], 0.2)]), 1)
+        cdbb.savecerramientosdb()
+        cdba[nombres[0]].Rsi = 0.17
+        del cdba[nombres[1]]
+        cdba.savecerramientosdb()
+        cdb = cerramiento.CerramientosDB(self.dbfile, matDB=mdb)
+        self.assertEqual(cdb.nombres, [nombres[0], u'Muro de B'] + nombres[2:])
+        self.assertEqual(cdb[nombres[0]].Rsi, 0.17)
+        # Lo mismo con las localidades
+        climas, cnames, config = clima.loadclimadb(self.dbfile)
+        climasb = dict(climas)
+        climasb[u'Localidad de B'] = climas[cnames[0]]
+        clima.saveclimasdb(climasb, cnames[:1] + [u'Localidad de B'] +
+                           cnames[1:], config, self.dbfile)
+        del climas[cnames[1]]
+        clima.saveclimasdb(climas, cnames[:1] + cnames[2:], config,
+                           self.dbfile, eliminados=cnames[1:2])
+        climas2, cnames2, config2 = clima.loadclimadb(self.dbfile)
+        self.assertEqual(cnames2, cnames[:1] + [u'Localidad de B'] +
+                         cnames[2:])
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(DBTestCase)
     unittest.TextTestRunner(verbosity=2).run(suite)
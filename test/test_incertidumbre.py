@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests del módulo condensaciones.incertidumbre"""
+
+import numpy
+import unittest
+from condensaciones import comprobaciones, incertidumbre
+import datos
+
+class  IncertidumbreTestCase(unittest.TestCase):
+    """Análisis de incertidumbre por el método de Monte Carlo"""
+    def setUp(self):
+        """Module-level setup"""
+        self.c = datos.cerramiento()
+        self.climas = datos.climas(u'Burgos')
+
+    def test_sinperturbaciones(self):
+        """Sin perturbaciones todas las muestras son el cerramiento nominal"""
+        nada = dict((nombre, None) for nombre in incertidumbre.PERTURBACIONES)
+        r = incertidumbre.montecarlo(self.c, self.climas, 3,
+                                     perturbaciones=nada)
+        g = comprobaciones.cicloanual(self.c, 20.0, 55.0, self.climas)
+        self.assertEqual(r.nmuestras, 3)
+        self.assertEqual(list(r.U), [self.c.U] * 3)
+        for gmax in r.gmax:
+            self.assertTrue(numpy.array_equal(gmax, g.max(axis=0)))
+        self.assertEqual(r.probabilidad, 1.0)
+        self.assertEqual(r.probabilidadcs, 0.0)
+
+    def test_reproducible(self):
+        """Resultados iguales con cualquier número de procesos"""
+        r1 = incertidumbre.montecarlo(self.c, self.climas, 250, semilla=7,
+                                      lote=100)
+        r2 = incertidumbre.montecarlo(self.c, self.climas, 250, semilla=7,
+                                      procesos=2, lote=100)
+        r3 = incertidumbre.montecarlo(self.c, self.climas, 250, semilla=8,
+                                      lote=100)
+        self.assertTrue(numpy.array_equal(r1.gmax, r2.gmax))
+        self.assertTrue(numpy.array_equal(r1.U, r2.U))
+        self.assertFalse(numpy.array_equal(r1.U, r3.U))
+        self.assertTrue(0.0 < r1.probabilidad < 1.0)
+        cuantiles = r1.cuantiles((0.05, 0.5, 0.95))
+        self.assertEqual(cuantiles.shape, (3, len(self.c.capas) + 1))
+        self.assertTrue((numpy.diff(cuantiles, axis=0) >= 0.0).all())
+
+    def test_dispersiongrande(self):
+        """Propiedades positivas con perturbaciones de dispersión grande"""
+        rng = numpy.random.RandomState(0)
+        for tipo in ('normal', 'uniforme'):
+            factores = incertidumbre.Perturbacion(tipo, 2.0).factores(
+                                                            rng, (2000, 4))
+            self.assertTrue((factores >= 0.01).all())
+            self.assertTrue((factores < 1.0).any())
+        grande = incertidumbre.Perturbacion('normal', 1.5)
+        r = incertidumbre.montecarlo(self.c, self.climas, 500,
+                                     perturbaciones={'conductividad': grande,
+                                                     'mu': grande})
+        self.assertTrue((r.U > 0.0).all())
+        self.assertTrue(numpy.isfinite(r.gmax).all())
+        self.assertTrue((r.gmax >= 0.0).all())
+
+    def test_perturbaciones(self):
+        """Perturbaciones no válidas"""
+        self.assertRaises(ValueError, incertidumbre.Perturbacion, 'beta')
+        self.assertRaises(ValueError, incertidumbre.Perturbacion, 'normal', -1)
+        self.assertRaises(ValueError, incertidumbre.montecarlo, self.c,
+                          self.climas, 10,
+                          perturbaciones={'densidad': None})
+        self.assertRaises(ValueError, incertidumbre.montecarlo, self.c,
+                          self.climas, 10, perturbaciones={
+                              'temperatura':
+                              incertidumbre.Perturbacion('lognormal', 0.1)})
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(IncertidumbreTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests del módulo condensaciones.lotes"""
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+from cStringIO import StringIO
+from condensaciones import appmodel, lotes
+from condensaciones.cerramiento import Cerramiento
+from condensaciones.clima import Clima
+
+class  LotesTestCase(unittest.TestCase):
+    """Comprobaciones por lotes de cerramientos y localidades"""
+    def setUp(self):
+        """Module-level setup"""
+        cdb = appmodel.getcerramientosdb()
+        self.cerramientos = [cdb[nombre] for nombre in cdb.nombres[:6]]
+        climasdb = appmodel.getclimasdb()[0]
+        self.climas = dict((nombre, climasdb[nombre])
+                           for nombre in sorted(climasdb)[:4])
+        self.climai = Clima(20.0, 55.0)
+
+    def test_modelo(self):
+        """Resultados iguales a los del modelo de la aplicación"""
+        resultados = list(lotes.evaluamatriz(self.cerramientos, self.climas,
+                                             self.climai))
+        self.assertEqual(len(resultados), 6 * 4)
+        m = appmodel.Model(climasDB=self.climas)
+        m.climai = self.climai
+        for r in resultados:
+            m.set_cerramiento(r.cerramiento)
+            m.localidad = r.localidad
+            self.assertEqual(r.U, m.c.U)
+            self.assertEqual(r.fRsi, m.fRsi)
+            self.assertEqual(r.fRsimin, m.fRsimin)
+            self.assertEqual(r.cs, m.cs)
+            self.assertEqual(r.ci, m.ci > 0.0)
+            self.assertEqual(r.gmeses, m.gmeses)
+
+    def test_procesos(self):
+        """Resultados iguales con varios procesos de cálculo"""
+        serie = list(lotes.evaluamatriz(self.cerramientos, self.climas,
+                                        self.climai))
+        paralelo = list(lotes.evaluamatriz(self.cerramientos,
+                                           sorted(self.climas.items()),
+                                           self.climai, procesos=3, lote=1))
+        self.assertEqual(paralelo, serie)
+
+    def test_localidades(self):
+        """Localidades de una BBDD de climas, en su orden"""
+        climasdb, cnames = appmodel.getclimasdb()[:2]
+        localidades = lotes.localidadesdb(climasdb, cnames)
+        self.assertEqual([nombre for nombre, climasext in localidades],
+                         [nombre for nombre in cnames
+                          if nombre not in ('Climaext', 'Climaint')])
+        self.assertTrue(len(localidades) < len(cnames))
+        resultados = list(lotes.evaluamatriz(self.cerramientos[:1], climasdb,
+                                             self.climai))
+        self.assertEqual(len(resultados), len(localidades))
+        for r in resultados:
+            self.assertEqual(r.fRsimin, r.fRsimin)
+
+    def test_iterador(self):
+        """Cálculo en varios procesos sin leer todos los cerramientos"""
+        leidos = []
+        def genera():
+            for i in range(100):
+                leidos.append(i)
+                yield self.cerramientos[i % len(self.cerramientos)]
+        resultados = lotes.evaluamatriz(genera(), self.climas, self.climai,
+                                        procesos=2, lote=2)
+        primero = next(resultados)
+        self.assertEqual(primero, next(lotes.evaluamatriz(
+                                self.cerramientos[:1], self.climas,
+                                self.climai)))
+        self.assertTrue(len(leidos) <= 2 * 2 * 2 + 1)
+        resultados.close()
+        paralelo = list(lotes.evaluamatriz(iter(self.cerramientos),
+                                           self.climas, self.climai,
+                                           procesos=2))
+        self.assertEqual(paralelo, list(lotes.evaluamatriz(
+                                self.cerramientos, self.climas, self.climai)))
+        # Todos los cerramientos de un iterador usan la BBDD del primero
+        otro = Cerramiento(u'Otro', u'', self.cerramientos[0].capas,
+                           matDB=lotes.tabla2materialesdb(
+                               lotes.tablamateriales(self.cerramientos[:1])))
+        self.assertRaises(ValueError, list, lotes.evaluamatriz(
+                          iter(self.cerramientos[:2] + [otro]), self.climas,
+                          self.climai, procesos=2, lote=1))
+
+    def test_tablamateriales(self):
+        """Tabla compacta de materiales"""
+        tabla = lotes.tablamateriales(self.cerramientos)
+        nombres = set(nombre for cerr in self.cerramientos
+                      for nombre in cerr.nombres)
+        self.assertEqual(len(tabla), len(nombres))
+        matDB = lotes.tabla2materialesdb(tabla)
+        self.assertEqual(set(matDB.nombres), nombres)
+        for nombre in nombres:
+            self.assertEqual(matDB[nombre].conductivity,
+                             self.cerramientos[0].matDB[nombre].conductivity)
+
+    def test_json(self):
+        """Lectura de cerramientos en formato JSON"""
+        c = self.cerramientos[0]
+        lineas = [json.dumps({'nombre': c.nombre, 'capas': c.capas,
+                              'Rsi': 0.17}), '\n',
+                  json.dumps({'nombre': 'Otro', 'capas': c.capas[:1]})]
+        cerramientos = list(lotes.iterjson(lineas))
+        self.assertEqual([cerr.nombre for cerr in cerramientos],
+                         [c.nombre, 'Otro'])
+        self.assertEqual(cerramientos[0].capas, c.capas)
+        self.assertEqual(cerramientos[0].Rsi, 0.17)
+        lineas.append(json.dumps({'nombre': 'Malo', 'capas': [['?', 0.1]]}))
+        self.assertRaises(ValueError, list, lotes.iterjson(lineas))
+        self.assertRaises(ValueError, list, lotes.iterjson(['{"capas": []}']))
+
+    def test_salida(self):
+        """Escritura de resultados en formato JSON y CSV"""
+        resultados = list(lotes.evaluamatriz(self.cerramientos[:2],
+                                             self.climas, self.climai))
+        salida = StringIO()
+        self.assertEqual(lotes.escribejson(resultados, salida), 8)
+        datos = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+        self.assertEqual(datos[0]['U'], resultados[0].U)
+        self.assertEqual(datos[-1]['gmeses'], resultados[-1].gmeses)
+        salida = StringIO()
+        self.assertEqual(lotes.escribecsv(resultados, salida), 8)
+        filas = salida.getvalue().splitlines()
+        self.assertEqual(filas[0], 'cerramiento,localidad,U,fRsi,fRsimin,'
+                         'cs,ci,gmeses')
+        self.assertEqual(len(filas), 9)
+
+    def test_condensa(self):
+        """Comprobaciones por lotes desde bin/condensa sin interfaz gráfica"""
+        script = os.path.join(os.path.dirname(__file__), '..', 'bin',
+                              'condensa')
+        nombre = self.cerramientos[1].nombre
+        localidad = sorted(self.climas)[0]
+        salida = subprocess.check_output([sys.executable, script, 'lote',
+                                          '-j', '1', '-l',
+                                          localidad.encode('utf-8'),
+                                          nombre.encode('utf-8')])
+        datos = [json.loads(linea) for linea in salida.splitlines()]
+        self.assertEqual(len(datos), 1)
+        r = list(lotes.evaluamatriz(self.cerramientos[1:2],
+                                    [(localidad, self.climas[localidad])],
+                                    self.climai))[0]
+        self.assertEqual(datos[0]['U'], r.U)
+        self.assertEqual(datos[0]['ci'], r.ci)
+        salida = subprocess.check_output([sys.executable, script, 'lote',
+                                          '-j', '1', nombre.encode('utf-8')])
+        localidades = [json.loads(linea)['localidad']
+                       for linea in salida.splitlines()]
+        climasdb, cnames = appmodel.getclimasdb()[:2]
+        self.assertEqual(localidades, [nombre for nombre, climasext in
+                                       lotes.localidadesdb(climasdb, cnames)])
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(LotesTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
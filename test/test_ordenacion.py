@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests del módulo condensaciones.ordenacion"""
+
+import itertools
+import unittest
+from condensaciones import appmodel, comprobaciones, ordenacion
+from condensaciones.cerramiento import Cerramiento
+import datos
+
+class  OrdenacionTestCase(unittest.TestCase):
+    """Ordenación de las capas de un cerramiento"""
+    def setUp(self):
+        """Module-level setup"""
+        self.c = datos.cerramiento(datos.CAPAS2)
+        self.climas = datos.climas(u'Burgos')
+        self.g = comprobaciones.cicloanual(self.c, 20.0, 55.0,
+                                           self.climas).sum()
+
+    def bruto(self, fijas=()):
+        """Mínimas condensaciones probando todos los órdenes"""
+        n = len(self.c.capas)
+        fijas = [i % n for i in fijas]
+        valores = []
+        for orden in itertools.permutations(range(n)):
+            if any(orden[i] != i for i in fijas):
+                continue
+            c = Cerramiento('Orden', '', [self.c.capas[i] for i in orden],
+                            self.c.Rse, self.c.Rsi, matDB=self.c.matDB)
+            valores.append(comprobaciones.cicloanual(c, 20.0, 55.0,
+                                                     self.climas).sum())
+        return min(valores)
+
+    def test_ordenoptima(self):
+        """Mismo resultado que probando todos los órdenes"""
+        r = ordenacion.ordenoptima(self.c, self.climas)
+        self.assertAlmostEqual(r.ginicial, self.g, 6)
+        self.assertAlmostEqual(r.g, self.bruto(), 6)
+        self.assertEqual(r.capas, [self.c.capas[i] for i in r.orden])
+        r = ordenacion.ordenoptima(self.c, self.climas, fijas=(0, -1), lote=2)
+        self.assertEqual((r.orden[0], r.orden[-1]), (0, len(self.c.capas) - 1))
+        self.assertAlmostEqual(r.g, self.bruto((0, -1)), 6)
+        self.assertTrue(0.0 < r.g < r.ginicial)
+        r2 = ordenacion.ordenoptima(self.c, self.climas, fijas=(0, -1),
+                                    lote=2, procesos=2)
+        self.assertEqual(r2.orden, r.orden)
+        self.assertRaises(ValueError, ordenacion.ordenoptima, self.c,
+                          self.climas, fijas=(9,))
+
+    def test_intercambios(self):
+        """Intercambios de capas del modelo"""
+        orden = [3, 0, 4, 1, 2]
+        capas = range(5)
+        for i, j in ordenacion.intercambios(orden):
+            capas[i], capas[j] = capas[j], capas[i]
+        self.assertEqual(capas, orden)
+        m = appmodel.Model(datos.cerramientosdb(), {'Burgos': self.climas})
+        m.c = Cerramiento(self.c.nombre, '', list(self.c.capas), self.c.Rse,
+                          self.c.Rsi, matDB=self.c.matDB)
+        m.localidad = 'Burgos'
+        self.assertAlmostEqual(m.ci, self.g, 6)
+        r = m.capasordenoptimo(fijas=(0, -1))
+        m.capasordena(r.orden)
+        self.assertEqual(list(m.c.capas), r.capas)
+        self.assertAlmostEqual(m.ci, r.g, 6)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(OrdenacionTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#encoding: utf-8
+#
+#   condensaciones.py
+#   Programa de cálculo de condensaciones según CTE
+#
+#   Copyright (C) 2009-2011 Rafael Villar Burke <pachi@rvburke.com>
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version 2
+#   of the License, or (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+#   02110-1301, USA.
+"""Tests del módulo condensaciones.perfil"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+from condensaciones import perfil, psicrom, appmodel, cerramiento
+
+class  PerfilTestCase(unittest.TestCase):
+    """Instrumentación opcional de llamadas y cachés"""
+    def setUp(self):
+        """Module-level setup"""
+        self.activo = perfil.activo
+        perfil.desactiva()
+        perfil.reinicia()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        perfil.desactiva()
+        perfil.reinicia()
+        if self.activo:
+            perfil.activa()
+        shutil.rmtree(self.tmpdir)
+
+    def test_desactivada(self):
+        """Sin activar no se modifican las funciones registradas"""
+        psat = psicrom.psat
+        condensacion = cerramiento.Cerramiento.__dict__['condensacion']
+        perfil.activa()
+        self.assertFalse(psicrom.psat is psat)
+        perfil.desactiva()
+        self.assertTrue(psicrom.psat is psat)
+        self.assertTrue(cerramiento.Cerramiento.__dict__['condensacion']
+                        is condensacion)
+        psicrom.psat(10.0)
+        self.assertEqual(perfil.resumen(), {'llamadas': {}, 'caches': {}})
+
+    def test_llamadas(self):
+        """Recuento de llamadas y aciertos de caché"""
+        m = appmodel.Model()
+        m.localidad = m.climas[0]
+        perfil.activa()
+        self.assertEqual(psicrom.psat(10.0), 1227.309864896234)
+        self.assertEqual(perfil.resumen()['llamadas']['psicrom.psat']
+                         ['llamadas'], 1)
+        m.gmeses
+        m.gmeses
+        m.c.condensacion(5.0, 20.0, 96.0, 55.0)
+        datos = perfil.resumen()
+        llamadas = datos['llamadas']
+        self.assertTrue(llamadas['psicrom.psat']['llamadas'] > 1)
+        self.assertEqual(
+            llamadas['comprobaciones.calculaintersticiales']['llamadas'], 1)
+        self.assertEqual(
+            llamadas['cerramiento.Cerramiento.condensacion']['llamadas'], 1)
+        self.assertEqual(
+            llamadas['cerramiento.Cerramiento.envolventec']['llamadas'], 1)
+        self.assertEqual(datos['caches']['appmodel.Model']['aciertos'], 1)
+        self.assertEqual(datos['caches']['appmodel.Model']['fallos'], 2)
+        salida = StringIO()
+        perfil.informe(salida)
+        self.assertTrue('psicrom.psat' in salida.getvalue())
+        archivo = os.path.join(self.tmpdir, 'perfil.json')
+        perfil.guarda(archivo)
+        with open(archivo) as f:
+            self.assertEqual(json.load(f), json.loads(json.dumps(datos)))
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(PerfilTestCase)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -23,6 +23,7 @@
 """Tests del módulo condensaciones.psicrom"""
 
 import unittest
+import numpy
 import condensaciones.psicrom as psicrom
 
 class  PsicromTestCase(unittest.TestCase):
@@ -34,11 +35,26 @@ class  PsicromTestCase(unittest.TestCase):
         psat2 = psicrom.psat(20.0)
         self.assertAlmostEqual(psat2, 2336.95114380, places=8)
 
+    def test_psat_array(self):
+        """Presión de saturación con arrays"""
+        temps = numpy.array([[-20.0, 0.0], [0.5, 20.0]])
+        psats = psicrom.psat(temps)
+        self.assertEqual(psats.shape, (2, 2))
+        for t, p in zip(temps.flat, psats.flat):
+            self.assertAlmostEqual(p, psicrom.psat(float(t)), places=8)
+        self.assertAlmostEqual(psicrom.psat([20.0])[0], 2336.95114380, places=8)
+
     def test_pvapor(self):
         """Presión de vapor"""
         p = psicrom.pvapor(20.0, 55.0)
         self.assertAlmostEqual(p, 1285.32312909, places=8)
 
+    def test_pvapor_array(self):
+        """Presión de vapor con arrays"""
+        p = psicrom.pvapor(numpy.array([20.0, 20.0]), [55.0, 100.0])
+        self.assertAlmostEqual(p[0], 1285.32312909, places=8)
+        self.assertAlmostEqual(p[1], 2336.95114380, places=8)
+
     def test_temploc(self):
         """Temperatura en localidad no capital de provincia"""
         t = psicrom.temploc(20.0, 100.0)
@@ -56,6 +72,16 @@ class  PsicromTestCase(unittest.TestCase):
         hr2 = psicrom.hrloc(20.0, 55.0, 100.0)
         self.assertAlmostEqual(hr2, 58.52616631, places=8)
 
+    def test_loc_array(self):
+        """Condiciones en localidad no capital de provincia con arrays"""
+        t = psicrom.temploc([20.0, 20.0], 100.0)
+        self.assertAlmostEqual(t[1], 19.0, places=8)
+        p = psicrom.psatloc(numpy.array([20.0]), numpy.array([100.0]))
+        self.assertAlmostEqual(p[0], 2196.15124323, places=8)
+        hr = psicrom.hrloc(20.0, 55.0, numpy.array([-100.0, 100.0]))
+        self.assertAlmostEqual(hr[0], 55.0, places=8)
+        self.assertAlmostEqual(hr[1], 58.52616631, places=8)
+
     def test_hrintISO(self):
         """Humedad relativa interior - método ISO EN 13788:2002"""
         hrint1a = psicrom.hrintISO(-1, 19, 96, higrometria=1)